@@ -10,4 +10,9 @@ DATABASES = {
     }
 }
 
+# The replica routing tests read from this mirror of the test database.
+DATABASES['replica'] = {
+    **DATABASES['default'], 'TEST': {'MIRROR': 'default'}
+}
+
 STATIC_URL = '/static/'
@@ -43,8 +43,6 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'django.contrib.sites',
 
-    'debug_toolbar',
-
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
@@ -62,6 +60,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'django_gramm.middleware.PerformanceMiddleware',
+    'django_gramm.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,7 +69,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
@@ -212,6 +211,25 @@ ACCOUNT_EMAIL_VERIFICATION = "mandatory"
 
 ACCOUNT_LOGIN_ON_EMAIL_CONFIRMATION = True
 
+# Cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.getenv('CACHE_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION'),
+    }
+
+CACHE_TIMEOUT = 3600
+
 # Thumbnail.
 
 THUMBNAIL_ALIASES = {
@@ -223,6 +241,103 @@ THUMBNAIL_ALIASES = {
     }
 }
 
+# Narrower and modern format copies of the post photo aliases, served
+# through <picture>/srcset. AVIF is skipped when Pillow can not encode it.
+THUMBNAIL_VARIANT_ALIASES = ('home_post', 'profile_post')
+THUMBNAIL_VARIANT_WIDTHS = (320, 480, 720)
+THUMBNAIL_VARIANT_FORMATS = ('avif', 'webp')
+
+THUMBNAIL_JOB_BATCH_SIZE = 20
+THUMBNAIL_JOB_MAX_ATTEMPTS = 3
+THUMBNAIL_JOB_TIMEOUT_SECONDS = 600
+
+# Images.
+
+POST_MAX_PHOTOS = 10
+IMAGE_THREADS = 8
+
+IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+IMAGE_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+
+# Larger originals are downscaled once on upload.
+IMAGE_MAX_SIDE = 2560
+IMAGE_QUALITY = 90
+
+# Direct uploads.
+
+DIRECT_UPLOAD_BACKEND = 'django_gramm.uploads.LocalUploadBackend'
+DIRECT_UPLOAD_CONTENT_TYPES = {
+    'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp',
+}
+DIRECT_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+DIRECT_UPLOAD_EXPIRES_SECONDS = 3600
+
+POST_UPLOAD_BATCH_SIZE = 10
+POST_UPLOAD_MAX_ATTEMPTS = 3
+POST_UPLOAD_TIMEOUT_SECONDS = 600
+
+# Timeline.
+
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL_SIZE = 50
+TIMELINE_BATCH_SIZE = 1000
+
+# Trending.
+
+TRENDING_WINDOW_DAYS = 7
+TRENDING_DECAY_SECONDS = 45000
+TRENDING_COMMENT_WEIGHT = 2
+TRENDING_BATCH_SIZE = 1000
+
+# Comments.
+
+# The post page shows the newest comments, the older ones are loaded lazily.
+POST_COMMENTS_PAGE_SIZE = 20
+
+# Likes.
+
+# Queued toggles an offline client can send in one request.
+LIKE_TOGGLES_MAX_NUMBER = 100
+
+# Search.
+
+USER_SEARCH_LIMIT = 20
+USER_SEARCH_TYPEAHEAD_LIMIT = 8
+# Trigrams only narrow the users down from three characters.
+USER_SEARCH_MIN_LENGTH = 3
+
+# Replicas.
+
+DATABASE_ROUTERS = ['django_gramm.replicas.ReplicaRouter']
+
+# The read-only views read from the replica with this alias when it is set.
+DATABASE_REPLICA_ALIAS = None
+# Replicas are expected to catch up within it, so a user who has written
+# reads from the primary meanwhile.
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# Performance.
+
+# Share of the requests reporting their queries, templates and cache usage.
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.01))
+PERFORMANCE_SERVER_TIMING = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'django_gramm.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 if PRODUCTION:
     import dj_database_url
@@ -240,6 +355,15 @@ if PRODUCTION:
         }
     }
 
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+        DATABASE_REPLICA_ALIAS = 'replica'
+
     db_from_env = dj_database_url.config()
 
     # AWS settings.
@@ -253,12 +377,19 @@ if PRODUCTION:
     AWS_QUERYSTRING_AUTH = False
 
     DEFAULT_FILE_STORAGE = 'DjangoGramm.storage_backends.MediaStorage'
+    DIRECT_UPLOAD_BACKEND = 'django_gramm.uploads.S3UploadBackend'
 
     STATIC_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/"
     STATICFILES_STORAGE = 'storages.backends.s3boto3.S3StaticStorage'
 
 
 else:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware'),
+        'debug_toolbar.middleware.DebugToolbarMiddleware'
+    )
+
     try:
         from .local_settings_ import *
     except ImportError:
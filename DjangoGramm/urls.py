@@ -27,8 +27,9 @@ urlpatterns = [
 
 
 if settings.DEBUG:
-    import debug_toolbar
-    urlpatterns += path('__debug__/', include(debug_toolbar.urls)),
-
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
+
+if not settings.PRODUCTION:
+    import debug_toolbar
+    urlpatterns += path('__debug__/', include(debug_toolbar.urls)),
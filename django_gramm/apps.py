@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DjangoGrammConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'django_gramm'
+
+    def ready(self):
+        from django_gramm import caching, search, thumbnails  # noqa: F401
@@ -0,0 +1,193 @@
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, TypeVar, Union
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from django_gramm.models import BlockedUserList, Photo, Post, User
+from django_gramm.replicas import primary_reads, reads_from_replica
+from django_gramm.signals import (
+    post_changed, relations_changed, user_changed
+)
+
+POST_NAMESPACE = 'post'
+USER_NAMESPACE = 'user'
+RELATIONS_NAMESPACE = 'relations'
+
+T = TypeVar('T')
+
+
+class IdSet:
+    # A sorted array takes 8 bytes per id in the cache, membership is a
+    # binary search.
+    __slots__ = '_ids',
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = array('q', sorted(set(ids)))
+
+    def __contains__(self, pk) -> bool:
+        index = bisect_left(self._ids, pk)
+
+        return index < len(self._ids) and self._ids[index] == pk
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def _get_version_key(namespace: str, pk: int) -> str:
+    return f'{namespace}:{pk}:version'
+
+
+def _create_version() -> int:
+    return time.time_ns()
+
+
+def get_versions(namespace: str, pks: Iterable[int]) -> Dict[int, int]:
+    keys = {_get_version_key(namespace, pk): pk for pk in set(pks)}
+
+    versions = cache.get_many(keys)
+
+    missing_versions = {
+        key: _create_version() for key in keys if key not in versions
+    }
+
+    if missing_versions:
+        cache.set_many(missing_versions, None)
+        versions.update(missing_versions)
+
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def bump_version(namespace: str, pk: int) -> None:
+    cache.set(_get_version_key(namespace, pk), _create_version(), None)
+
+
+def _get_fragment_version(version: int) -> Union[int, str]:
+    # The replica may not have the recent changes yet, so the fragments
+    # rendered from it are kept apart until it has caught up.
+    if reads_from_replica() and time.time_ns() - version < (
+            settings.DATABASE_REPLICA_PIN_SECONDS * 10 ** 9):
+
+        return f'{version}:replica'
+
+    return version
+
+
+def attach_cache_versions(posts: Iterable[Post]) -> None:
+    posts = list(posts)
+
+    post_versions = get_versions(POST_NAMESPACE, (post.pk for post in posts))
+    user_versions = get_versions(
+        USER_NAMESPACE, (post.user_id for post in posts)
+    )
+
+    for post in posts:
+        post.cache_version = _get_fragment_version(post_versions[post.pk])
+        post.user.cache_version = _get_fragment_version(
+            user_versions[post.user_id]
+        )
+
+
+def get_cached_user_data(
+        username: str, loader: Callable[[str], User]) -> User:
+
+    key = f'user_data:{username}'
+
+    cached_user_data = cache.get(key)
+
+    if cached_user_data is not None:
+        user_pk, version, user = cached_user_data
+
+        if get_versions(USER_NAMESPACE, [user_pk])[user_pk] == version:
+            user.cache_version = version
+
+            return user
+
+    # The cached data outlives the replica lag.
+    with primary_reads():
+        user = loader(username)
+
+    version = get_versions(USER_NAMESPACE, [user.pk])[user.pk]
+    cache.set(key, (user.pk, version, user), settings.CACHE_TIMEOUT)
+
+    user.cache_version = version
+
+    return user
+
+
+def get_cached_relation_ids(
+        user_pk: int, name: str, loader: Callable[[int], T]) -> T:
+
+    key = f'user_relations:{name}:{user_pk}'
+
+    # The version is read first, so a change during the loading leaves
+    # the stored ids outdated instead of the current ones.
+    version = get_versions(RELATIONS_NAMESPACE, [user_pk])[user_pk]
+
+    cached_relation_ids = cache.get(key)
+
+    if cached_relation_ids is not None:
+        cached_version, relation_ids = cached_relation_ids
+
+        if cached_version == version:
+            return relation_ids
+
+    with primary_reads():
+        relation_ids = loader(user_pk)
+    cache.set(key, (version, relation_ids), settings.CACHE_TIMEOUT)
+
+    return relation_ids
+
+
+@receiver(post_changed)
+def _bump_post_version(sender, post_id: int, **kwargs):
+    bump_version(POST_NAMESPACE, post_id)
+
+
+@receiver(user_changed)
+def _bump_user_version(sender, user_id: int, **kwargs):
+    bump_version(USER_NAMESPACE, user_id)
+
+
+@receiver(relations_changed)
+def _bump_relations_version(sender, user_id: int, **kwargs):
+    bump_version(RELATIONS_NAMESPACE, user_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def _bump_saved_post_version(sender, instance: Post, **kwargs):
+    bump_version(POST_NAMESPACE, instance.pk)
+
+
+@receiver(post_save, sender=Photo)
+def _bump_photo_post_version(sender, instance: Photo, **kwargs):
+    bump_version(POST_NAMESPACE, instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def _bump_saved_user_version(sender, instance: User, **kwargs):
+    bump_version(USER_NAMESPACE, instance.pk)
+
+
+@receiver(post_save, sender=User)
+def _bump_created_user_relations_version(
+        sender, instance: User, created: bool, **kwargs):
+
+    if created:
+        bump_version(RELATIONS_NAMESPACE, instance.pk)
+
+
+@receiver(post_save, sender=BlockedUserList)
+@receiver(post_delete, sender=BlockedUserList)
+def _bump_blocking_user_relations_version(
+        sender, instance: BlockedUserList, **kwargs):
+
+    bump_version(RELATIONS_NAMESPACE, instance.user_id_id)
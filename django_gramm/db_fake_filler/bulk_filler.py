@@ -0,0 +1,372 @@
+import logging
+import os
+import uuid
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Max
+
+from django_gramm.models import Photo, Post, TimelineEntry, User
+from django_gramm.models_manager import (
+    PostManager, ThumbnailJobManager, UserManager
+)
+from django_gramm.search import bump_usernames_version
+
+FOLLOW_GRAPHS = 'power-law', 'uniform'
+
+_POWER_LAW_EXPONENT = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def _iterate_chunks(array: np.ndarray, size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(array), size):
+        yield array[start:start + size]
+
+
+def _insert_pairs(
+        model_label: str, field_names: Tuple[str, str],
+        pairs: np.ndarray) -> None:
+
+    model = apps.get_model(model_label)
+    first_field, second_field = field_names
+
+    model.objects.bulk_create(
+        [
+            model(**{first_field: int(first), second_field: int(second)})
+            for first, second in pairs
+        ],
+        ignore_conflicts=True
+    )
+
+
+def _insert_pairs_from_args(args) -> None:
+    _insert_pairs(*args)
+
+
+def _get_new_pks(model, last_pk: int, *fields: str) -> np.ndarray:
+    # bulk_create doesn't return the pks on every database.
+    rows = model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+        'pk', *fields
+    )
+
+    return np.array(list(rows.iterator()), dtype=np.int64).reshape(
+        -1, len(fields) + 1
+    )
+
+
+def _get_last_pk(model) -> int:
+    return model.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+
+
+class BulkDbFiller:
+    def __init__(
+            self, users_number: int, posts_per_user: float,
+            follows_per_user: float, likes_per_post: float,
+            follow_graph: str = 'power-law', path_to_photos: str = None,
+            skip_images: bool = False, skip_timelines: bool = False,
+            batch_size: int = 10000, processes: int = 1,
+            seed: Optional[int] = None, password: str = 'password',
+            log: Callable[[str], None] = logger.info
+    ):
+        self._users_number = users_number
+        self._posts_per_user = posts_per_user
+        self._follows_per_user = follows_per_user
+        self._likes_per_post = likes_per_post
+        self._follow_graph = follow_graph
+
+        self._path_to_photos = path_to_photos
+        self._skip_images = skip_images
+        self._skip_timelines = skip_timelines
+
+        self._batch_size = batch_size
+        self._processes = processes
+        self._password = password
+        self._log = log
+
+        self._random = np.random.default_rng(seed)
+
+    def _insert_pairs_in_batches(
+            self, model, field_names: Tuple[str, str],
+            batches: Iterable[np.ndarray]) -> int:
+
+        args = (
+            (model._meta.label, field_names, pairs) for pairs in batches
+        )
+
+        # The conflicting pairs are skipped, so only the table knows how
+        # many rows were inserted.
+        rows_number = model.objects.count()
+
+        if self._processes <= 1:
+            for pairs_args in args:
+                _insert_pairs_from_args(pairs_args)
+        else:
+            # Forked workers must not share the parent's database
+            # connections.
+            connections.close_all()
+
+            with Pool(self._processes) as pool:
+                for _ in pool.imap_unordered(_insert_pairs_from_args, args):
+                    pass
+
+        return model.objects.count() - rows_number
+
+    def _get_popularity(self, size: int) -> np.ndarray:
+        if self._follow_graph == 'uniform':
+            weights = np.ones(size)
+        else:
+            ranks = self._random.permutation(size) + 1
+            weights = ranks ** -_POWER_LAW_EXPONENT
+
+        return np.cumsum(weights / weights.sum())
+
+    def _sample(
+            self, values: np.ndarray, cumulative_weights: np.ndarray,
+            size: int) -> np.ndarray:
+
+        indexes = np.searchsorted(
+            cumulative_weights, self._random.random(size)
+        )
+
+        return values[np.minimum(indexes, len(values) - 1)]
+
+    @staticmethod
+    def _unique_pairs(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+        return np.unique(np.column_stack((first, second)), axis=0)
+
+    def create_users(self) -> np.ndarray:
+        # Hashing a password for every user would take most of the time.
+        password = make_password(self._password)
+        prefix = f'fake_{uuid.uuid4().hex[:8]}_'
+
+        last_pk = _get_last_pk(User)
+
+        for start in range(0, self._users_number, self._batch_size):
+            stop = min(start + self._batch_size, self._users_number)
+
+            User.objects.bulk_create([
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com', password=password
+                ) for number in range(start, stop)
+            ])
+
+        # bulk_create doesn't send the signals that update the search.
+        bump_usernames_version()
+
+        user_ids = _get_new_pks(User, last_pk)[:, 0]
+        self._log(f'Created {len(user_ids)} users')
+
+        return user_ids
+
+    def create_follows(
+            self, user_ids: np.ndarray,
+            popularity: np.ndarray) -> int:
+
+        degrees = self._random.poisson(self._follows_per_user, len(user_ids))
+
+        def batches():
+            # Every chunk of followers gives about one batch of rows.
+            chunk_size = max(
+                1, int(self._batch_size / max(self._follows_per_user, 1))
+            )
+
+            for chunk in _iterate_chunks(
+                    np.arange(len(user_ids)), chunk_size):
+
+                followers = np.repeat(user_ids[chunk], degrees[chunk])
+                followed = self._sample(user_ids, popularity, len(followers))
+
+                pairs = self._unique_pairs(followed, followers)
+
+                # Users don't follow themselves.
+                yield pairs[pairs[:, 0] != pairs[:, 1]]
+
+        follows_number = self._insert_pairs_in_batches(
+            User.followers.through, ('from_user_id', 'to_user_id'), batches()
+        )
+        self._log(f'Created {follows_number} follows')
+
+        return follows_number
+
+    def _save_fake_photos(self) -> List[str]:
+        if not os.path.isdir(self._path_to_photos):
+            raise ValueError('There is no directory with fake photos!')
+
+        photo_names = sorted(os.listdir(self._path_to_photos))
+
+        stored_names = []
+
+        # Every post shares one of a few stored files.
+        for photo_name in photo_names:
+            with open(
+                    os.path.join(self._path_to_photos, photo_name), 'rb'
+            ) as photo:
+                stored_names.append(default_storage.save(
+                    f'fake_photos/{photo_name}', File(photo)
+                ))
+
+        return stored_names
+
+    def create_posts(self, user_ids: np.ndarray) -> np.ndarray:
+        posts_numbers = self._random.poisson(
+            self._posts_per_user, len(user_ids)
+        )
+        authors = np.repeat(user_ids, posts_numbers)
+
+        last_pk = _get_last_pk(Post)
+
+        for chunk in _iterate_chunks(authors, self._batch_size):
+            Post.objects.bulk_create([
+                Post(user_id=int(author), description='Test description')
+                for author in chunk
+            ])
+
+        posts = _get_new_pks(Post, last_pk, 'user_id')
+        self._log(f'Created {len(posts)} posts')
+
+        if self._path_to_photos is not None:
+            self._create_photos(posts[:, 0])
+
+        return posts
+
+    def _create_photos(self, post_ids: np.ndarray) -> None:
+        photo_names = self._save_fake_photos()
+        photo_indexes = self._random.integers(
+            len(photo_names), size=len(post_ids)
+        )
+
+        last_pk = _get_last_pk(Photo)
+
+        for chunk in _iterate_chunks(
+                np.column_stack((post_ids, photo_indexes)),
+                self._batch_size):
+
+            Photo.objects.bulk_create([
+                Photo(
+                    post_id=int(post_id),
+                    post_image=photo_names[photo_index]
+                ) for post_id, photo_index in chunk
+            ])
+
+        if self._skip_images:
+            return
+
+        for chunk in _iterate_chunks(
+                _get_new_pks(Photo, last_pk)[:, 0], self._batch_size):
+
+            ThumbnailJobManager.enqueue_many(
+                photo.post_image
+                for photo in Photo.objects.filter(pk__in=chunk.tolist())
+            )
+
+        self._log(f'Queued thumbnails of {len(post_ids)} photos')
+
+    def create_likes(
+            self, user_ids: np.ndarray, posts: np.ndarray,
+            popularity: np.ndarray) -> int:
+
+        if not len(posts):
+            return 0
+
+        # Posts of the popular authors get the most likes.
+        author_indexes = np.searchsorted(user_ids, posts[:, 1])
+        weights = np.diff(popularity, prepend=0)[author_indexes]
+        post_popularity = np.cumsum(weights / weights.sum())
+
+        likes_number = int(len(posts) * self._likes_per_post)
+
+        def batches():
+            for start in range(0, likes_number, self._batch_size):
+                size = min(self._batch_size, likes_number - start)
+
+                yield self._unique_pairs(
+                    self._sample(posts[:, 0], post_popularity, size),
+                    self._random.choice(user_ids, size)
+                )
+
+        likes_number = self._insert_pairs_in_batches(
+            Post.likes.through, ('post_id', 'user_id'), batches()
+        )
+        self._log(f'Created {likes_number} likes')
+
+        return likes_number
+
+    def _create_timelines(self, user_ids: np.ndarray) -> None:
+        User.objects.filter(
+            followers_number__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).update(fanout_on_read=True)
+
+        backfill_size = settings.TIMELINE_BACKFILL_SIZE
+        follows = User.followers.through.objects
+
+        for chunk in _iterate_chunks(
+                user_ids, max(1, self._batch_size // backfill_size)):
+
+            owner_ids = chunk.tolist()
+
+            authors = {owner_id: [owner_id] for owner_id in owner_ids}
+
+            for owner_id, author_id in follows.filter(
+                    to_user_id__in=owner_ids,
+                    from_user__fanout_on_read=False).values_list(
+                    'to_user_id', 'from_user_id'):
+
+                authors[owner_id].append(author_id)
+
+            author_posts = {}
+
+            for post_id, author_id, created_date in Post.objects.filter(
+                    user_id__in={
+                        author_id for owner_authors in authors.values()
+                        for author_id in owner_authors
+                    }).order_by('-created_date', '-pk').values_list(
+                    'pk', 'user_id', 'created_date'):
+
+                posts = author_posts.setdefault(author_id, [])
+
+                if len(posts) < backfill_size:
+                    posts.append((post_id, created_date))
+
+            TimelineEntry.objects.bulk_create(
+                [
+                    TimelineEntry(
+                        owner_id=owner_id, post_id=post_id,
+                        created_date=created_date
+                    )
+                    for owner_id, owner_authors in authors.items()
+                    for author_id in owner_authors
+                    for post_id, created_date in author_posts.get(
+                        author_id, ()
+                    )
+                ],
+                batch_size=settings.TIMELINE_BATCH_SIZE,
+                ignore_conflicts=True
+            )
+
+        self._log(f'Created timelines of {len(user_ids)} users')
+
+    def fill_db(self) -> None:
+        user_ids = self.create_users()
+        popularity = self._get_popularity(len(user_ids))
+
+        self.create_follows(user_ids, popularity)
+
+        posts = self.create_posts(user_ids)
+
+        self.create_likes(user_ids, posts, popularity)
+
+        PostManager.recount_counters(self._batch_size)
+        UserManager.recount_counters(self._batch_size)
+        self._log('Recounted the counters')
+
+        if not self._skip_timelines:
+            self._create_timelines(user_ids)
@@ -27,6 +27,7 @@ class UserFiller:
                 username=user.username, email=user.email
             )
             user_object.set_password(raw_password=user.password)
+            user_object.save()
             
             users.append(user_object)
 
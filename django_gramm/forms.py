@@ -1,4 +1,6 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.contrib.auth.forms import (
     UserCreationForm, AuthenticationForm,
     UserChangeForm, PasswordChangeForm, PasswordResetForm, SetPasswordForm
@@ -6,6 +8,7 @@ from django.contrib.auth.forms import (
 
 from allauth.account.forms import LoginForm, SignupForm
 
+from django_gramm.images import prepare_image, prepare_images
 from django_gramm.models import User, Post, Photo, Comment
 
 
@@ -94,6 +97,10 @@ class UserEditForm(UserChangeForm):
         model = User
         fields = 'picture', 'username', 'password', 'email', 'description'
 
+        # Images are checked by their header in clean_picture instead of
+        # the full decode of the ImageField.
+        field_classes = {'picture': forms.FileField}
+
         widgets = {
             'username': forms.TextInput(
                 attrs={'class': 'form-control'}
@@ -116,6 +123,14 @@ class UserEditForm(UserChangeForm):
             )
         }
 
+    def clean_picture(self):
+        picture = self.cleaned_data['picture']
+
+        if isinstance(picture, UploadedFile):
+            return prepare_image(picture)
+
+        return picture
+
 
 class PasswordEditForm(PasswordChangeForm):
     old_password = forms.CharField(
@@ -142,6 +157,28 @@ class PhotoForm(forms.ModelForm):
         )}
 
 
+class PhotosForm(forms.Form):
+    post_image = forms.FileField(
+        label='Photos',
+        widget=forms.ClearableFileInput(
+            attrs={
+                'class': 'btn btn-primary btn-block',
+                'multiple': True, 'accept': 'image/*',
+            }
+        )
+    )
+
+    def clean_post_image(self):
+        post_images = self.files.getlist(self.add_prefix('post_image'))
+
+        if len(post_images) > settings.POST_MAX_PHOTOS:
+            raise forms.ValidationError(
+                f'A post can have at most {settings.POST_MAX_PHOTOS} photos'
+            )
+
+        return prepare_images(post_images)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
@@ -154,6 +191,56 @@ class PostForm(forms.ModelForm):
         }
 
 
+def _get_upload_content_type_choices():
+    return [
+        (content_type, content_type)
+        for content_type in settings.DIRECT_UPLOAD_CONTENT_TYPES
+    ]
+
+
+class PostUploadForm(forms.Form):
+    content_type = forms.ChoiceField(choices=_get_upload_content_type_choices)
+    size = forms.IntegerField(min_value=1)
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+
+        if size > settings.DIRECT_UPLOAD_MAX_SIZE:
+            raise forms.ValidationError('The file is too large')
+
+        return size
+
+
+class LikeTogglesForm(forms.Form):
+    toggles = forms.JSONField()
+
+    def clean_toggles(self):
+        toggles = self.cleaned_data['toggles']
+
+        if (
+                not isinstance(toggles, list) or
+                len(toggles) > settings.LIKE_TOGGLES_MAX_NUMBER
+        ):
+            raise forms.ValidationError('Invalid list of like toggles')
+
+        try:
+            cleaned_toggles = [
+                (int(toggle['post_id']), toggle['liked'])
+                for toggle in toggles
+            ]
+        except (TypeError, KeyError, ValueError):
+            raise forms.ValidationError('Invalid like toggle')
+
+        if not all(isinstance(liked, bool) for _, liked in cleaned_toggles):
+            raise forms.ValidationError('Invalid like toggle')
+
+        return cleaned_toggles
+
+
+class CommitPostUploadForm(PostForm):
+    token = forms.CharField()
+
+
 class UserPasswordResetForm(PasswordResetForm):
     class Meta:
         widgets = {
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Iterable, List, Tuple, TypeVar, Union
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from easy_thumbnails.models import Source, Thumbnail
+from easy_thumbnails.storage import thumbnail_default_storage
+from easy_thumbnails.utils import get_storage_hash
+from PIL import Image, UnidentifiedImageError
+
+T = TypeVar('T')
+
+
+def map_in_threads(function: Callable[..., T], *iterables) -> List[T]:
+    # Pillow and the storage backends release the GIL while decoding and
+    # uploading, so the slowest image sets the time.
+    with ThreadPoolExecutor(settings.IMAGE_THREADS) as executor:
+        return list(executor.map(function, *iterables))
+
+
+def inspect_image(image_file: File) -> Tuple[str, Tuple[int, int]]:
+    if image_file.size > settings.IMAGE_MAX_SIZE:
+        raise ValidationError(
+            'The file %(name)s is too large.',
+            code='file_too_large', params={'name': image_file.name}
+        )
+
+    try:
+        # Opening reads the header only, the pixels are decoded lazily.
+        with Image.open(image_file, formats=settings.IMAGE_FORMATS) as image:
+            image_format, image_size = image.format, image.size
+    except (
+            UnidentifiedImageError, Image.DecompressionBombError,
+            SyntaxError, OSError):
+        raise ValidationError(
+            'Upload a valid image. The file %(name)s is not an image.',
+            code='invalid_image', params={'name': image_file.name}
+        )
+    finally:
+        image_file.seek(0)
+
+    width, height = image_size
+
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'The image %(name)s has too many pixels.',
+            code='image_too_large', params={'name': image_file.name}
+        )
+
+    return image_format, image_size
+
+
+def downscale_image(image_file: File) -> File:
+    max_side = settings.IMAGE_MAX_SIDE
+
+    with Image.open(image_file, formats=settings.IMAGE_FORMATS) as image:
+        if max(image.size) <= max_side:
+            image_file.seek(0)
+
+            return image_file
+
+        image_format = image.format
+        save_options = {'quality': settings.IMAGE_QUALITY}
+
+        if 'exif' in image.info:
+            save_options['exif'] = image.info['exif']
+
+        # JPEGs are decoded right at a reduced scale.
+        image.draft(None, (max_side, max_side))
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        downscaled_file = BytesIO()
+        image.save(downscaled_file, image_format, **save_options)
+
+    return ContentFile(downscaled_file.getvalue(), name=image_file.name)
+
+
+def prepare_image(image_file: File) -> File:
+    inspect_image(image_file)
+
+    return downscale_image(image_file)
+
+
+def _prepare_image_or_error(
+        image_file: File) -> Union[File, ValidationError]:
+
+    try:
+        return prepare_image(image_file)
+    except ValidationError as error:
+        return error
+
+
+def prepare_images(image_files: Iterable[File]) -> List[File]:
+    prepared_files = map_in_threads(_prepare_image_or_error, image_files)
+
+    errors = [
+        error for error in prepared_files
+        if isinstance(error, ValidationError)
+    ]
+
+    if errors:
+        raise ValidationError(errors)
+
+    return prepared_files
+
+
+def delete_images(names: Iterable[str]) -> None:
+    names = list(names)
+
+    sources = Source.objects.filter(
+        storage_hash=get_storage_hash(default_storage), name__in=names
+    )
+    thumbnail_names = list(Thumbnail.objects.filter(
+        source__in=sources,
+        storage_hash=get_storage_hash(thumbnail_default_storage)
+    ).values_list('name', flat=True))
+
+    map_in_threads(default_storage.delete, names)
+    map_in_threads(thumbnail_default_storage.delete, thumbnail_names)
+
+    sources.delete()
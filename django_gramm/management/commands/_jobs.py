@@ -0,0 +1,89 @@
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.management import BaseCommand
+from django.db import connections
+
+
+class JobsCommand(BaseCommand):
+    jobs_manager = None
+    jobs_name = 'jobs'
+
+    @staticmethod
+    def process_job(job):
+        raise NotImplementedError
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--processes', type=int, default=os.cpu_count(),
+            help='Number of worker processes. 1 processes jobs in place.'
+        )
+
+        parser.add_argument(
+            '-b', '--batch-size', type=int,
+            help='Number of jobs claimed at once.'
+        )
+
+        parser.add_argument(
+            '-l', '--loop', action='store_true',
+            help='Keeps processing the queue until interrupted.'
+        )
+
+        parser.add_argument(
+            '-i', '--interval', type=float, default=5,
+            help='Seconds to wait when the queue is empty in the loop mode.'
+        )
+
+    def _process_jobs(self, pool, batch_size: int) -> int:
+        self.jobs_manager.requeue_stale_jobs()
+
+        jobs = self.jobs_manager.claim_jobs(batch_size)
+
+        if pool is None:
+            results = map(self.process_job, jobs)
+        else:
+            results = pool.imap_unordered(self.process_job, jobs)
+
+        # A processed job sets its own final state, only the failures are
+        # recorded for the retries.
+        for job_id, error in results:
+            if error is not None:
+                self.jobs_manager.fail_job(job_id, error)
+
+                self.stderr.write(f'Job {job_id} failed - {error}')
+
+        if jobs:
+            self.stdout.write(f'Processed {len(jobs)} {self.jobs_name}')
+
+        return len(jobs)
+
+    def _handle(self, pool, options) -> None:
+        if not options['loop']:
+            while self._process_jobs(pool, options['batch_size']):
+                pass
+
+            self.stdout.write(
+                self.style.SUCCESS('Processing the jobs was successful')
+            )
+
+            return
+
+        try:
+            while True:
+                if not self._process_jobs(pool, options['batch_size']):
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Processing was stopped'))
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self._handle(None, options)
+
+            return
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+
+        with Pool(options['processes']) as pool:
+            self._handle(pool, options)
@@ -0,0 +1,92 @@
+import os
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import BaseCommand
+
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+
+from django_gramm.thumbnails import get_variant_formats, get_variant_options
+
+
+class Command(BaseCommand):
+    help = 'Comparing of the thumbnail formats encode time and size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--path_to_photos', type=str,
+            default='django_gramm/db_fake_filler/fake_photos',
+            help='Changes the default photo path to yours.'
+        )
+
+    @staticmethod
+    def _generate_thumbnail(path: str, thumbnail_format: str, options: dict):
+        with open(path, 'rb') as photo:
+            thumbnailer = get_thumbnailer(
+                File(photo), relative_name=os.path.basename(path)
+            )
+            thumbnailer.thumbnail_extension = thumbnail_format
+
+            started = time.perf_counter()
+            thumbnail = thumbnailer.generate_thumbnail(options)
+
+            return time.perf_counter() - started, thumbnail.size
+
+    def _benchmark(self, paths: list) -> dict:
+        results = defaultdict(lambda: [0.0, 0, 0])
+
+        for alias in settings.THUMBNAIL_VARIANT_ALIASES:
+            options = aliases.get(alias)
+
+            formats = [('jpg', options['size'][0], options)]
+
+            for variant_format in get_variant_formats():
+                formats.extend(
+                    (variant_format, width, variant_options)
+                    for width, variant_options in get_variant_options(
+                        alias, options
+                    )
+                )
+
+            for thumbnail_format, width, format_options in formats:
+                result = results[alias, thumbnail_format, width]
+
+                for path in paths:
+                    seconds, size = self._generate_thumbnail(
+                        path, thumbnail_format, format_options
+                    )
+
+                    result[0] += seconds
+                    result[1] += size
+                    result[2] += 1
+
+        return results
+
+    def handle(self, *args, **options):
+        path_to_photos = options['path_to_photos']
+
+        paths = [
+            os.path.join(path_to_photos, name)
+            for name in sorted(os.listdir(path_to_photos))
+        ]
+
+        results = self._benchmark(paths)
+
+        self.stdout.write(
+            f'{"alias":<14}{"format":<8}{"width":>6}{"ms/image":>10}'
+            f'{"KB/image":>10}{"vs jpg":>8}'
+        )
+
+        for (alias, thumbnail_format, width), result in results.items():
+            seconds, size, images = result
+            jpg_size = results[alias, 'jpg', aliases.get(alias)['size'][0]][1]
+
+            self.stdout.write(
+                f'{alias:<14}{thumbnail_format:<8}{width:>6}'
+                f'{seconds / images * 1000:>10.1f}'
+                f'{size / images / 1024:>10.1f}'
+                f'{size / jpg_size:>8.0%}'
+            )
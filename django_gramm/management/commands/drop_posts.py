@@ -1,13 +1,27 @@
 from django.core.management import BaseCommand
 
+from django_gramm.models import Post
 from django_gramm.models_manager import PostManager
 
 
 class Command(BaseCommand):
     help = 'Deletion of all message instances.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', type=int, default=1000,
+            help='Number of posts deleted in a single transaction.'
+        )
+
     def handle(self, *args, **options):
-        PostManager.delete_all_posts()
+        posts_number = Post.objects.count()
+        deleted_number = 0
+
+        for deleted in PostManager.delete_posts_in_batches(
+                batch_size=options['batch_size']):
+
+            deleted_number += deleted
+            self.stdout.write(f'Deleted {deleted_number}/{posts_number} posts')
 
         self.stdout.write(
             self.style.SUCCESS('Deleting the posts was successful')
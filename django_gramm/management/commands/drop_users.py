@@ -1,13 +1,27 @@
 from django.core.management import BaseCommand
 
+from django_gramm.models import User
 from django_gramm.models_manager import UserManager
 
 
 class Command(BaseCommand):
     help = 'Deletion of all user instances.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', type=int, default=1000,
+            help='Number of users deleted in a single transaction.'
+        )
+
     def handle(self, *args, **options):
-        UserManager.delete_all_users()
+        users_number = User.objects.count()
+        deleted_number = 0
+
+        for deleted in UserManager.delete_users_in_batches(
+                batch_size=options['batch_size']):
+
+            deleted_number += deleted
+            self.stdout.write(f'Deleted {deleted_number}/{users_number} users')
 
         self.stdout.write(
             self.style.SUCCESS('Deleting users was successful')
@@ -0,0 +1,91 @@
+from django.core.management import BaseCommand, CommandError
+
+from django_gramm.db_fake_filler.bulk_filler import (
+    FOLLOW_GRAPHS, BulkDbFiller
+)
+
+
+class Command(BaseCommand):
+    help = 'Filling the db with a large generated dataset for load tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Number of generated users.'
+        )
+
+        parser.add_argument(
+            '--posts-per-user', type=float, default=10,
+            help='Mean number of posts of a user.'
+        )
+
+        parser.add_argument(
+            '--follows-per-user', type=float, default=50,
+            help='Mean number of users followed by a user.'
+        )
+
+        parser.add_argument(
+            '--follow-graph', choices=FOLLOW_GRAPHS, default='power-law',
+            help='Distribution of the followers between the users.'
+        )
+
+        parser.add_argument(
+            '--likes-per-post', type=float, default=5,
+            help='Mean number of likes of a post.'
+        )
+
+        parser.add_argument(
+            '-p', '--path_to_photos', type=str,
+            default='django_gramm/db_fake_filler/fake_photos',
+            help='Changes the default photo path to yours.'
+        )
+
+        parser.add_argument(
+            '--skip-images', action='store_true',
+            help='Serves the original photos without queueing thumbnails.'
+        )
+
+        parser.add_argument(
+            '--skip-timelines', action='store_true',
+            help='Leaves the timeline entries of the new users empty.'
+        )
+
+        parser.add_argument(
+            '-b', '--batch-size', type=int, default=10000,
+            help='Number of rows inserted by a single statement.'
+        )
+
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Number of processes inserting the follows and likes.'
+        )
+
+        parser.add_argument(
+            '--seed', type=int,
+            help='Seed of the random generator for repeatable datasets.'
+        )
+
+    def handle(self, *args, **options):
+        db_filler = BulkDbFiller(
+            users_number=options['users'],
+            posts_per_user=options['posts_per_user'],
+            follows_per_user=options['follows_per_user'],
+            likes_per_post=options['likes_per_post'],
+            follow_graph=options['follow_graph'],
+            path_to_photos=options['path_to_photos'],
+            skip_images=options['skip_images'],
+            skip_timelines=options['skip_timelines'],
+            batch_size=options['batch_size'],
+            processes=options['processes'],
+            seed=options['seed'],
+            log=self.stdout.write
+        )
+
+        try:
+            db_filler.fill_db()
+        except ValueError as exception:
+            raise CommandError(exception)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Filling of the database was successful'
+        ))
@@ -0,0 +1,12 @@
+from django_gramm.management.commands._jobs import JobsCommand
+from django_gramm.models_manager import PostUploadManager
+from django_gramm.uploads import process_upload
+
+
+class Command(JobsCommand):
+    help = 'Validating of the direct uploads and creating of their posts.'
+
+    jobs_manager = PostUploadManager
+    jobs_name = 'post uploads'
+
+    process_job = staticmethod(process_upload)
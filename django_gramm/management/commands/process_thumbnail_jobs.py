@@ -0,0 +1,12 @@
+from django_gramm.management.commands._jobs import JobsCommand
+from django_gramm.models_manager import ThumbnailJobManager
+from django_gramm.thumbnails import process_job
+
+
+class Command(JobsCommand):
+    help = 'Generating of the thumbnails queued by the uploads.'
+
+    jobs_manager = ThumbnailJobManager
+    jobs_name = 'thumbnail jobs'
+
+    process_job = staticmethod(process_job)
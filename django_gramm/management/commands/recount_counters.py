@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+
+from django_gramm.models_manager import PostManager, UserManager
+
+
+class Command(BaseCommand):
+    help = 'Recalculation of the denormalized post and user counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', type=int, default=1000,
+            help='Number of rows updated by a single statement.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        posts_number = PostManager.recount_counters(batch_size)
+        self.stdout.write(f'Recounted counters of {posts_number} posts')
+
+        users_number = UserManager.recount_counters(batch_size)
+        self.stdout.write(f'Recounted counters of {users_number} users')
+
+        self.stdout.write(
+            self.style.SUCCESS('Recounting the counters was successful')
+        )
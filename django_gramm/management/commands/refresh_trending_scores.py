@@ -0,0 +1,48 @@
+import time
+
+from django.core.management import BaseCommand
+
+from django_gramm.models_manager import TrendingManager
+
+
+class Command(BaseCommand):
+    help = 'Refreshing of the trending scores used by recommended posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b', '--batch-size', type=int,
+            help='Number of scores saved by a single transaction.'
+        )
+
+        parser.add_argument(
+            '-l', '--loop', action='store_true',
+            help='Keeps refreshing the scores until interrupted.'
+        )
+
+        parser.add_argument(
+            '-i', '--interval', type=float, default=60,
+            help='Seconds between two refreshes in the loop mode.'
+        )
+
+    def _refresh_scores(self, batch_size: int) -> None:
+        refreshed_number = TrendingManager.refresh_scores(batch_size)
+
+        self.stdout.write(f'Refreshed scores of {refreshed_number} posts')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self._refresh_scores(options['batch_size'])
+
+            self.stdout.write(
+                self.style.SUCCESS('Refreshing the scores was successful')
+            )
+
+            return
+
+        try:
+            while True:
+                self._refresh_scores(options['batch_size'])
+
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Refreshing was stopped'))
@@ -0,0 +1,188 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from django_gramm.replicas import replica_routing
+
+logger = logging.getLogger('django_gramm.performance')
+
+_MISSING = object()
+
+_SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'TRACE'))
+
+
+class _RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+        self.template_time = 0.0
+        self._template_started = None
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def start_template_render(self) -> None:
+        self._template_started = time.perf_counter()
+
+    def finish_template_render(self, response) -> None:
+        self.template_time += time.perf_counter() - self._template_started
+
+    def wrap_cache_get(self, get):
+        def wrapped_get(key, default=None, version=None):
+            value = get(key, _MISSING, version)
+
+            if value is _MISSING:
+                self.cache_misses += 1
+
+                return default
+
+            self.cache_hits += 1
+
+            return value
+
+        return wrapped_get
+
+    def wrap_cache_get_many(self, get_many):
+        def wrapped_get_many(keys, version=None):
+            keys = list(keys)
+            values = get_many(keys, version)
+
+            self.cache_hits += len(values)
+            self.cache_misses += len(keys) - len(values)
+
+            return values
+
+        return wrapped_get_many
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def _instrument_caches(stack: ExitStack, metrics: _RequestMetrics):
+        # The cache instances are per thread, so patching them only affects
+        # the current request.
+        for alias in settings.CACHES:
+            cache = caches[alias]
+
+            cache.get = metrics.wrap_cache_get(cache.get)
+            cache.get_many = metrics.wrap_cache_get_many(cache.get_many)
+
+            stack.callback(vars(cache).pop, 'get_many')
+            stack.callback(vars(cache).pop, 'get')
+
+    @staticmethod
+    def _get_response_size(response):
+        if response.streaming:
+            return None
+
+        return len(response.content)
+
+    def _report(
+            self, request, response, metrics: _RequestMetrics,
+            total_time: float) -> None:
+
+        resolver_match = request.resolver_match
+
+        logger.info(json.dumps({
+            'view': resolver_match.view_name if resolver_match else None,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 2),
+            'template_ms': round(metrics.template_time * 1000, 2),
+            'cache_hits': metrics.cache_hits,
+            'cache_misses': metrics.cache_misses,
+            'response_bytes': self._get_response_size(response),
+            'total_ms': round(total_time * 1000, 2),
+        }))
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics.db_time * 1000:.2f};'
+                f'desc="{metrics.queries} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.2f}',
+                f'cache;desc="{metrics.cache_hits} hits, '
+                f'{metrics.cache_misses} misses"',
+                f'total;dur={total_time * 1000:.2f}',
+            ))
+
+    def __call__(self, request):
+        # Unsampled requests only pay for the random number.
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = _RequestMetrics()
+        request.performance_metrics = metrics
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute_wrapper)
+                )
+
+            self._instrument_caches(stack, metrics)
+
+            started = time.perf_counter()
+            response = self.get_response(request)
+            total_time = time.perf_counter() - started
+
+        self._report(request, response, metrics, total_time)
+
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, 'performance_metrics', None)
+
+        if metrics is not None:
+            metrics.start_template_render()
+            response.add_post_render_callback(
+                metrics.finish_template_render
+            )
+
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    pin_cookie_name = 'primary_db_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.DATABASE_REPLICA_ALIAS is None:
+            return self.get_response(request)
+
+        with replica_routing(
+                pinned=self.pin_cookie_name in request.COOKIES) as routing:
+            response = self.get_response(request)
+
+        # The raw statements bypass the router, so the unsafe requests pin
+        # the user to the primary unless their view only reads.
+        if routing.wrote or (
+                request.method not in _SAFE_METHODS and not routing.read_only):
+
+            response.set_cookie(
+                self.pin_cookie_name, '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+
+        return response
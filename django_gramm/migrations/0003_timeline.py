@@ -0,0 +1,67 @@
+# Generated by Django 3.2.5 on 2026-10-18 19:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    Post = apps.get_model('django_gramm', 'Post')
+    TimelineEntry = apps.get_model('django_gramm', 'TimelineEntry')
+    Follow = apps.get_model('django_gramm', 'User').followers.through
+
+    followers_by_author = {}
+
+    for author_id, follower_id in Follow.objects.values_list(
+            'from_user_id', 'to_user_id'):
+        followers_by_author.setdefault(author_id, []).append(follower_id)
+
+    entries = []
+
+    for post_id, author_id, created_date in Post.objects.values_list(
+            'pk', 'user_id', 'created_date'):
+        owner_ids = [author_id, *followers_by_author.get(author_id, ())]
+
+        entries.extend(
+            TimelineEntry(
+                owner_id=owner_id, post_id=post_id, created_date=created_date
+            ) for owner_id in owner_ids
+        )
+
+    TimelineEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0002_alter_post_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='django_gramm.post')),
+            ],
+            options={
+                'ordering': ('-created_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_date'], name='timeline_owner_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
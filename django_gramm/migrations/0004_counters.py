@@ -0,0 +1,79 @@
+# Generated by Django 3.2.5 on 2026-10-18 19:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count_subquery(queryset, group_by):
+    counts = queryset.order_by().values(group_by).annotate(
+        count=Count('*')
+    ).values('count')
+
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('django_gramm', 'User')
+    Post = apps.get_model('django_gramm', 'Post')
+    Comment = apps.get_model('django_gramm', 'Comment')
+
+    likes = Post.likes.through.objects
+    follows = User.followers.through.objects
+
+    Post.objects.update(
+        likes_count=_count_subquery(
+            likes.filter(post=OuterRef('pk')), 'post'
+        ),
+        comments_count=_count_subquery(
+            Comment.objects.filter(post=OuterRef('pk')), 'post'
+        ),
+    )
+
+    User.objects.update(
+        followers_number=_count_subquery(
+            follows.filter(from_user=OuterRef('pk')), 'from_user'
+        ),
+        following_number=_count_subquery(
+            follows.filter(to_user=OuterRef('pk')), 'to_user'
+        ),
+        posts_number=_count_subquery(
+            Post.objects.filter(user=OuterRef('pk')), 'user'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0003_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='posts_number',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0007_thumbnail_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='post_image_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='picture_thumbnails',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0008_thumbnail_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='post_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
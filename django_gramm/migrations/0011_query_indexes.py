@@ -0,0 +1,36 @@
+# Generated by Django 3.2.5 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+# The auto-created through tables only have the unique (from, to) index, so
+# the reverse lookups get their own covering indexes.
+THROUGH_INDEXES = (
+    ('user_followers_to_from_idx', 'django_gramm_user_followers',
+     'to_user_id, from_user_id'),
+    ('post_likes_user_post_idx', 'django_gramm_post_likes',
+     'user_id, post_id'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0010_post_uploads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', '-created_date', '-id'], name='comment_post_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['user', '-created_date', '-id'], name='post_user_date_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {name} ON {table} ({columns})',
+            f'DROP INDEX {name}'
+        )
+        for name, table, columns in THROUGH_INDEXES
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.5 on 2026-10-18 21:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# The covering indexes of the through tables start with these columns.
+REDUNDANT_THROUGH_INDEXES = (
+    ('django_gramm_user_followers', 'to_user_id'),
+    ('django_gramm_post_likes', 'user_id'),
+)
+
+
+def _get_column_index_names(schema_editor, table: str, column: str):
+    connection = schema_editor.connection
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+
+    return [
+        name for name, constraint in constraints.items()
+        if constraint['index'] and not constraint['unique']
+        and constraint['columns'] == [column]
+    ]
+
+
+def drop_through_indexes(apps, schema_editor):
+    for table, column in REDUNDANT_THROUGH_INDEXES:
+        for name in _get_column_index_names(schema_editor, table, column):
+            schema_editor.execute(
+                f'DROP INDEX {schema_editor.quote_name(name)}'
+            )
+
+
+def create_through_indexes(apps, schema_editor):
+    for table, column in REDUNDANT_THROUGH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX {table}_{column}_idx ON {table} ({column})'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='django_gramm.post'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(drop_through_indexes, create_through_indexes),
+    ]
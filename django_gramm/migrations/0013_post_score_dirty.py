@@ -0,0 +1,22 @@
+# Generated by Django 3.2.5 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_gramm', '0012_drop_redundant_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='score_dirty',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('score_dirty', True)), fields=['id'], name='post_score_dirty_idx'),
+        ),
+    ]
@@ -1,12 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
 from django.urls import reverse
 
-from easy_thumbnails.signals import saved_file
-from easy_thumbnails.signal_handlers import generate_aliases_global
-
-saved_file.connect(generate_aliases_global)
-
 
 def _create_place_to_save_user_picture(user: 'User', filename):
     return f'users/{user.username}/profile_pictures/{filename}'
@@ -20,12 +16,19 @@ class User(AbstractUser):
     picture = models.ImageField(
         upload_to=_create_place_to_save_user_picture, blank=True
     )
+    picture_thumbnails = models.JSONField(default=dict, blank=True)
 
     followers = models.ManyToManyField(
         'self', symmetrical=False, blank=True,
         related_name='following'
     )
 
+    fanout_on_read = models.BooleanField(default=False)
+
+    followers_number = models.IntegerField(default=0)
+    following_number = models.IntegerField(default=0)
+    posts_number = models.IntegerField(default=0)
+
     def get_absolute_url(self):
         return reverse('django_gramm:user_profile', args=(self.username,))
 
@@ -43,8 +46,10 @@ class BlockedUserList(models.Model):
 
 
 class Post(models.Model):
+    # post_user_date_idx starts with the user.
     user = models.ForeignKey(
-        'User', on_delete=models.CASCADE, related_name='posts'
+        'User', on_delete=models.CASCADE, related_name='posts',
+        db_index=False
     )
 
     description = models.TextField(blank=True)
@@ -54,6 +59,13 @@ class Post(models.Model):
         'User', symmetrical=False, related_name='liked_posts', blank=True
     )
 
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+
+    # Set along with the counters, the trending refresh rescores only the
+    # posts that have it.
+    score_dirty = models.BooleanField(default=True)
+
     def get_absolute_url(self):
         return reverse(
             'django_gramm:show_post',
@@ -66,6 +78,17 @@ class Post(models.Model):
     class Meta:
         ordering = '-created_date',
 
+        indexes = [
+            models.Index(
+                fields=('user', '-created_date', '-id'),
+                name='post_user_date_idx'
+            ),
+            models.Index(
+                fields=('id',), name='post_score_dirty_idx',
+                condition=models.Q(score_dirty=True)
+            ),
+        ]
+
 
 def _create_place_to_save_photo(photo_instance: 'Photo', filename: str):
     return (f'users/{photo_instance.post.user.username}/post_photos/'
@@ -81,6 +104,8 @@ class Photo(models.Model):
     post_image = models.ImageField(
         upload_to=_create_place_to_save_photo
     )
+    post_image_thumbnails = models.JSONField(default=dict, blank=True)
+    post_image_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f'Image url - {self.post_image.url}, post id - {self.post.id}'
@@ -91,9 +116,142 @@ class Comment(models.Model):
         'User', on_delete=models.CASCADE, related_name='comments'
     )
 
+    # comment_post_date_idx starts with the post.
     post = models.ForeignKey(
-        'Post', on_delete=models.CASCADE, related_name='comments'
+        'Post', on_delete=models.CASCADE, related_name='comments',
+        db_index=False
     )
 
     content = models.TextField()
     created_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('post', '-created_date', '-id'),
+                name='comment_post_date_idx'
+            )
+        ]
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(
+        'User', on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+
+    post = models.ForeignKey(
+        'Post', on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+
+    created_date = models.DateTimeField()
+
+    class Meta:
+        ordering = '-created_date',
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=('owner', 'post'), name='unique_timeline_entry'
+            )
+        ]
+
+        indexes = [
+            models.Index(
+                fields=('owner', '-created_date'),
+                name='timeline_owner_date_idx'
+            )
+        ]
+
+
+class PostScore(models.Model):
+    post = models.OneToOneField(
+        'Post', on_delete=models.CASCADE, primary_key=True,
+        related_name='score'
+    )
+
+    user = models.ForeignKey(
+        'User', on_delete=models.CASCADE, related_name='+'
+    )
+
+    score = models.FloatField()
+
+    likes_count = models.IntegerField()
+    comments_count = models.IntegerField()
+
+    created_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('-score', '-post'), name='post_score_idx'),
+            models.Index(
+                fields=('created_date',), name='post_score_created_idx'
+            ),
+        ]
+
+
+class ThumbnailJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        PROCESSING = 'processing'
+        FAILED = 'failed'
+
+    content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name='+'
+    )
+    object_id = models.PositiveBigIntegerField()
+
+    field_name = models.CharField(max_length=100)
+    file_name = models.CharField(max_length=255)
+
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('status', 'created_date'),
+                name='thumbnail_job_status_idx'
+            )
+        ]
+
+
+class PostUpload(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        PROCESSING = 'processing'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    user = models.ForeignKey(
+        'User', on_delete=models.CASCADE, related_name='post_uploads'
+    )
+
+    file_name = models.CharField(max_length=255, unique=True)
+    description = models.TextField(blank=True)
+
+    post = models.OneToOneField(
+        'Post', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+'
+    )
+
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('status', 'created_date'),
+                name='post_upload_status_idx'
+            )
+        ]
@@ -1,23 +1,565 @@
-from typing import List, Union
+import math
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import (
+    Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Type,
+    Union
+)
 
-from django.db.models import Count, F, QuerySet
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField, Case, Count, Exists, Expression, ExpressionWrapper, F,
+    Func, Max, Min, Model, OuterRef, Q, QuerySet, Subquery, Value, When,
+    prefetch_related_objects
+)
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 
-from .models import Post, User, Photo, Comment
+from .caching import IdSet, get_cached_relation_ids, get_cached_user_data
+from .images import delete_images, map_in_threads
+from .models import (
+    Post, User, Photo, Comment, TimelineEntry, PostScore, ThumbnailJob,
+    PostUpload, BlockedUserList
+)
+from .pagination import CursorPage, CursorPaginator, encode_cursor
+from .search import get_username_trie
+from .signals import post_changed, relations_changed, user_changed
+
+
+def _increment_counter(
+        model: Type[Model], pk: int, counter: str, delta: int,
+        **updates) -> None:
+
+    model.objects.filter(pk=pk).update(
+        **{counter: F(counter) + delta}, **updates
+    )
+
+
+def _insert_ignoring_conflicts(
+        model: Type[Model], values: Dict[str, int],
+        if_exists: QuerySet = None) -> bool:
+
+    quote_name = connection.ops.quote_name
+
+    columns = ', '.join(map(quote_name, values))
+    placeholders = ', '.join(['%s'] * len(values))
+    params = list(values.values())
+
+    # SQLite needs a WHERE clause to tell the upsert from a join.
+    condition = 'WHERE 1 = 1'
+
+    # Checking the referenced rows here, the deferred foreign keys would
+    # fail the whole transaction only on commit.
+    if if_exists is not None:
+        exists_sql, exists_params = if_exists.values(
+            'pk'
+        ).query.sql_with_params()
+
+        condition = f'WHERE EXISTS ({exists_sql})'
+        params.extend(exists_params)
+
+    # Unlike get_or_create, a concurrent insert can't fail the transaction.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} ({columns}) '
+            f'SELECT {placeholders} {condition} ON CONFLICT DO NOTHING',
+            params
+        )
+
+        return cursor.rowcount > 0
+
+
+def _increment_counter_returning(
+        model: Type[Model], pk: int, counter: str, delta: int,
+        **updates) -> Optional[int]:
+
+    quote_name = connection.ops.quote_name
+    counter_column = quote_name(model._meta.get_field(counter).column)
+
+    assignments = [f'{counter_column} = {counter_column} + %s']
+    params = [delta]
+
+    for name, value in updates.items():
+        column = quote_name(model._meta.get_field(name).column)
+
+        assignments.append(f'{column} = %s')
+        params.append(value)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {quote_name(model._meta.db_table)} '
+            f'SET {", ".join(assignments)} '
+            f'WHERE {quote_name(model._meta.pk.column)} = %s '
+            f'RETURNING {counter_column}',
+            [*params, pk]
+        )
+
+        row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+class _TrigramWordSimilar(Func):
+    # Whether the value is similar to a part of the text, the pg_trgm GIN
+    # indexes serve the operator.
+    arg_joiner = ' %%> '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+def _get_counter(model: Type[Model], pk: int, counter: str) -> Optional[int]:
+    return model.objects.filter(pk=pk).values_list(
+        counter, flat=True
+    ).first()
+
+
+def _count_subquery(queryset: QuerySet, group_by: str) -> Coalesce:
+    counts = queryset.order_by().values(group_by).annotate(
+        count=Count('*')
+    ).values('count')
+
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def _recount_counters_in_batches(
+        model: Type[Model], counters: Dict[str, Expression],
+        batch_size: int) -> int:
+
+    pk_range = model.objects.aggregate(min_pk=Min('pk'), max_pk=Max('pk'))
+
+    if pk_range['min_pk'] is None:
+        return 0
+
+    updated = 0
+
+    for first_pk in range(
+            pk_range['min_pk'], pk_range['max_pk'] + 1, batch_size):
+
+        updated += model.objects.filter(
+            pk__gte=first_pk, pk__lt=first_pk + batch_size
+        ).update(**counters)
+
+    return updated
+
+
+def _get_pk_batches(
+        queryset: QuerySet, batch_size: int) -> Iterator[List[int]]:
+
+    last_pk = 0
+
+    while pks := list(queryset.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', flat=True)[:batch_size]):
+
+        yield pks
+
+        last_pk = pks[-1]
+
+
+def _raw_delete(queryset: QuerySet) -> int:
+    # Skips the collector, so the cascades must be deleted beforehand.
+    return queryset._raw_delete(queryset.db)
+
+
+def _delete_thumbnail_jobs(model: Type[Model], pks: Iterable[int]) -> int:
+    return _raw_delete(ThumbnailJob.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id__in=pks
+    ))
+
+
+def _delete_unused_files(names: Iterable[str]) -> None:
+    names = set(filter(None, names))
+
+    # The fake data shares a few files between many photos.
+    names.difference_update(
+        Photo.objects.filter(post_image__in=names).values_list(
+            'post_image', flat=True
+        ),
+        User.objects.filter(picture__in=names).values_list(
+            'picture', flat=True
+        )
+    )
+
+    if names:
+        delete_images(names)
+
+
+def _requeue_stale_jobs(model: Type[Model], timeout: int) -> int:
+    stale_date = timezone.now() - timedelta(seconds=timeout)
+
+    return model.objects.filter(
+        status=model.Status.PROCESSING, updated_date__lt=stale_date
+    ).update(status=model.Status.PENDING, updated_date=timezone.now())
+
+
+def _claim_jobs(model: Type[Model], batch_size: int) -> list:
+    with transaction.atomic():
+        jobs = list(
+            model.objects.select_for_update(skip_locked=True).filter(
+                status=model.Status.PENDING
+            ).order_by('created_date', 'pk')[:batch_size]
+        )
+
+        model.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=model.Status.PROCESSING,
+            attempts=F('attempts') + 1, updated_date=timezone.now()
+        )
+
+    return jobs
+
+
+def _fail_job(
+        model: Type[Model], job_id: int, error: str,
+        max_attempts: int) -> None:
+
+    model.objects.filter(pk=job_id).update(
+        status=Case(
+            When(
+                attempts__gte=max_attempts, then=Value(model.Status.FAILED)
+            ),
+            default=Value(model.Status.PENDING)
+        ),
+        error=error, updated_date=timezone.now()
+    )
+
+
+class TimelinePaginator:
+    # Both querysets are read with their own range scans, the timeline
+    # entries and the posts share the (created_date, post id) cursor.
+    def __init__(
+            self, entries: QuerySet, fanout_on_read_posts: QuerySet,
+            per_page: int):
+
+        self._paginators = (
+            CursorPaginator(entries, ('-created_date', '-post_id'), per_page),
+            CursorPaginator(
+                fanout_on_read_posts, ('-created_date', '-pk'), per_page
+            ),
+        )
+        self.per_page = per_page
+
+    def page(self, cursor: Optional[str] = None) -> CursorPage:
+        entries_page, fanout_on_read_posts_page = (
+            paginator.page(cursor) for paginator in self._paginators
+        )
+
+        # The posts from before the switch to fan-out on read have entries
+        # too.
+        posts = {
+            post.pk: post for post in chain(
+                (entry.post for entry in entries_page),
+                fanout_on_read_posts_page
+            )
+        }
+        posts = sorted(
+            posts.values(), key=lambda post: (post.created_date, post.pk),
+            reverse=True
+        )
+
+        next_cursor = None
+
+        if (len(posts) > self.per_page or entries_page.has_next
+                or fanout_on_read_posts_page.has_next):
+
+            posts = posts[:self.per_page]
+            next_cursor = encode_cursor(
+                [posts[-1].created_date, posts[-1].pk]
+            )
+
+        prefetch_related_objects(posts, 'photo_to_post')
+
+        return CursorPage(posts, next_cursor)
+
+
+class TimelineManager:
+    @staticmethod
+    def _create_entries(owner_ids: List[int], posts: List[Post]) -> None:
+        entries = [
+            TimelineEntry(
+                owner_id=owner_id, post_id=post.pk,
+                created_date=post.created_date
+            ) for owner_id in owner_ids for post in posts
+        ]
+
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=settings.TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def _switch_to_fanout_on_read(author: User) -> None:
+        # The switch is one-way. Switching back would need the author's
+        # posts backfilled into the timeline of every follower.
+        User.objects.filter(pk=author.pk).update(fanout_on_read=True)
+
+        author.fanout_on_read = True
+
+    @classmethod
+    def push_post(cls, post: Post) -> None:
+        author = post.user
+
+        if author.fanout_on_read:
+            cls._create_entries([author.pk], [post])
+
+            return
+
+        follower_ids = list(
+            author.followers.values_list(
+                'pk', flat=True
+            )[:settings.TIMELINE_FANOUT_LIMIT + 1]
+        )
+
+        if len(follower_ids) > settings.TIMELINE_FANOUT_LIMIT:
+            cls._switch_to_fanout_on_read(author)
+            follower_ids = []
+
+        cls._create_entries([author.pk, *follower_ids], [post])
+
+    @classmethod
+    def backfill_author_posts(cls, owner: User, author: User) -> None:
+        if author.fanout_on_read:
+            return
+
+        posts = list(
+            author.posts.only(
+                'pk', 'created_date'
+            )[:settings.TIMELINE_BACKFILL_SIZE]
+        )
+
+        cls._create_entries([owner.pk], posts)
+
+    @staticmethod
+    def remove_author_posts(owner: User, author: User) -> None:
+        TimelineEntry.objects.filter(owner=owner, post__user=author).delete()
+
+    @staticmethod
+    def remove_post(post: Post) -> None:
+        TimelineEntry.objects.filter(post=post).delete()
+
+    @staticmethod
+    def get_timeline_entries(owner: User) -> QuerySet:
+        entries = TimelineEntry.objects.filter(owner=owner).exclude(
+            post__user__in=UserManager.get_blocked_users_subquery(owner)
+        ).select_related('post__user')
+
+        return entries
+
+    @staticmethod
+    def get_fanout_on_read_posts(owner: User) -> QuerySet:
+        posts = Post.objects.filter(
+            user__in=owner.following.filter(fanout_on_read=True).values('pk')
+        ).exclude(
+            user__in=UserManager.get_blocked_users_subquery(owner)
+        ).select_related('user')
+
+        return posts
+
+    @classmethod
+    def get_timeline_paginator(
+            cls, owner: User, per_page: int) -> TimelinePaginator:
+
+        return TimelinePaginator(
+            cls.get_timeline_entries(owner),
+            cls.get_fanout_on_read_posts(owner), per_page
+        )
+
+
+class TrendingManager:
+    @staticmethod
+    def calculate_score(
+            likes_count: int, comments_count: int,
+            created_date: datetime) -> float:
+
+        engagement = (
+            likes_count + comments_count * settings.TRENDING_COMMENT_WEIGHT
+        )
+
+        return (
+            math.log10(max(engagement, 1))
+            + created_date.timestamp() / settings.TRENDING_DECAY_SECONDS
+        )
+
+    @staticmethod
+    def _get_window_start() -> datetime:
+        return timezone.now() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+
+    @classmethod
+    def _get_changed_posts(cls, post_ids: List[int]) -> QuerySet:
+        # The locks make the concurrent likes and comments wait, so their
+        # flags can't be cleared before their counters are scored.
+        changed_posts = Post.objects.filter(
+            pk__in=post_ids, score_dirty=True,
+            created_date__gte=cls._get_window_start()
+        ).select_for_update(of=('self',)).order_by().values_list(
+            'pk', 'user_id', 'likes_count', 'comments_count',
+            'created_date', 'score__post'
+        )
+
+        return changed_posts
+
+    @classmethod
+    def _save_scores(cls, changed_posts: list) -> None:
+        new_scores, changed_scores = [], []
+
+        for (post_id, user_id, likes_count, comments_count,
+             created_date, scored_post_id) in changed_posts:
+
+            post_score = PostScore(
+                post_id=post_id, user_id=user_id,
+                likes_count=likes_count, comments_count=comments_count,
+                created_date=created_date,
+                score=cls.calculate_score(
+                    likes_count, comments_count, created_date
+                )
+            )
+
+            if scored_post_id is None:
+                new_scores.append(post_score)
+            else:
+                changed_scores.append(post_score)
+
+        PostScore.objects.bulk_create(new_scores, ignore_conflicts=True)
+        PostScore.objects.bulk_update(
+            changed_scores, ('score', 'likes_count', 'comments_count')
+        )
+
+    @classmethod
+    def _refresh_scores_batch(cls, post_ids: List[int]) -> int:
+        with transaction.atomic():
+            changed_posts = list(cls._get_changed_posts(post_ids))
+
+            cls._save_scores(changed_posts)
+
+            # The posts out of the window only lose their flags.
+
+            Post.objects.filter(pk__in=post_ids).update(score_dirty=False)
+
+        return len(changed_posts)
+
+    @classmethod
+    def refresh_scores(cls, batch_size: int = None) -> int:
+        batch_size = batch_size or settings.TRENDING_BATCH_SIZE
+
+        PostScore.objects.filter(
+            created_date__lt=cls._get_window_start()
+        ).delete()
+
+        refreshed = 0
+
+        for post_ids in _get_pk_batches(
+                Post.objects.filter(score_dirty=True), batch_size):
+
+            refreshed += cls._refresh_scores_batch(post_ids)
+
+        return refreshed
+
+    @staticmethod
+    def get_trending_posts(
+            user: User, exclude_following: bool = True
+    ) -> Union[QuerySet, List[Post]]:
+
+        posts = Post.objects.filter(
+            score__isnull=False
+        ).exclude(score__user=user).exclude(
+            score__user__in=UserManager.get_blocked_users_subquery(user)
+        )
+
+        if exclude_following:
+            posts = posts.exclude(
+                score__user__in=user.following.values('pk')
+            )
+
+        posts = posts.annotate(
+            trending_score=F('score__score')
+        ).order_by('-trending_score', '-pk')
+
+        return posts
+
+
+class PostDetailData(NamedTuple):
+    post: Post
+    author: User
+    photos: Tuple[Photo, ...]
+    # The newest comments, in the order they were written.
+    comments: Tuple[Comment, ...]
+    next_comments_cursor: Optional[str]
+    likes_count: int
+    is_liked: bool
 
 
 class PostManager:
     @staticmethod
     def _create_post_instance(user: User, description: str) -> Post:
-        return Post.objects.create(user=user, description=description)
+        with transaction.atomic():
+            post = Post.objects.create(user=user, description=description)
+
+            _increment_counter(User, user.pk, 'posts_number', 1)
+
+        return post
 
     @staticmethod
-    def _link_photo_to_post(post: Post, post_image) -> Photo:
-        return Photo.objects.create(post=post, post_image=post_image)
+    def _save_photo_file(photo: Photo, post_image) -> None:
+        photo.post_image.save(post_image.name, post_image, save=False)
+
+    @staticmethod
+    def _delete_photo_file(photo: Photo) -> None:
+        if photo.post_image:
+            photo.post_image.delete(save=False)
+
+    @classmethod
+    def create_post_with_photos(
+            cls, user: User, post_images: list, description: str) -> Post:
+
+        photos = []
+
+        try:
+            with transaction.atomic():
+                post = cls._create_post_instance(user, description)
+
+                photos = [Photo(post=post) for _ in post_images]
+                map_in_threads(cls._save_photo_file, photos, post_images)
+
+                Photo.objects.bulk_create(photos)
+
+                # Files saved before the insert don't send saved_file.
+                ThumbnailJobManager.enqueue_many(
+                    photo.post_image
+                    for photo in post.photo_to_post.order_by('pk')
+                )
+        except Exception:
+            map_in_threads(cls._delete_photo_file, photos)
+            raise
+
+        TimelineManager.push_post(post)
+
+        user_changed.send(sender=User, user_id=user.pk)
+
+        return post
 
     @classmethod
     def create_new_post(cls, user: User, post_image, description: str) -> Post:
-        post = cls._create_post_instance(user, description)
-        cls._link_photo_to_post(post, post_image)
+        return cls.create_post_with_photos(user, [post_image], description)
+
+    @classmethod
+    def create_new_post_from_file_name(
+            cls, user: User, file_name: str, description: str) -> Post:
+
+        with transaction.atomic():
+            post = cls._create_post_instance(user, description)
+
+            photo = Photo(post=post)
+            photo.post_image.name = file_name
+            photo.save()
+
+            # The file is already in the storage, so saved_file isn't sent.
+            ThumbnailJobManager.enqueue(photo.post_image)
+
+        TimelineManager.push_post(post)
+
+        user_changed.send(sender=User, user_id=user.pk)
 
         return post
 
@@ -29,17 +571,9 @@ class PostManager:
 
     @staticmethod
     def get_posts_with_related_data() -> Union[QuerySet, List[Post]]:
-        posts = PostManager.get_posts().select_related(
-            'user'
-        ).prefetch_related(
-            'likes'
-        ).prefetch_related(
-            'comments'
-        ).prefetch_related(
-            'comments__user'
-        ).annotate(
-            likes_count=Count('likes', distinct=True),
-        )
+        # The comments are paginated and only the likes count is shown, so
+        # the page cost doesn't grow with the engagement.
+        posts = PostManager.get_posts().select_related('user')
 
         return posts
 
@@ -47,6 +581,40 @@ class PostManager:
     def get_post_with_related_data(post_id: int) -> Post:
         return PostManager.get_posts_with_related_data().get(pk=post_id)
 
+    @staticmethod
+    def get_post_comments(post: Post) -> Union[QuerySet, List[Comment]]:
+        comments = Comment.objects.filter(post=post).select_related('user')
+
+        return comments
+
+    @staticmethod
+    def get_post_detail(
+            post_id: int, user: User, comments_number: int) -> PostDetailData:
+
+        post = Post.objects.select_related('user').annotate(
+            is_liked=Exists(Post.likes.through.objects.filter(
+                post_id=OuterRef('pk'), user_id=user.pk
+            ))
+        ).get(pk=post_id)
+
+        photos = tuple(Photo.objects.filter(post_id=post.pk))
+
+        comments_page = CursorPaginator(
+            PostManager.get_post_comments(post),
+            ('-created_date', '-pk'), comments_number
+        ).page()
+
+        # Every comment shares the loaded post instead of querying it.
+        for comment in comments_page:
+            comment.post = post
+
+        return PostDetailData(
+            post=post, author=post.user, photos=photos,
+            comments=tuple(reversed(comments_page.object_list)),
+            next_comments_cursor=comments_page.next_cursor,
+            likes_count=post.likes_count, is_liked=post.is_liked
+        )
+
     @staticmethod
     def get_posts_with_comments():
         posts = Post.objects.prefetch_related(
@@ -57,12 +625,7 @@ class PostManager:
 
     @staticmethod
     def get_posts_with_annotated_data() -> Union[QuerySet, List[Post]]:
-        posts = PostManager.get_posts().select_related(
-            'user'
-        ).annotate(
-            likes_count=Count(F('likes'), distinct=True),
-            comments_count=Count(F('comments'), distinct=True)
-        )
+        posts = PostManager.get_posts().select_related('user')
 
         return posts
 
@@ -73,89 +636,377 @@ class PostManager:
 
         posts = PostManager.get_posts_with_annotated_data().filter(
             user=user
-        ).order_by('-created_date')
+        ).order_by('-created_date', '-pk')
 
         return posts
 
     @staticmethod
-    def get_recommended_posts(user: User) -> Union[QuerySet, List[Post]]:
-        posts = PostManager.get_posts_with_annotated_data().exclude(
-            user=user
-        ).order_by('-likes_count')[:15]
+    def get_recommended_posts(
+            user: User, limit: Optional[int] = 15
+    ) -> Union[QuerySet, List[Post]]:
 
-        return posts
+        posts = TrendingManager.get_trending_posts(user).prefetch_related(
+            'photo_to_post'
+        ).select_related('user')
+
+        return posts[:limit] if limit is not None else posts
 
     @staticmethod
-    def get_following_users_posts(
-            follower: User) -> Union[QuerySet, List[Post]]:
+    def get_users_likes(user_ids: Iterable[int]) -> QuerySet:
+        return Post.likes.through.objects.filter(user_id__in=user_ids)
 
-        posts = Post.objects.all().extra(select={
-            'is_liked': (
-                'select true from "django_gramm_post_likes" '
-                'where post_id=django_gramm_post.id '
-                'and django_gramm_post_likes.user_id = %s'
-            )
-        },
-            select_params=(follower.id,)
-        ).prefetch_related(
-            'photo_to_post'
-        ).select_related('user')
+    @staticmethod
+    def get_liked_post_ids(post_ids: Iterable[int], user: User) -> Set[int]:
+        liked_post_ids = Post.likes.through.objects.filter(
+            user=user, post_id__in=list(post_ids)
+        ).values_list('post_id', flat=True)
 
-        return posts
+        return set(liked_post_ids)
 
     @staticmethod
-    def like_post(post: Post, user: User) -> None:
-        post.likes.add(user)
+    def mark_liked_posts(posts: Iterable[Post], user: User) -> None:
+        posts = list(posts)
+
+        liked_post_ids = PostManager.get_liked_post_ids(
+            (post.pk for post in posts), user
+        )
+
+        for post in posts:
+            post.is_liked = post.pk in liked_post_ids
 
     @staticmethod
-    def unlike_post(post: Post, user: User) -> None:
-        post.likes.remove(user)
+    def _set_post_like(
+            post_id: int, user: User,
+            liked: bool) -> Tuple[Optional[int], bool]:
+
+        # Must run in a transaction, the signal is left to the caller.
+        if liked:
+            changed = _insert_ignoring_conflicts(
+                Post.likes.through,
+                {'post_id': post_id, 'user_id': user.pk},
+                if_exists=Post.objects.filter(pk=post_id)
+            )
+        else:
+            changed = _raw_delete(Post.likes.through.objects.filter(
+                post_id=post_id, user_id=user.pk
+            ))
+
+        if changed:
+            likes_count = _increment_counter_returning(
+                Post, post_id, 'likes_count', 1 if liked else -changed,
+                score_dirty=True
+            )
+        else:
+            likes_count = _get_counter(Post, post_id, 'likes_count')
+
+        return likes_count, bool(changed)
+
+    @classmethod
+    def set_post_like(
+            cls, post_id: int, user: User, liked: bool) -> Optional[int]:
+
+        return cls.set_post_likes(user, [(post_id, liked)])[post_id]
+
+    @classmethod
+    def set_post_likes(
+            cls, user: User,
+            toggles: Iterable[Tuple[int, bool]]) -> Dict[int, Optional[int]]:
+
+        # Only the last of the queued toggles of a post matters.
+        likes = dict(toggles)
+
+        with transaction.atomic():
+            results = {
+                post_id: cls._set_post_like(post_id, user, liked)
+                for post_id, liked in likes.items()
+            }
+
+        # Sent after the commit, otherwise a concurrent request could cache
+        # the old rows under the new versions.
+        for post_id, (_, changed) in results.items():
+            if changed:
+                post_changed.send(sender=Post, post_id=post_id)
+
+        return {
+            post_id: likes_count
+            for post_id, (likes_count, _) in results.items()
+        }
+
+    @classmethod
+    def like_post(cls, post: Post, user: User) -> Optional[int]:
+        return cls.set_post_like(post.pk, user, True)
+
+    @classmethod
+    def unlike_post(cls, post: Post, user: User) -> Optional[int]:
+        return cls.set_post_like(post.pk, user, False)
 
     @staticmethod
     def delete_post(post: Post):
-        post.delete()
+        with transaction.atomic():
+            TimelineManager.remove_post(post)
+
+            post.delete()
+
+            _increment_counter(User, post.user_id, 'posts_number', -1)
+
+        user_changed.send(sender=User, user_id=post.user_id)
+
+    @staticmethod
+    def _delete_posts_batch(
+            post_ids: List[int]) -> Tuple[int, Set[int], List[str]]:
+
+        posts = Post.objects.filter(pk__in=post_ids)
+        photos = Photo.objects.filter(post_id__in=post_ids)
+
+        user_ids = set(posts.values_list('user_id', flat=True))
+
+        photo_ids, image_names = [], []
+
+        for photo_id, image_name in photos.values_list('pk', 'post_image'):
+            photo_ids.append(photo_id)
+            image_names.append(image_name)
+
+        with transaction.atomic():
+            _delete_thumbnail_jobs(Photo, photo_ids)
+
+            PostUpload.objects.filter(post_id__in=post_ids).update(post=None)
+
+            for queryset in (
+                    photos, Comment.objects.filter(post_id__in=post_ids),
+                    Post.likes.through.objects.filter(post_id__in=post_ids),
+                    TimelineEntry.objects.filter(post_id__in=post_ids),
+                    PostScore.objects.filter(post_id__in=post_ids)):
+
+                _raw_delete(queryset)
+
+            deleted = _raw_delete(posts)
+
+            User.objects.filter(pk__in=user_ids).update(
+                posts_number=UserManager.get_counters()['posts_number']
+            )
+
+        return deleted, user_ids, image_names
+
+    @classmethod
+    def delete_posts_in_batches(
+            cls, posts: QuerySet = None,
+            batch_size: int = 1000) -> Iterator[int]:
+
+        if posts is None:
+            posts = Post.objects.all()
+
+        for post_ids in _get_pk_batches(posts, batch_size):
+            deleted, user_ids, image_names = cls._delete_posts_batch(post_ids)
+
+            _delete_unused_files(image_names)
+
+            for user_id in user_ids:
+                user_changed.send(sender=User, user_id=user_id)
+
+            yield deleted
+
+    @classmethod
+    def delete_all_posts(cls):
+        for _ in cls.delete_posts_in_batches():
+            pass
 
     @staticmethod
-    def delete_all_posts():
-        Post.objects.all().delete()
+    def get_counters() -> Dict[str, Coalesce]:
+        return {
+            'likes_count': _count_subquery(
+                Post.likes.through.objects.filter(post=OuterRef('pk')),
+                'post'
+            ),
+            'comments_count': _count_subquery(
+                Comment.objects.filter(post=OuterRef('pk')), 'post'
+            ),
+        }
+
+    @classmethod
+    def recount_counters(cls, batch_size: int = 1000) -> int:
+        return _recount_counters_in_batches(
+            Post, {**cls.get_counters(), 'score_dirty': Value(True)},
+            batch_size
+        )
 
 
 class UserManager:
     @staticmethod
     def get_only_users_data() -> Union[QuerySet, List[User]]:
-        users = User.objects.annotate(
-            followers_number=Count('followers', distinct=True),
-            following_number=Count('following', distinct=True),
-            posts_number=Count('posts', distinct=True),
-        )
+        users = User.objects.all()
 
         return users
 
+    @staticmethod
+    def _load_user_with_aggregated_data(user_slug: str) -> User:
+        return UserManager.get_only_users_data().get(username=user_slug)
+
     @staticmethod
     def get_user_with_aggregated_data(user_slug: str) -> User:
-        return UserManager.get_only_users_data(
+        return get_cached_user_data(
+            user_slug, UserManager._load_user_with_aggregated_data
+        )
+
+    @staticmethod
+    def get_user_to_follow(user_slug: str) -> User:
+        # The timeline backfill needs nothing but these fields.
+        return User.objects.only('pk', 'fanout_on_read').get(
+            username=user_slug
+        )
+
+    @staticmethod
+    def get_own_relations(user_pk: int) -> QuerySet:
+        following = User.followers.through.objects.filter(
+            to_user_id=user_pk
+        ).annotate(relation=Value('following')).values_list(
+            'from_user_id', 'relation'
+        )
+        blocked = BlockedUserList.objects.filter(
+            user_id=user_pk
+        ).annotate(relation=Value('blocked')).values_list(
+            'blocked_users_id', 'relation'
+        )
+
+        return following.union(blocked, all=True)
+
+    @classmethod
+    def _load_own_relation_ids(cls, user_pk: int) -> Dict[str, IdSet]:
+        relation_ids = {'following': [], 'blocked': []}
+
+        for pk, relation in cls.get_own_relations(user_pk):
+            relation_ids[relation].append(pk)
+
+        return {
+            relation: IdSet(ids) for relation, ids in relation_ids.items()
+        }
+
+    @staticmethod
+    def _load_follower_ids(user_pk: int) -> IdSet:
+        return IdSet(User.followers.through.objects.filter(
+            from_user_id=user_pk
+        ).values_list('to_user_id', flat=True).iterator())
+
+    @staticmethod
+    def _get_relation_ids(user: User, name: str, loader):
+        # Kept on the instance, so request.user loads the ids once.
+        relation_ids = getattr(user, '_relation_ids', None)
+
+        if relation_ids is None:
+            relation_ids = user._relation_ids = {}
+
+        if name not in relation_ids:
+            relation_ids[name] = get_cached_relation_ids(
+                user.pk, name, loader
+            )
+
+        return relation_ids[name]
+
+    @staticmethod
+    def _forget_relation_ids(user: User) -> None:
+        if hasattr(user, '_relation_ids'):
+            del user._relation_ids
+
+    @classmethod
+    def get_following_ids(cls, user: User) -> IdSet:
+        return cls._get_relation_ids(
+            user, 'own', cls._load_own_relation_ids
+        )['following']
+
+    @classmethod
+    def get_blocked_ids(cls, user: User) -> IdSet:
+        return cls._get_relation_ids(
+            user, 'own', cls._load_own_relation_ids
+        )['blocked']
+
+    @classmethod
+    def get_follower_ids(cls, user: User) -> IdSet:
+        # Followers are loaded apart, the popular users have too many of
+        # them for every request.
+        return cls._get_relation_ids(
+            user, 'followers', cls._load_follower_ids
+        )
+
+    @staticmethod
+    def get_blocked_users_subquery(user: User) -> QuerySet:
+        # The feeds filter in the database, a subquery costs no round trip.
+        return BlockedUserList.objects.filter(user_id=user.pk).values(
+            'blocked_users'
+        )
+
+    @classmethod
+    def is_following(cls, follower: User, followed: User) -> bool:
+        return followed.pk in cls.get_following_ids(follower)
+
+    @classmethod
+    def mark_followed_users(cls, users: Iterable[User], user: User) -> None:
+        following_ids = cls.get_following_ids(user)
 
-        ).get(username=user_slug)
+        for user_ in users:
+            user_.is_followed = user_.pk in following_ids
 
     @staticmethod
-    def get_user_with_followers(user_slug: str) -> User:
-        user = User.objects.prefetch_related(
-            'followers'
-        ).get(username=user_slug)
+    def _change_follow_counters(
+            follower: User, followed: User, delta: int) -> None:
 
-        return user
+        _increment_counter(User, followed.pk, 'followers_number', delta)
+        _increment_counter(User, follower.pk, 'following_number', delta)
 
     @staticmethod
-    def unfollow_user(follower: User, followed: User) -> None:
-        followed.followers.remove(follower)
+    def _send_follow_signals(follower: User, followed: User) -> None:
+        # Sent after the commit, otherwise a concurrent request could cache
+        # the old rows under the new versions.
+        for user in (followed, follower):
+            user_changed.send(sender=User, user_id=user.pk)
+            relations_changed.send(sender=User, user_id=user.pk)
+
+            UserManager._forget_relation_ids(user)
 
-        followed.save()
+    @staticmethod
+    def _get_followers_number(user: User) -> int:
+        return User.objects.values_list(
+            'followers_number', flat=True
+        ).get(pk=user.pk)
 
     @staticmethod
-    def follow_user(follower: User, followed: User) -> None:
-        followed.followers.add(follower)
+    def unfollow_user(follower: User, followed: User) -> int:
+        with transaction.atomic():
+            deleted = _raw_delete(User.followers.through.objects.filter(
+                from_user_id=followed.pk, to_user_id=follower.pk
+            ))
+
+            if deleted:
+                UserManager._change_follow_counters(
+                    follower, followed, -deleted
+                )
+
+            followers_number = UserManager._get_followers_number(followed)
+
+        if deleted:
+            UserManager._send_follow_signals(follower, followed)
+
+            TimelineManager.remove_author_posts(follower, followed)
 
-        followed.save()
+        return followers_number
+
+    @staticmethod
+    def follow_user(follower: User, followed: User) -> int:
+        with transaction.atomic():
+            created = _insert_ignoring_conflicts(
+                User.followers.through,
+                {'from_user_id': followed.pk, 'to_user_id': follower.pk}
+            )
+
+            if created:
+                UserManager._change_follow_counters(follower, followed, 1)
+
+            followers_number = UserManager._get_followers_number(followed)
+
+        if created:
+            UserManager._send_follow_signals(follower, followed)
+
+            TimelineManager.backfill_author_posts(follower, followed)
+
+        return followers_number
 
     @staticmethod
     def get_following_users_with_all_related_data(
@@ -170,25 +1021,328 @@ class UserManager:
         return followings
 
     @staticmethod
-    def search_users_by_nickname(nickname: str) -> Union[QuerySet, List[User]]:
-        found_users = User.objects.filter(username__icontains=nickname)
+    def _search_users_by_trigrams(
+            nickname: str, limit: int) -> Union[QuerySet, List[User]]:
+
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        # Unlike icontains, the threshold of the operator keeps the sorted
+        # candidates few. It matches the index on the upper case usernames.
+        found_users = User.objects.filter(_TrigramWordSimilar(
+            Upper('username'), Value(nickname.upper())
+        )).annotate(
+            is_prefix=ExpressionWrapper(
+                Q(username__istartswith=nickname), output_field=BooleanField()
+            ),
+            similarity=TrigramSimilarity('username', nickname),
+        ).order_by('-is_prefix', '-similarity', 'username')[:limit]
 
         return found_users
 
     @staticmethod
-    def delete_all_users():
-        User.objects.all().delete()
+    def _search_users_by_prefix(
+            nickname: str, limit: int) -> Union[QuerySet, List[User]]:
+
+        username_trie = get_username_trie()
+        candidates_number = limit
+
+        # The trie only finds the candidates, the database has the current
+        # usernames.
+        while True:
+            found_ids = username_trie.search(nickname, candidates_number)
+
+            found_users = User.objects.filter(
+                pk__in=found_ids, username__istartswith=nickname
+            ).in_bulk()
+
+            if (len(found_users) >= limit
+                    or len(found_ids) < candidates_number):
+                break
+
+            # The outdated candidates took the places of the real matches.
+            candidates_number += limit - len(found_users)
+
+        return [
+            found_users[user_id] for user_id in found_ids
+            if user_id in found_users
+        ][:limit]
+
+    @staticmethod
+    def search_users_by_nickname(
+            nickname: str, limit: Optional[int] = None
+    ) -> Union[QuerySet, List[User]]:
+
+        limit = limit or settings.USER_SEARCH_LIMIT
+
+        # The shorter queries would match a large share of the users.
+        if len(nickname) < settings.USER_SEARCH_MIN_LENGTH:
+            return []
+
+        if connection.vendor == 'postgresql':
+            return UserManager._search_users_by_trigrams(nickname, limit)
+
+        return UserManager._search_users_by_prefix(nickname, limit)
+
+    @staticmethod
+    def _delete_users_batch(
+            user_ids: List[int]) -> Tuple[int, Set[int], Set[int], List[str]]:
+
+        users = User.objects.filter(pk__in=user_ids)
+
+        follows = User.followers.through.objects.filter(
+            Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids)
+        )
+        likes = PostManager.get_users_likes(user_ids)
+        comments = Comment.objects.filter(user_id__in=user_ids)
+        uploads = PostUpload.objects.filter(user_id__in=user_ids)
+
+        related_user_ids = set(chain.from_iterable(
+            follows.values_list('from_user_id', 'to_user_id')
+        )).difference(user_ids)
+        related_post_ids = {
+            *likes.values_list('post_id', flat=True),
+            *comments.values_list('post_id', flat=True)
+        }
+
+        file_names = [
+            *users.values_list('picture', flat=True),
+            *uploads.exclude(status=PostUpload.Status.DONE).values_list(
+                'file_name', flat=True
+            )
+        ]
+
+        with transaction.atomic():
+            _delete_thumbnail_jobs(User, user_ids)
+
+            for queryset in (
+                    follows, likes, comments, uploads,
+                    TimelineEntry.objects.filter(owner_id__in=user_ids),
+                    BlockedUserList.objects.filter(
+                        Q(user_id__in=user_ids)
+                        | Q(blocked_users__in=user_ids)
+                    )):
+
+                _raw_delete(queryset)
+
+            # The remaining relations are small, so the collector is fine.
+            deleted = users.delete()[1].get(User._meta.label, 0)
+
+            User.objects.filter(pk__in=related_user_ids).update(
+                **UserManager.get_counters()
+            )
+            Post.objects.filter(pk__in=related_post_ids).update(
+                **PostManager.get_counters(), score_dirty=True
+            )
+
+        return deleted, related_user_ids, related_post_ids, file_names
+
+    @classmethod
+    def delete_users_in_batches(
+            cls, users: QuerySet = None,
+            batch_size: int = 1000) -> Iterator[int]:
+
+        if users is None:
+            users = User.objects.all()
+
+        for user_ids in _get_pk_batches(users, batch_size):
+            for _ in PostManager.delete_posts_in_batches(
+                    Post.objects.filter(user_id__in=user_ids), batch_size):
+                pass
+
+            (deleted, related_user_ids,
+             related_post_ids, file_names) = cls._delete_users_batch(user_ids)
+
+            _delete_unused_files(file_names)
+
+            for user_id in related_user_ids:
+                user_changed.send(sender=User, user_id=user_id)
+                relations_changed.send(sender=User, user_id=user_id)
+
+            for post_id in related_post_ids:
+                post_changed.send(sender=Post, post_id=post_id)
+
+            yield deleted
+
+    @classmethod
+    def delete_all_users(cls):
+        for _ in cls.delete_users_in_batches():
+            pass
+
+    @staticmethod
+    def get_counters() -> Dict[str, Coalesce]:
+        follows = User.followers.through.objects
+
+        return {
+            'followers_number': _count_subquery(
+                follows.filter(from_user=OuterRef('pk')), 'from_user'
+            ),
+            'following_number': _count_subquery(
+                follows.filter(to_user=OuterRef('pk')), 'to_user'
+            ),
+            'posts_number': _count_subquery(
+                Post.objects.filter(user=OuterRef('pk')), 'user'
+            ),
+        }
+
+    @classmethod
+    def recount_counters(cls, batch_size: int = 1000) -> int:
+        return _recount_counters_in_batches(
+            User, cls.get_counters(), batch_size
+        )
 
 
 class CommentManager:
     @staticmethod
     def add_comment(user: User, post: Post, content: str) -> Comment:
-        comment = Comment.objects.create(
-            user=user, post=post, content=content
-        )
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                user=user, post=post, content=content
+            )
+
+            _increment_counter(
+                Post, post.pk, 'comments_count', 1, score_dirty=True
+            )
+
+        post_changed.send(sender=Post, post_id=post.pk)
 
         return comment
 
     @staticmethod
-    def delete_comment(comment: Comment) -> None:
-        comment.delete()
+    def _delete_comments(comments: QuerySet, post_id: int) -> int:
+        with transaction.atomic():
+            deleted = _raw_delete(comments)
+
+            if deleted:
+                _increment_counter(
+                    Post, post_id, 'comments_count', -deleted,
+                    score_dirty=True
+                )
+
+        if deleted:
+            post_changed.send(sender=Post, post_id=post_id)
+
+        return deleted
+
+    @classmethod
+    def delete_comment(cls, comment: Comment) -> int:
+        return cls._delete_comments(
+            Comment.objects.filter(pk=comment.pk), comment.post_id
+        )
+
+    @classmethod
+    def delete_user_comment(
+            cls, comment_id: int, post_id: int, user: User) -> int:
+
+        # The ownership is checked by the DELETE itself, the comment can be
+        # removed by its author or by the author of the post.
+        return cls._delete_comments(
+            Comment.objects.filter(
+                Q(user_id=user.pk) | Q(post__user_id=user.pk),
+                pk=comment_id, post_id=post_id
+            ),
+            post_id
+        )
+
+    @staticmethod
+    def comment_exists(comment_id: int, post_id: int) -> bool:
+        return Comment.objects.filter(pk=comment_id, post_id=post_id).exists()
+
+
+class ThumbnailJobManager:
+    @staticmethod
+    def _create_job_instance(fieldfile: FieldFile) -> ThumbnailJob:
+        return ThumbnailJob(
+            content_type=ContentType.objects.get_for_model(fieldfile.instance),
+            object_id=fieldfile.instance.pk,
+            field_name=fieldfile.field.name, file_name=fieldfile.name
+        )
+
+    @classmethod
+    def enqueue(cls, fieldfile: FieldFile) -> ThumbnailJob:
+        job = cls._create_job_instance(fieldfile)
+        job.save()
+
+        return job
+
+    @classmethod
+    def enqueue_many(cls, fieldfiles: Iterable[FieldFile]) -> None:
+        ThumbnailJob.objects.bulk_create(
+            [cls._create_job_instance(fieldfile) for fieldfile in fieldfiles]
+        )
+
+    @staticmethod
+    def requeue_stale_jobs() -> int:
+        return _requeue_stale_jobs(
+            ThumbnailJob, settings.THUMBNAIL_JOB_TIMEOUT_SECONDS
+        )
+
+    @staticmethod
+    def claim_jobs(batch_size: int = None) -> List[ThumbnailJob]:
+        return _claim_jobs(
+            ThumbnailJob, batch_size or settings.THUMBNAIL_JOB_BATCH_SIZE
+        )
+
+    @staticmethod
+    def complete_job(job_id: int) -> None:
+        ThumbnailJob.objects.filter(pk=job_id).delete()
+
+    @staticmethod
+    def fail_job(job_id: int, error: str) -> None:
+        _fail_job(
+            ThumbnailJob, job_id, error, settings.THUMBNAIL_JOB_MAX_ATTEMPTS
+        )
+
+
+class PostUploadManager:
+    @staticmethod
+    def commit_upload(
+            user: User, file_name: str, description: str) -> PostUpload:
+
+        return PostUpload.objects.create(
+            user=user, file_name=file_name, description=description
+        )
+
+    @staticmethod
+    def get_user_upload(upload_id: int, user: User) -> PostUpload:
+        return PostUpload.objects.select_related('post__user').get(
+            pk=upload_id, user=user
+        )
+
+    @staticmethod
+    def requeue_stale_jobs() -> int:
+        return _requeue_stale_jobs(
+            PostUpload, settings.POST_UPLOAD_TIMEOUT_SECONDS
+        )
+
+    @staticmethod
+    def claim_jobs(batch_size: int = None) -> List[PostUpload]:
+        return _claim_jobs(
+            PostUpload, batch_size or settings.POST_UPLOAD_BATCH_SIZE
+        )
+
+    @staticmethod
+    def complete_upload(upload: PostUpload) -> Post:
+        with transaction.atomic():
+            post = PostManager.create_new_post_from_file_name(
+                upload.user, upload.file_name, upload.description
+            )
+
+            PostUpload.objects.filter(pk=upload.pk).update(
+                status=PostUpload.Status.DONE, post=post,
+                updated_date=timezone.now()
+            )
+
+        return post
+
+    @staticmethod
+    def reject_upload(upload: PostUpload, error: str) -> None:
+        PostUpload.objects.filter(pk=upload.pk).update(
+            status=PostUpload.Status.FAILED, error=error,
+            updated_date=timezone.now()
+        )
+
+    @staticmethod
+    def fail_job(upload_id: int, error: str) -> None:
+        _fail_job(
+            PostUpload, upload_id, error, settings.POST_UPLOAD_MAX_ATTEMPTS
+        )
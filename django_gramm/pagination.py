@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Field, Model, Q, QuerySet
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+
+    raw_cursor = json.dumps(values, separators=(',', ':')).encode()
+
+    return base64.urlsafe_b64encode(raw_cursor).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, values_number: int) -> List[Any]:
+    padding = '=' * (-len(cursor) % 4)
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f'Invalid cursor - {cursor}')
+
+    if not isinstance(values, list) or len(values) != values_number:
+        raise InvalidCursor(f'Invalid cursor - {cursor}')
+
+    return values
+
+
+class CursorPage:
+    def __init__(self, object_list: list, next_cursor: Optional[str]):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    def __init__(
+            self, queryset: QuerySet, ordering: Sequence[str], per_page: int
+    ):
+        self._queryset = queryset.order_by(*ordering)
+        self._ordering = ordering
+        self.per_page = per_page
+
+    @property
+    def _fields(self) -> List[str]:
+        return [field.lstrip('-') for field in self._ordering]
+
+    def _build_after_cursor_filter(self, values: List[Any]) -> Q:
+        after_cursor = Q()
+
+        for index, ordering_field in enumerate(self._ordering):
+            lookup = 'lt' if ordering_field.startswith('-') else 'gt'
+            field = self._fields[index]
+
+            condition = Q(**dict(zip(self._fields[:index], values[:index])))
+            condition &= Q(**{f'{field}__{lookup}': values[index]})
+
+            after_cursor |= condition
+
+        return after_cursor
+
+    def _get_field(self, name: str) -> Field:
+        annotations = self._queryset.query.annotations
+
+        if name in annotations:
+            return annotations[name].output_field
+
+        meta = self._queryset.model._meta
+
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def _decode_cursor(self, cursor: str) -> List[Any]:
+        values = decode_cursor(cursor, len(self._ordering))
+
+        # The cursor comes from the client, so every value is checked
+        # against its field instead of failing in the query.
+        try:
+            values = [
+                self._get_field(field).to_python(value)
+                for field, value in zip(self._fields, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(f'Invalid cursor - {cursor}')
+
+        if None in values:
+            raise InvalidCursor(f'Invalid cursor - {cursor}')
+
+        return values
+
+    def _get_cursor_values(self, instance: Model) -> List[Any]:
+        return [getattr(instance, field) for field in self._fields]
+
+    def page(self, cursor: Optional[str] = None) -> CursorPage:
+        queryset = self._queryset
+
+        if cursor:
+            queryset = queryset.filter(
+                self._build_after_cursor_filter(self._decode_cursor(cursor))
+            )
+
+        object_list = list(queryset[:self.per_page + 1])
+
+        next_cursor = None
+
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = encode_cursor(
+                self._get_cursor_values(object_list[-1])
+            )
+
+        return CursorPage(object_list, next_cursor)
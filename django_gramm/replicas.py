@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class ReplicaRouting:
+    __slots__ = 'pinned', 'read_only', 'wrote'
+
+    def __init__(self, pinned: bool):
+        self.pinned = pinned
+        self.read_only = False
+        self.wrote = False
+
+
+_routing: ContextVar[Optional[ReplicaRouting]] = ContextVar(
+    'replica_routing', default=None
+)
+
+
+@contextmanager
+def replica_routing(pinned: bool) -> Iterator[ReplicaRouting]:
+    routing = ReplicaRouting(pinned)
+    token = _routing.set(routing)
+
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+def read_from_replica() -> None:
+    routing = _routing.get()
+
+    if routing is not None:
+        routing.read_only = True
+
+
+def reads_from_replica() -> bool:
+    routing = _routing.get()
+
+    return (
+        settings.DATABASE_REPLICA_ALIAS is not None and routing is not None
+        and routing.read_only and not routing.pinned
+    )
+
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    routing = _routing.get()
+    was_pinned = routing is None or routing.pinned
+
+    if not was_pinned:
+        routing.pinned = True
+
+    try:
+        yield
+    finally:
+        if not was_pinned:
+            routing.pinned = routing.wrote
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        read_from_replica()
+
+        return view(request, *args, **kwargs)
+
+    return wrapped_view
+
+
+class ReplicaRouter:
+    @staticmethod
+    def db_for_read(model, **hints) -> str:
+        if reads_from_replica():
+            return settings.DATABASE_REPLICA_ALIAS
+
+        # Otherwise the relations of the instances read from the replica
+        # would be read from it too.
+        return DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def db_for_write(model, **hints) -> str:
+        routing = _routing.get()
+
+        # The rest of the request reads what it has written.
+        if routing is not None:
+            routing.pinned = routing.wrote = True
+
+        return DEFAULT_DB_ALIAS
+
+    @staticmethod
+    def allow_relation(obj1, obj2, **hints) -> bool:
+        return True
+
+    @staticmethod
+    def allow_migrate(db: str, app_label: str, **hints) -> bool:
+        return db != settings.DATABASE_REPLICA_ALIAS
@@ -0,0 +1,156 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from django_gramm.caching import bump_version, get_versions
+from django_gramm.models import User
+
+USERNAMES_NAMESPACE = 'usernames'
+
+
+class UsernameTrie:
+    def __init__(self, version: int = None):
+        self.version = version
+
+        self._root = {}
+        self._usernames: Dict[int, str] = {}
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(username: str) -> str:
+        return username.lower()
+
+    def _find_node(self, prefix: str) -> Optional[dict]:
+        node = self._root
+
+        for char in prefix:
+            node = node.get(char)
+
+            if node is None:
+                return None
+
+        return node
+
+    def _remove(self, user_id: int) -> None:
+        username = self._usernames.pop(user_id, None)
+
+        if username is None:
+            return
+
+        node = self._find_node(self._normalize(username))
+        node.get(None, {}).pop(user_id, None)
+
+    def insert(self, user_id: int, username: str) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+            node = self._root
+
+            for char in self._normalize(username):
+                node = node.setdefault(char, {})
+
+            node.setdefault(None, {})[user_id] = username
+            self._usernames[user_id] = username
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            self._remove(user_id)
+
+    def search(self, prefix: str, limit: int) -> List[int]:
+        with self._lock:
+            node = self._find_node(self._normalize(prefix))
+
+            if node is None:
+                return []
+
+            found_ids = []
+            nodes = deque([node])
+
+            while nodes and len(found_ids) < limit:
+                node = nodes.popleft()
+
+                terminals = node.get(None, {})
+                found_ids.extend(
+                    sorted(terminals, key=terminals.get)[
+                        :limit - len(found_ids)
+                    ]
+                )
+
+                nodes.extend(
+                    node[char] for char in sorted(
+                        char for char in node if char is not None
+                    )
+                )
+
+            return found_ids
+
+
+_username_trie = None
+_username_trie_lock = threading.Lock()
+
+
+def _get_usernames_version() -> int:
+    # All the usernames share one version.
+    return get_versions(USERNAMES_NAMESPACE, [0])[0]
+
+
+def bump_usernames_version() -> None:
+    bump_version(USERNAMES_NAMESPACE, 0)
+
+
+def get_username_trie() -> UsernameTrie:
+    global _username_trie
+
+    # Every process has its own trie, so the ones built before a change
+    # made by another process are rebuilt.
+    version = _get_usernames_version()
+
+    with _username_trie_lock:
+        if _username_trie is None or _username_trie.version != version:
+            username_trie = UsernameTrie(version)
+
+            for user_id, username in User.objects.values_list(
+                    'pk', 'username').iterator():
+                username_trie.insert(user_id, username)
+
+            _username_trie = username_trie
+
+    return _username_trie
+
+
+def reset_username_trie() -> None:
+    global _username_trie
+
+    with _username_trie_lock:
+        _username_trie = None
+
+
+def _bump_usernames_version_on_commit() -> None:
+    # The other processes must not rebuild their tries before they can see
+    # the change.
+    transaction.on_commit(bump_usernames_version)
+
+
+@receiver(post_save, sender=User)
+def _add_user_to_username_trie(
+        sender, instance: User, created: bool, update_fields, **kwargs):
+
+    if created or update_fields is None or 'username' in update_fields:
+        _bump_usernames_version_on_commit()
+
+    # The current process sees the change before the commit.
+    if _username_trie is not None:
+        _username_trie.insert(instance.pk, instance.username)
+
+
+@receiver(post_delete, sender=User)
+def _remove_user_from_username_trie(sender, instance: User, **kwargs):
+    _bump_usernames_version_on_commit()
+
+    if _username_trie is not None:
+        _username_trie.remove(instance.pk)
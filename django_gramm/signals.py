@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by the models managers with post_id / user_id of the changed object.
+post_changed = Signal()
+user_changed = Signal()
+relations_changed = Signal()
@@ -7,20 +7,15 @@ class FollowUnfollowFunc {
         urlToRequest, tagIdToChange, newTagValue, alertMessage, followersCountTag) {
 
         try {
-            _sendRequestAndCheckStatus(urlToRequest);
-
-            let tag = $(tagIdToChange);
-
-            tag.text(newTagValue);
-
-            if (followersCountTag) {
-                let followersCount = parseInt(followersCountTag.text());
-                let newFollowersCount = (
-                    newTagValue === 'Unfollow' ? ++followersCount : -- followersCount
-                );
-
-                followersCountTag.text(newFollowersCount);
-            }
+            _sendRequestAndCheckStatus(urlToRequest, 'POST').done(
+                (jsonResponse) => {
+                    $(tagIdToChange).text(newTagValue);
+
+                    if (followersCountTag) {
+                        followersCountTag.text(jsonResponse.followers_number);
+                    }
+                }
+            );
         }
 
         catch (error) {
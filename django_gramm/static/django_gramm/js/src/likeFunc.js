@@ -5,24 +5,62 @@ import {
 import {parseDataAttrs} from "./parseDataAttrs";
 
 
+const QUEUED_TOGGLES_KEY = 'queuedLikeToggles';
+
+
 class LikeUnlikeFunc {
+    static _queueToggle(likePostsUrl, postId, liked) {
+        let queue = JSON.parse(
+            localStorage.getItem(QUEUED_TOGGLES_KEY)
+        ) || {'url': likePostsUrl, 'toggles': []};
+
+        queue.toggles.push({'post_id': postId, 'liked': liked});
+
+        localStorage.setItem(QUEUED_TOGGLES_KEY, JSON.stringify(queue));
+    }
+
+    static sendQueuedToggles() {
+        let queue = JSON.parse(localStorage.getItem(QUEUED_TOGGLES_KEY));
+
+        if (!queue) {
+            return;
+        }
+
+        _sendRequestAndCheckStatus(
+            queue.url, 'POST', {'toggles': JSON.stringify(queue.toggles)}
+        ).done(() => {
+            localStorage.removeItem(QUEUED_TOGGLES_KEY);
+        });
+    }
+
     static _sendRequestAndChangeCssClass(
         urlToRequest, likeTag, classToAdd, classToRemove,
-        alertMessage, likesCountTag) {
+        alertMessage, likesCountTag, dataAttrs) {
 
-        try {
-            _sendRequestAndCheckStatus(urlToRequest).done(() => {
-                likeTag.removeClass(classToRemove);
-                likeTag.addClass(classToAdd);
+        // Offline toggles are sent in one batch when the client is back.
+        if (!navigator.onLine && dataAttrs['likePostsUrl']) {
+            LikeUnlikeFunc._queueToggle(
+                dataAttrs['likePostsUrl'], dataAttrs['postId'],
+                classToAdd === 'liked'
+            );
+
+            likeTag.removeClass(classToRemove);
+            likeTag.addClass(classToAdd);
 
-                if (likesCountTag) {
-                    let likesCount = parseInt(likesCountTag.text())
-                    let newLikesCount = classToAdd === 'liked' ? ++likesCount : --likesCount;
+            return;
+        }
 
-                    likesCountTag.text(newLikesCount);
+        try {
+            _sendRequestAndCheckStatus(urlToRequest, 'POST').done(
+                (jsonResponse) => {
+                    likeTag.removeClass(classToRemove);
+                    likeTag.addClass(classToAdd);
 
+                    if (likesCountTag) {
+                        likesCountTag.text(jsonResponse.likes_count);
+                    }
                 }
-            })
+            )
         }
 
         catch (error) {
@@ -38,7 +76,7 @@ class LikeUnlikeFunc {
             LikeUnlikeFunc._sendRequestAndChangeCssClass(
                 dataAttrs['unlikeUrl'], likeTag, 'unliked', 'liked',
                 'You can\'t unlike this post at this moment.',
-                likesCountTag
+                likesCountTag, dataAttrs
             );
         }
 
@@ -46,14 +84,14 @@ class LikeUnlikeFunc {
             LikeUnlikeFunc._sendRequestAndChangeCssClass(
                 dataAttrs['likeUrl'], likeTag, 'liked', 'unliked',
                 'You can\'t like this post at this moment.',
-                likesCountTag
+                likesCountTag, dataAttrs
             );
         }
     }
 
     static likeUnlikePost(tagIdToParse, likeUnlikeTagId) {
         let dataAttrs = parseDataAttrs(tagIdToParse,
-            'likeUrl', 'unlikeUrl', 'likesCountId');
+            'likeUrl', 'unlikeUrl', 'likesCountId', 'postId', 'likePostsUrl');
 
         LikeUnlikeFunc._checkLikedUnlikedCssClassesAndCallRequest(
             likeUnlikeTagId, dataAttrs
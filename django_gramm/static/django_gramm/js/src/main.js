@@ -3,6 +3,9 @@ import 'bootstrap/dist/css/bootstrap.min.css';
 import {LikeUnlikeFunc} from "./likeFunc";
 import {FollowUnfollowFunc} from "./followFunc";
 import {CommentFunc} from "./commentFunc";
+import {PageFunc} from "./pageFunc";
+import {SearchFunc} from "./searchFunc";
+import {UploadFunc} from "./uploadFunc";
 
 window.likeUnlikePost = LikeUnlikeFunc.likeUnlikePost
 
@@ -10,3 +13,18 @@ window.followUnfollow = FollowUnfollowFunc.followUnfollow;
 
 window.deleteComment = CommentFunc.deleteComment;
 window.postComment = CommentFunc.postComment;
+
+window.loadNextPage = PageFunc.loadNextPage;
+window.loadPreviousPage = PageFunc.loadPreviousPage;
+
+window.searchUsers = SearchFunc.searchUsers;
+
+window.uploadPost = UploadFunc.uploadPost;
+
+document.addEventListener('DOMContentLoaded', () => {
+    PageFunc.observeNextPage('#next_page');
+
+    LikeUnlikeFunc.sendQueuedToggles();
+});
+
+window.addEventListener('online', LikeUnlikeFunc.sendQueuedToggles);
@@ -0,0 +1,86 @@
+import {_sendRequestAndCheckStatus} from "./requestFunc";
+import {parseDataAttrs} from "./parseDataAttrs";
+
+
+class PageFunc {
+    static _isLoading = false;
+
+    static _sendRequestAndAppendPage(url, nextPageTag, prepend) {
+        PageFunc._isLoading = true;
+
+        try {
+            _sendRequestAndCheckStatus(url).done((jsonResponse) => {
+                if (prepend) {
+                    nextPageTag.after(jsonResponse['html']);
+                }
+
+                else {
+                    nextPageTag.before(jsonResponse['html']);
+                }
+
+                if (jsonResponse['next_page_url']) {
+                    nextPageTag.data('nextPageUrl', jsonResponse['next_page_url']);
+                }
+
+                else {
+                    nextPageTag.remove();
+                }
+            }).always(() => {
+                PageFunc._isLoading = false;
+            });
+        }
+
+        catch (error) {
+            PageFunc._isLoading = false;
+
+            alert('You can\'t load more at this moment.');
+        }
+    }
+
+
+    static loadNextPage(nextPageTagId) {
+        if (PageFunc._isLoading) {
+            return;
+        }
+
+        let dataAttrs = parseDataAttrs(nextPageTagId, 'nextPageUrl');
+
+        PageFunc._sendRequestAndAppendPage(
+            dataAttrs['nextPageUrl'], $(nextPageTagId)
+        );
+    }
+
+
+    // The older pages go above the already shown items, e.g. comments.
+    static loadPreviousPage(previousPageTagId) {
+        if (PageFunc._isLoading) {
+            return;
+        }
+
+        let dataAttrs = parseDataAttrs(previousPageTagId, 'nextPageUrl');
+
+        PageFunc._sendRequestAndAppendPage(
+            dataAttrs['nextPageUrl'], $(previousPageTagId), true
+        );
+    }
+
+
+    static observeNextPage(nextPageTagId) {
+        let nextPageTag = document.querySelector(nextPageTagId);
+
+        if (!nextPageTag || !('IntersectionObserver' in window)) {
+            return;
+        }
+
+        let observer = new IntersectionObserver((entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                PageFunc.loadNextPage(nextPageTagId);
+            }
+        });
+
+        observer.observe(nextPageTag);
+    }
+}
+
+
+export {PageFunc};
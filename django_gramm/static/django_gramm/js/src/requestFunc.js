@@ -87,4 +87,4 @@ function sendRequestAndRefreshContent(
     }
 }
 
-export {sendRequestAndRefreshContent, _sendRequestAndCheckStatus}
+export {sendRequestAndRefreshContent, _sendRequestAndCheckStatus, getCookie}
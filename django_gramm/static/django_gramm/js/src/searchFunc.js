@@ -0,0 +1,75 @@
+import {_sendRequestAndCheckStatus} from "./requestFunc";
+import {parseDataAttrs} from "./parseDataAttrs";
+
+
+class SearchFunc {
+    static _debounceDelay = 250;
+    // USER_SEARCH_MIN_LENGTH, the shorter queries find nobody.
+    static _minQueryLength = 3;
+    static _debounceTimer = null;
+    static _lastRequest = null;
+
+
+    static _updateSuggestions(suggestionsTag, users) {
+        suggestionsTag.empty();
+
+        users.forEach((user) => {
+            let link = $('<a class="dropdown-item"></a>').attr(
+                'href', user['url']
+            ).text(user['username']);
+
+            $('<li></li>').append(link).appendTo(suggestionsTag);
+        });
+
+        suggestionsTag.toggleClass('show', users.length > 0);
+    }
+
+
+    static _sendRequestAndUpdateSuggestions(url, query, suggestionsId) {
+        let suggestionsTag = $(suggestionsId);
+
+        if (SearchFunc._lastRequest) {
+            SearchFunc._lastRequest.abort();
+        }
+
+        if (query.length < SearchFunc._minQueryLength) {
+            SearchFunc._updateSuggestions(suggestionsTag, []);
+
+            return;
+        }
+
+        try {
+            SearchFunc._lastRequest = _sendRequestAndCheckStatus(
+                `${url}?q=${encodeURIComponent(query)}`
+            ).done((jsonResponse) => {
+                SearchFunc._updateSuggestions(
+                    suggestionsTag, jsonResponse['users']
+                );
+            });
+        }
+
+        catch (error) {
+            SearchFunc._updateSuggestions(suggestionsTag, []);
+        }
+    }
+
+
+    static searchUsers(inputTagId) {
+        let dataAttrs = parseDataAttrs(
+            inputTagId, 'searchUrl', 'suggestionsId'
+        );
+
+        let query = $.trim($(inputTagId).val());
+
+        clearTimeout(SearchFunc._debounceTimer);
+
+        SearchFunc._debounceTimer = setTimeout(() => {
+            SearchFunc._sendRequestAndUpdateSuggestions(
+                dataAttrs['searchUrl'], query, dataAttrs['suggestionsId']
+            );
+        }, SearchFunc._debounceDelay);
+    }
+}
+
+
+export {SearchFunc};
@@ -0,0 +1,107 @@
+import {getCookie} from "./requestFunc";
+import {parseDataAttrs} from "./parseDataAttrs";
+
+
+class UploadFunc {
+    static _statusInterval = 1000;
+
+
+    static _sendForm(url, formData, headers) {
+        return $.ajax(url, {
+            'method': 'POST', 'data': formData, 'headers': headers || {},
+            'processData': false, 'contentType': false
+        });
+    }
+
+
+    static _sendData(url, data) {
+        let formData = new FormData();
+
+        Object.entries(data).forEach(([key, value]) => {
+            formData.append(key, value);
+        });
+
+        return UploadFunc._sendForm(
+            url, formData, {'X-CSRFToken': getCookie('csrftoken')}
+        ).then((jsonResponse) => {
+            if (jsonResponse.status !== 'OK') {
+                throw new Error(`The request failed - ${jsonResponse.code}`);
+            }
+
+            return jsonResponse;
+        });
+    }
+
+
+    static _uploadToStorage(upload, photo) {
+        let formData = new FormData();
+
+        Object.entries(upload.fields).forEach(([key, value]) => {
+            formData.append(key, value);
+        });
+
+        // The storage expects the file to be the last field.
+        formData.append('file', photo);
+
+        return UploadFunc._sendForm(upload.url, formData);
+    }
+
+
+    static _waitForPost(statusUrl) {
+        return $.get(statusUrl).then((jsonResponse) => {
+            let upload = jsonResponse.upload;
+
+            if (upload.status === 'done') {
+                return upload.post_url;
+            }
+
+            if (upload.status === 'failed') {
+                throw new Error(upload.error);
+            }
+
+            return new Promise((resolve) => {
+                setTimeout(resolve, UploadFunc._statusInterval);
+            }).then(() => UploadFunc._waitForPost(statusUrl));
+        });
+    }
+
+
+    static uploadPost(event, formTagId) {
+        let formTag = $(formTagId);
+        let dataAttrs = parseDataAttrs(formTagId, 'uploadUrl');
+
+        let photos = formTag.find('input[type=file]')[0].files;
+
+        // Multi-photo posts are sent as a regular multipart form.
+        if (photos.length !== 1) {
+            return;
+        }
+
+        event.preventDefault();
+
+        let photo = photos[0];
+        let description = formTag.find('textarea').val();
+
+        let upload;
+
+        UploadFunc._sendData(dataAttrs['uploadUrl'], {
+            'content_type': photo.type, 'size': photo.size
+        }).then((jsonResponse) => {
+            upload = jsonResponse.upload;
+
+            return UploadFunc._uploadToStorage(upload, photo);
+        }).then(() => UploadFunc._sendData(upload.commit_url, {
+            'token': upload.token, 'description': description
+        })).then((jsonResponse) => UploadFunc._waitForPost(
+            jsonResponse.upload.status_url
+        )).then((postUrl) => {
+            window.location.href = postUrl;
+        }).catch((error) => {
+            console.log(error);
+            alert('Error adding post');
+        });
+    }
+}
+
+
+export {UploadFunc}
@@ -0,0 +1,31 @@
+from typing import List, Tuple
+
+from django import template
+from django.db.models.fields.files import FieldFile
+
+from django_gramm.thumbnails import get_thumbnail_url, get_thumbnail_variants
+
+register = template.Library()
+
+
+@register.filter()
+def ready_thumbnail_url(file: FieldFile, alias: str) -> str:
+    if not file:
+        return ''
+
+    return get_thumbnail_url(file, alias)
+
+
+@register.filter()
+def thumbnail_srcsets(file: FieldFile, alias: str) -> List[Tuple[str, str]]:
+    if not file:
+        return []
+
+    return [
+        (
+            f'image/{variant_format}',
+            ', '.join(f'{url} {width}w' for width, url in widths)
+        ) for variant_format, widths in get_thumbnail_variants(
+            file
+        ).get(alias, {}).items()
+    ]
@@ -1,10 +1,14 @@
 from django import template
 
 from django_gramm.models import Post, User
+from django_gramm.models_manager import PostManager
 
 register = template.Library()
 
 
 @register.simple_tag()
 def is_liked(post: Post, user: User) -> bool:
-    return post.likes.filter(username=user.username).exists()
+    if not hasattr(post, 'is_liked'):
+        PostManager.mark_liked_posts([post], user)
+
+    return post.is_liked
@@ -3,6 +3,9 @@ from factory.django import ImageField as FactoryImageField
 import factory
 
 from django_gramm import models
+from django_gramm.models_manager import (
+    PostManager, UserManager, CommentManager
+)
 
 
 class UserFactory(DjangoModelFactory):
@@ -20,7 +23,9 @@ class UserFactory(DjangoModelFactory):
 
         if extracted:
             for follower in extracted:
-                self.followers.add(follower)
+                UserManager.follow_user(follower, self)
+
+            self.refresh_from_db()
 
     @factory.post_generation
     def following(self, create, extracted, **kwargs):
@@ -29,7 +34,9 @@ class UserFactory(DjangoModelFactory):
 
         if extracted:
             for following in extracted:
-                self.following.add(following)
+                UserManager.follow_user(self, following)
+
+            self.refresh_from_db()
 
 
 class PostFactory(DjangoModelFactory):
@@ -46,7 +53,9 @@ class PostFactory(DjangoModelFactory):
 
         if extracted:
             for liked_user in extracted:
-                self.likes.add(liked_user)
+                PostManager.like_post(self, liked_user)
+
+            self.refresh_from_db()
 
 
 class PhotoFactory(DjangoModelFactory):
@@ -66,6 +75,12 @@ class CommentFactory(DjangoModelFactory):
 
     content = factory.Faker('sentence')
 
+    @classmethod
+    def _create(cls, model_class, *args, **kwargs):
+        return CommentManager.add_comment(
+            kwargs['user'], kwargs['post'], kwargs['content']
+        )
+
 
 def create_post_using_factories(user: models.User) -> models.Post:
     post = PostFactory(user=user)
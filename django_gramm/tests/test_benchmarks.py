@@ -0,0 +1,294 @@
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import URLPattern, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from django_gramm import models
+from django_gramm.models_manager import PostManager
+from django_gramm.tests.factories import (
+    CommentFactory, UserFactory, create_post_using_factories
+)
+from django_gramm.urls import app_name, urlpatterns
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+
+# Writes the results of a run, e.g. for the CI artifacts.
+OUTPUT_PATH = os.environ.get('BENCHMARK_OUTPUT_PATH')
+UPDATE_BASELINE = os.environ.get('BENCHMARK_UPDATE_BASELINE') == 'True'
+
+# Timings depend on the machine, so only the opted-in runs compare them.
+TIME_TOLERANCE = os.environ.get('BENCHMARK_TIME_TOLERANCE')
+
+DATASETS = {
+    'small': {
+        'authors': 2, 'posts_per_author': 2,
+        'comments_per_post': 1, 'likes_per_post': 1,
+    },
+    'large': {
+        'authors': 6, 'posts_per_author': 4,
+        'comments_per_post': 4, 'likes_per_post': 4,
+    },
+}
+
+# The typeahead searches a user table large enough to show how the search
+# scales, the runs against PostgreSQL can raise it to millions.
+SEARCH_USERS_NUMBER = int(os.environ.get('BENCHMARK_SEARCH_USERS', 20000))
+
+SEARCH_FIRST_NAMES = 'anna', 'john', 'maria', 'ivan', 'olga'
+SEARCH_LAST_NAMES = 'smith', 'brown', 'petrov', 'garcia'
+
+SEARCH_QUERIES = {
+    # Every fifth user starts with it.
+    'common_prefix': 'anna',
+    'word': 'petrov',
+    'too_short': 'an',
+}
+
+# Routes requested by the viewer as the owner of the objects.
+OWNER_ROUTES = {
+    'edit_profile', 'change_password', 'add_post', 'create_post_upload',
+    'commit_post_upload', 'post_upload_status', 'delete_post',
+    'delete_comment', 'direct',
+}
+
+ROUTE_REQUESTS = {
+    'follow': ('post', {}),
+    'unfollow': ('post', {}),
+    'like_post': ('post', {}),
+    'unlike_post': ('post', {}),
+    'like_posts': ('post', lambda kwargs: {
+        'toggles': json.dumps([{'post_id': kwargs['post_id'], 'liked': True}])
+    }),
+    'search_users': ('post', {'searched_users': 'benchmark'}),
+    'search_users_json': ('get', {'q': 'benchmark'}),
+    'add_comment': ('post', {'content': 'Benchmark comment'}),
+    'delete_comment': ('post', {}),
+    'delete_post': ('post', {}),
+    'create_post_upload': (
+        'post', {'content_type': 'image/jpeg', 'size': 1}
+    ),
+    'commit_post_upload': ('post', {'token': '', 'description': ''}),
+    'direct_upload': ('post', {'token': ''}),
+}
+
+
+def _get_named_routes():
+    return [
+        (pattern.name, list(pattern.pattern.converters))
+        for pattern in urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    ]
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.time += time.perf_counter() - started
+
+
+@override_settings(
+    DIRECT_UPLOAD_BACKEND='django_gramm.uploads.LocalUploadBackend'
+)
+class TestViewBenchmarks(TestCase):
+    def _seed(
+            self, authors: int, posts_per_author: int,
+            comments_per_post: int, likes_per_post: int) -> dict:
+
+        authors = [
+            UserFactory(username=f'benchmark_{index}')
+            for index in range(authors)
+        ]
+
+        posts = [
+            create_post_using_factories(author)
+            for author in authors for _ in range(posts_per_author)
+        ]
+
+        for post in posts:
+            for index in range(comments_per_post):
+                CommentFactory(user=authors[index % len(authors)], post=post)
+
+            for user in authors[:likes_per_post]:
+                PostManager.like_post(post, user)
+
+        viewer = UserFactory(following=authors)
+        viewer_post = create_post_using_factories(viewer)
+
+        return {
+            'viewer': viewer,
+            'kwargs': {
+                'user_slug': authors[0].username,
+                'post_id': posts[0].pk,
+                'comment_id': posts[0].comments.first().pk,
+            },
+            'owner_kwargs': {
+                'user_slug': viewer.username,
+                'post_id': viewer_post.pk,
+                'comment_id': CommentFactory(
+                    user=viewer, post=viewer_post
+                ).pk,
+                'upload_id': models.PostUpload.objects.create(
+                    user=viewer, file_name='uploads/benchmark.jpg'
+                ).pk,
+                'uidb64': urlsafe_base64_encode(force_bytes(viewer.pk)),
+                'token': default_token_generator.make_token(viewer),
+            },
+        }
+
+    @staticmethod
+    def _request(client: Client, method: str, url: str, data: dict):
+        with transaction.atomic():
+            response = getattr(client, method)(url, data)
+
+            # Every route runs against the same data.
+            transaction.set_rollback(True)
+
+        return response
+
+    def _measure(self, client: Client, method: str, url: str, data: dict):
+        query_timer = _QueryTimer()
+
+        cache.clear()
+
+        with connection.execute_wrapper(query_timer):
+            started = time.perf_counter()
+            response = self._request(client, method, url, data)
+            total_time = time.perf_counter() - started
+
+        cache.clear()
+
+        tracemalloc.start()
+        self._request(client, method, url, data)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'queries': query_timer.queries,
+            'db_ms': round(query_timer.time * 1000, 2),
+            # The time outside of the database, the view and the templates.
+            'app_ms': round((total_time - query_timer.time) * 1000, 2),
+            'peak_kb': round(peak_memory / 1024, 1),
+        }
+
+    def _run_dataset(self, dataset: dict) -> dict:
+        data = self._seed(**dataset)
+
+        # Failing views are measured too instead of stopping the run.
+        client = Client(raise_request_exception=False)
+        results = {}
+
+        for name, converters in _get_named_routes():
+            kwargs = dict(data['owner_kwargs'])
+
+            if name not in OWNER_ROUTES:
+                kwargs.update(data['kwargs'])
+
+            method, request_data = ROUTE_REQUESTS.get(name, ('get', {}))
+
+            if callable(request_data):
+                request_data = request_data(kwargs)
+
+            url = reverse(f'{app_name}:{name}', kwargs={
+                converter: kwargs[converter] for converter in converters
+            })
+
+            client.force_login(data['viewer'])
+
+            results[name] = self._measure(client, method, url, request_data)
+
+        return results
+
+    def _run_user_search(self, users_number: int) -> dict:
+        models.User.objects.bulk_create([
+            models.User(
+                username=(
+                    f'{SEARCH_FIRST_NAMES[index % len(SEARCH_FIRST_NAMES)]}_'
+                    f'{SEARCH_LAST_NAMES[index % len(SEARCH_LAST_NAMES)]}_'
+                    f'{index}'
+                ),
+                email=f'search_{index}@example.com'
+            ) for index in range(users_number)
+        ], batch_size=1000)
+
+        client = Client(raise_request_exception=False)
+        client.force_login(UserFactory())
+
+        url = reverse(f'{app_name}:search_users_json')
+
+        return {
+            f'search_users_json:{name}': self._measure(
+                client, 'get', url, {'q': query}
+            )
+            for name, query in SEARCH_QUERIES.items()
+        }
+
+    def _check_regressions(self, results: dict, baseline: dict) -> None:
+        for dataset, routes in results.items():
+            for name, result in routes.items():
+                expected = baseline.get(dataset, {}).get(name)
+
+                if expected is None:
+                    continue
+
+                with self.subTest(dataset=dataset, route=name):
+                    # A failing route may need fewer queries.
+                    self.assertEqual(result['status'], expected['status'])
+                    self.assertLessEqual(
+                        result['queries'], expected['queries']
+                    )
+
+                    if TIME_TOLERANCE is None:
+                        continue
+
+                    for timing in ('db_ms', 'app_ms'):
+                        self.assertLessEqual(
+                            result[timing],
+                            expected[timing] * float(TIME_TOLERANCE)
+                        )
+
+    def test_view_benchmarks(self):
+        results = {}
+
+        for dataset_name, dataset in DATASETS.items():
+            with transaction.atomic():
+                results[dataset_name] = self._run_dataset(dataset)
+
+                transaction.set_rollback(True)
+
+        with transaction.atomic():
+            results['user_search'] = self._run_user_search(
+                SEARCH_USERS_NUMBER
+            )
+
+            transaction.set_rollback(True)
+
+        if OUTPUT_PATH:
+            Path(OUTPUT_PATH).write_text(json.dumps(results, indent=2))
+
+        if UPDATE_BASELINE:
+            BASELINE_PATH.write_text(json.dumps(results, indent=2) + '\n')
+
+            return
+
+        self._check_regressions(
+            results, json.loads(BASELINE_PATH.read_text())
+        )
@@ -1,14 +1,34 @@
 import os
+from io import StringIO
+from unittest import mock
 
 from django.core.files import File
-from django.test import TestCase
-
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.test import TestCase, override_settings
+
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+import numpy as np
+
+from django_gramm.db_fake_filler.bulk_filler import BulkDbFiller
 from django_gramm.models_manager import (
-    PostManager, UserManager, CommentManager
+    PostManager, UserManager, CommentManager, TimelineManager,
+    TrendingManager, ThumbnailJobManager
+)
+
+from django_gramm.search import bump_usernames_version, reset_username_trie
+from django_gramm.signals import post_changed, relations_changed, user_changed
+from django_gramm.templatetags.media_tags import (
+    ready_thumbnail_url, thumbnail_srcsets
 )
+from django_gramm.thumbnails import resolve_posts_thumbnail_urls
 
 from django_gramm.tests.factories import (
-    UserFactory, PostFactory
+    CommentFactory, PhotoFactory, UserFactory, PostFactory
 )
 
 from django_gramm import models
@@ -45,6 +65,62 @@ class TestPostManager(TestCase):
                     self.assertEqual(new_post, post_from_db)
                     self.assertIn(new_post, models.Post.objects.all())
 
+    def test_create_post_with_photos(self):
+        user = self._test_users[0]
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            image_content = test_image.read()
+
+        post_images = [
+            SimpleUploadedFile(f'photo_{index}.jpeg', image_content)
+            for index in range(3)
+        ]
+
+        new_post = PostManager.create_post_with_photos(
+            user, post_images, 'Test Description'
+        )
+
+        photos = list(new_post.photo_to_post.all())
+        user.refresh_from_db()
+
+        self.assertEqual(len(photos), 3)
+        self.assertEqual(user.posts_number, 1)
+        self.assertEqual(
+            set(models.ThumbnailJob.objects.values_list(
+                'object_id', flat=True
+            )),
+            {photo.pk for photo in photos}
+        )
+
+        for photo in photos:
+            with self.subTest():
+                self.assertTrue(photo.post_image.storage.exists(
+                    photo.post_image.name
+                ))
+
+    def test_create_post_with_photos_rolls_back_on_error(self):
+        user = self._test_users[0]
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            post_image = SimpleUploadedFile('photo.jpeg', test_image.read())
+
+        with mock.patch.object(
+                models.Photo.objects, 'bulk_create',
+                side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            PostManager.create_post_with_photos(
+                user, [post_image], 'Test Description'
+            )
+
+        user.refresh_from_db()
+
+        self.assertFalse(models.Post.objects.filter(user=user).exists())
+        self.assertEqual(user.posts_number, 0)
+
     def test_get_posts_with_annotated_data_on_having_additional_attr(self):
         posts = PostManager.get_posts_with_annotated_data()
 
@@ -78,6 +154,7 @@ class TestPostManager(TestCase):
 
     def test_get_recommended_posts_users_posts_not_in_queryset(self):
         test_user_posts = self._create_test_user_posts_dict()
+        TrendingManager.refresh_scores()
 
         for user, posts in test_user_posts.items():
             recommended_posts = PostManager.get_recommended_posts(user=user)
@@ -157,6 +234,7 @@ class TestPostManager(TestCase):
             ordering = sorted(ordering, reverse=True)
 
             self._create_posts_with_likes(liked_users)
+            TrendingManager.refresh_scores()
 
             recommended_posts = PostManager.get_recommended_posts(user)
 
@@ -166,6 +244,176 @@ class TestPostManager(TestCase):
 
             PostManager.delete_all_posts()
 
+    def test_get_post_detail_queries_number(self):
+        viewer = self._test_users[0]
+
+        test_post = PostFactory(likes=self._test_users[:4])
+        photos = [PhotoFactory(post=test_post) for _ in range(2)]
+        comments = [
+            CommentFactory(post=test_post, user=user)
+            for user in self._test_users[:5]
+        ]
+
+        with self.assertNumQueries(3):
+            post_detail = PostManager.get_post_detail(
+                test_post.pk, viewer, comments_number=3
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(post_detail.author, test_post.user)
+            self.assertEqual(list(post_detail.photos), photos)
+            self.assertEqual(list(post_detail.comments), comments[-3:])
+            self.assertIsNotNone(post_detail.next_comments_cursor)
+            self.assertEqual(post_detail.likes_count, 4)
+            self.assertTrue(post_detail.is_liked)
+
+            post_detail.post.get_absolute_url()
+
+            for comment in post_detail.comments:
+                comment.user.get_absolute_url()
+                comment.post.user.get_absolute_url()
+
+        self.assertFalse(PostManager.get_post_detail(
+            test_post.pk, self._test_users[5], comments_number=3
+        ).is_liked)
+
+    def test_get_liked_post_ids(self):
+        user = self._test_users[0]
+
+        liked_posts = [PostFactory(likes=[user]) for _ in range(3)]
+        not_liked_posts = [PostFactory() for _ in range(3)]
+
+        with self.assertNumQueries(1):
+            liked_post_ids = PostManager.get_liked_post_ids(
+                [post.pk for post in (*liked_posts, *not_liked_posts)], user
+            )
+
+        self.assertEqual(liked_post_ids, {post.pk for post in liked_posts})
+
+    def test_get_recommended_posts_excludes_following_users_posts(self):
+        user = self._test_users[0]
+        following = self._test_users[1]
+
+        UserManager.follow_user(user, following)
+
+        following_post = PostFactory(user=following)
+        other_post = PostFactory(user=self._test_users[2])
+
+        TrendingManager.refresh_scores()
+
+        recommended_posts = PostManager.get_recommended_posts(user)
+
+        self.assertNotIn(following_post, recommended_posts)
+        self.assertIn(other_post, recommended_posts)
+
+    def test_refresh_scores_only_changed_posts(self):
+        posts = [PostFactory() for _ in range(3)]
+
+        self.assertEqual(TrendingManager.refresh_scores(batch_size=2), 3)
+        self.assertEqual(TrendingManager.refresh_scores(), 0)
+        self.assertFalse(models.Post.objects.filter(score_dirty=True).exists())
+
+        PostManager.like_post(posts[0], self._test_users[0])
+        CommentManager.add_comment(self._test_users[0], posts[1], 'Comment')
+
+        self.assertEqual(TrendingManager.refresh_scores(), 2)
+        self.assertEqual(
+            models.PostScore.objects.get(post=posts[0]).likes_count, 1
+        )
+        self.assertEqual(
+            models.PostScore.objects.get(post=posts[1]).comments_count, 1
+        )
+
+    @override_settings(TRENDING_WINDOW_DAYS=0)
+    def test_refresh_scores_drops_posts_out_of_window(self):
+        PostFactory()
+
+        self.assertEqual(TrendingManager.refresh_scores(), 0)
+
+        self.assertFalse(models.PostScore.objects.exists())
+        self.assertFalse(models.Post.objects.filter(score_dirty=True).exists())
+
+    def test_set_post_likes_sends_signals_after_transaction(self):
+        posts = [PostFactory() for _ in range(3)]
+        savepoints_numbers = []
+
+        def receiver(sender, post_id: int, **kwargs):
+            savepoints_numbers.append(len(connection.savepoint_ids))
+
+        post_changed.connect(receiver)
+
+        try:
+            PostManager.set_post_likes(
+                self._test_users[0], [(post.pk, True) for post in posts]
+            )
+        finally:
+            post_changed.disconnect(receiver)
+
+        self.assertEqual(
+            savepoints_numbers, [len(connection.savepoint_ids)] * 3
+        )
+
+    def test_like_unlike_post_updates_likes_count(self):
+        post = PostFactory()
+
+        for user in self._test_users:
+            PostManager.like_post(post, user)
+            PostManager.like_post(post, user)
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, len(self._test_users))
+
+        for user in self._test_users:
+            PostManager.unlike_post(post, user)
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+    def test_recount_counters(self):
+        post = PostFactory(likes=self._test_users[:3])
+        models.Post.objects.update(likes_count=100, comments_count=100)
+
+        PostManager.recount_counters(batch_size=1)
+
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 3)
+        self.assertEqual(post.comments_count, 0)
+
+    def test_delete_posts_in_batches(self):
+        user = self._test_users[0]
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            posts = [
+                PostManager.create_new_post(
+                    user, File(test_image), 'Test Description'
+                ) for _ in range(3)
+            ]
+
+        PostManager.like_post(posts[0], self._test_users[1])
+
+        image_names = [
+            post.photo_to_post.get().post_image.name for post in posts
+        ]
+        storage = posts[0].photo_to_post.get().post_image.storage
+
+        deleted = list(PostManager.delete_posts_in_batches(
+            models.Post.objects.filter(user=user), batch_size=2
+        ))
+
+        user.refresh_from_db()
+
+        self.assertEqual(deleted, [2, 1])
+        self.assertEqual(user.posts_number, 0)
+        self.assertFalse(models.Photo.objects.exists())
+        self.assertFalse(models.Post.likes.through.objects.exists())
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+
+        for image_name in image_names:
+            with self.subTest():
+                self.assertFalse(storage.exists(image_name))
+
     def test_like_unlike_post(self):
         post = PostFactory()
 
@@ -183,6 +431,9 @@ class TestPostManager(TestCase):
 
 class TestUserManager(TestCase):
     def setUp(self) -> None:
+        # The trie outlives the rolled back users of the other tests.
+        reset_username_trie()
+
         self._test_users = [UserFactory() for _ in range(10)]
 
     def test_get_only_users_data_has_additional_attr(self):
@@ -208,6 +459,86 @@ class TestUserManager(TestCase):
             with self.subTest():
                 self.assertNotIn(user, test_user.followers.all())
 
+    def test_follow_unfollow_user_updates_counters(self):
+        test_user = UserFactory()
+
+        for user in self._test_users:
+            UserManager.follow_user(user, test_user)
+            UserManager.follow_user(user, test_user)
+
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.followers_number, len(self._test_users))
+
+        for user in self._test_users:
+            UserManager.unfollow_user(user, test_user)
+
+            user.refresh_from_db()
+
+            with self.subTest():
+                self.assertEqual(user.following_number, 0)
+
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.followers_number, 0)
+
+    def test_follow_unfollow_user_sends_signals_after_transaction(self):
+        follower, followed = self._test_users[:2]
+        savepoints_numbers = []
+
+        def receiver(sender, **kwargs):
+            savepoints_numbers.append(len(connection.savepoint_ids))
+
+        for signal in (user_changed, relations_changed):
+            signal.connect(receiver)
+
+        try:
+            UserManager.follow_user(follower, followed)
+            UserManager.unfollow_user(follower, followed)
+        finally:
+            for signal in (user_changed, relations_changed):
+                signal.disconnect(receiver)
+
+        self.assertEqual(
+            savepoints_numbers, [len(connection.savepoint_ids)] * 8
+        )
+
+    def test_relation_ids_are_cached_until_follow_changes(self):
+        follower, followed = self._test_users[:2]
+
+        self.assertFalse(UserManager.is_following(follower, followed))
+
+        UserManager.follow_user(follower, followed)
+
+        self.assertTrue(UserManager.is_following(follower, followed))
+        self.assertIn(follower.pk, UserManager.get_follower_ids(followed))
+
+        loaded_follower = models.User.objects.get(pk=follower.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                list(UserManager.get_following_ids(loaded_follower)),
+                [followed.pk]
+            )
+
+        UserManager.unfollow_user(loaded_follower, followed)
+
+        self.assertFalse(UserManager.is_following(loaded_follower, followed))
+        self.assertNotIn(follower.pk, UserManager.get_follower_ids(followed))
+
+    def test_recount_counters(self):
+        test_user = UserFactory(followers=self._test_users)
+        PostFactory(user=test_user)
+
+        models.User.objects.update(
+            followers_number=0, following_number=5, posts_number=0
+        )
+
+        UserManager.recount_counters(batch_size=3)
+
+        test_user.refresh_from_db()
+        self.assertEqual(test_user.followers_number, len(self._test_users))
+        self.assertEqual(test_user.following_number, 0)
+        self.assertEqual(test_user.posts_number, 1)
+
     @staticmethod
     def _create_test_patterns_users_dict() -> dict:
         test_patterns_users = {
@@ -229,6 +560,28 @@ class TestUserManager(TestCase):
 
         return test_patterns_users
 
+    def test_delete_users_in_batches_updates_counters(self):
+        test_user = UserFactory()
+        test_post = PostFactory(user=test_user)
+
+        for user in self._test_users:
+            UserManager.follow_user(user, test_user)
+            PostManager.like_post(test_post, user)
+
+        deleted = list(UserManager.delete_users_in_batches(
+            models.User.objects.filter(
+                pk__in=[user.pk for user in self._test_users]
+            ), batch_size=4
+        ))
+
+        test_user.refresh_from_db()
+        test_post.refresh_from_db()
+
+        self.assertEqual(deleted, [4, 4, 2])
+        self.assertEqual(test_user.followers_number, 0)
+        self.assertEqual(test_post.likes_count, 0)
+        self.assertEqual(models.User.objects.get(), test_user)
+
     def test_search_users_by_username(self):
         test_patterns_users = self._create_test_patterns_users_dict()
 
@@ -239,6 +592,72 @@ class TestUserManager(TestCase):
                 with self.subTest():
                     self.assertIn(user, searched_users)
 
+    def test_search_users_by_username_ranking_and_limit(self):
+        expected_users = [
+            UserFactory(username='anna'),
+            UserFactory(username='AnnaB'),
+            UserFactory(username='annabelle'),
+        ]
+        UserFactory(username='joanna')
+
+        searched_users = UserManager.search_users_by_nickname('ANNA')
+
+        self.assertEqual(list(searched_users), expected_users)
+        self.assertEqual(
+            len(UserManager.search_users_by_nickname('anna', limit=2)), 2
+        )
+
+    def test_search_users_by_username_ignores_short_queries(self):
+        UserFactory(username='anna')
+
+        self.assertEqual(
+            list(UserManager.search_users_by_nickname('an')), []
+        )
+        self.assertEqual(
+            len(UserManager.search_users_by_nickname('ann')), 1
+        )
+
+    def test_search_users_by_username_after_rename(self):
+        user = UserFactory(username='old_name')
+        UserManager.search_users_by_nickname('old')
+
+        user.username = 'new_name'
+        user.save()
+
+        self.assertNotIn(user, UserManager.search_users_by_nickname('old'))
+        self.assertIn(user, UserManager.search_users_by_nickname('new'))
+
+    def test_search_users_by_username_after_change_by_other_process(self):
+        UserManager.search_users_by_nickname('other')
+
+        # Neither sends the signals, like the changes of other processes.
+        models.User.objects.bulk_create([
+            models.User(username='other_user', email='other@example.com')
+        ])
+        bump_usernames_version()
+
+        self.assertEqual(
+            [user.username for user in
+             UserManager.search_users_by_nickname('other')],
+            ['other_user']
+        )
+
+    def test_search_users_by_username_skips_outdated_candidates(self):
+        outdated_users = [
+            UserFactory(username=f'anna{number}') for number in range(3)
+        ]
+        expected_user = UserFactory(username='anna_current')
+        UserManager.search_users_by_nickname('anna')
+
+        models.User.objects.filter(
+            pk__in=[user.pk for user in outdated_users]
+        ).update(username=Concat(Value('renamed_'), 'username'))
+
+        self.assertEqual(
+            list(UserManager.search_users_by_nickname('anna', limit=1)),
+            [expected_user]
+        )
+
 
 class TestCommentManager(TestCase):
     def setUp(self) -> None:
@@ -259,3 +678,379 @@ class TestCommentManager(TestCase):
 
             with self.subTest():
                 self.assertNotIn(new_comment, models.Comment.objects.all())
+
+    def test_add_delete_comment_updates_comments_count(self):
+        test_post = PostFactory()
+
+        comments = [
+            CommentManager.add_comment(user, test_post, 'Test text')
+            for user in self._test_users
+        ]
+
+        test_post.refresh_from_db()
+        self.assertEqual(test_post.comments_count, len(self._test_users))
+
+        for comment in comments:
+            CommentManager.delete_comment(comment)
+
+        test_post.refresh_from_db()
+        self.assertEqual(test_post.comments_count, 0)
+
+    def test_delete_user_comment_checks_ownership(self):
+        post_author, comment_author, stranger = self._test_users[:3]
+
+        test_post = PostFactory(user=post_author)
+        comments = [
+            CommentManager.add_comment(comment_author, test_post, 'Test text')
+            for _ in range(2)
+        ]
+
+        for user, comment, deleted in (
+                (stranger, comments[0], 0),
+                (comment_author, comments[0], 1),
+                (post_author, comments[1], 1),
+                (post_author, comments[1], 0)):
+
+            with self.subTest():
+                self.assertEqual(
+                    CommentManager.delete_user_comment(
+                        comment.pk, test_post.pk, user
+                    ),
+                    deleted
+                )
+
+        test_post.refresh_from_db()
+        self.assertEqual(test_post.comments_count, 0)
+
+
+class TestTimelineManager(TestCase):
+    def setUp(self) -> None:
+        self._test_author = UserFactory()
+        self._test_followers = [
+            UserFactory(following=[self._test_author]) for _ in range(5)
+        ]
+
+    def _create_pushed_post(self) -> models.Post:
+        post = PostFactory(user=self._test_author)
+        TimelineManager.push_post(post)
+
+        return post
+
+    @staticmethod
+    def _get_timeline_posts(owner: models.User) -> list:
+        return list(TimelineManager.get_timeline_paginator(owner, 10).page())
+
+    def test_push_post_adds_post_to_followers_timelines(self):
+        post = self._create_pushed_post()
+
+        for user in (self._test_author, *self._test_followers):
+            with self.subTest():
+                self.assertIn(post, self._get_timeline_posts(user))
+
+        self.assertNotIn(
+            post, self._get_timeline_posts(UserFactory())
+        )
+
+    def test_unfollow_user_removes_authors_posts_from_timeline(self):
+        post = self._create_pushed_post()
+        follower = self._test_followers[0]
+
+        UserManager.unfollow_user(follower, self._test_author)
+
+        self.assertNotIn(post, self._get_timeline_posts(follower))
+
+    def test_follow_user_backfills_authors_posts(self):
+        post = self._create_pushed_post()
+        new_follower = UserFactory()
+
+        UserManager.follow_user(new_follower, self._test_author)
+
+        self.assertIn(post, self._get_timeline_posts(new_follower))
+
+    def test_delete_post_removes_timeline_entries(self):
+        post = self._create_pushed_post()
+
+        PostManager.delete_post(post)
+
+        self.assertFalse(models.TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_push_post_falls_back_to_fanout_on_read(self):
+        post = self._create_pushed_post()
+
+        self.assertTrue(self._test_author.fanout_on_read)
+        self.assertEqual(
+            models.TimelineEntry.objects.filter(post=post).count(), 1
+        )
+
+        for user in self._test_followers:
+            with self.subTest():
+                self.assertIn(post, self._get_timeline_posts(user))
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_timeline_pages_merge_fanout_on_read_posts(self):
+        follower = self._test_followers[0]
+        fanout_on_write_author = UserFactory(followers=[follower])
+
+        posts = []
+
+        for author in (self._test_author, fanout_on_write_author) * 4:
+            post = PostFactory(user=author)
+            TimelineManager.push_post(post)
+            posts.append(post)
+
+        paginator = TimelineManager.get_timeline_paginator(follower, 3)
+
+        page = paginator.page()
+        timeline_posts = list(page)
+
+        while page.has_next:
+            page = paginator.page(page.next_cursor)
+            timeline_posts.extend(page)
+
+        self.assertTrue(self._test_author.fanout_on_read)
+        self.assertEqual(timeline_posts, posts[::-1])
+
+    def test_get_timeline_posts_excludes_blocked_users_posts(self):
+        post = self._create_pushed_post()
+        follower = self._test_followers[0]
+
+        self.assertIn(post, self._get_timeline_posts(follower))
+
+        models.BlockedUserList.objects.create(
+            user_id=follower, blocked_users=self._test_author
+        )
+        follower = models.User.objects.get(pk=follower.pk)
+
+        self.assertNotIn(post, self._get_timeline_posts(follower))
+
+
+class TestQueryIndexes(TestCase):
+    def setUp(self) -> None:
+        self._test_user = UserFactory()
+        self._test_post = PostFactory(user=self._test_user)
+
+        # The test tables are tiny, so Postgres would scan them anyway.
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndexes(self, querysets: dict):
+        for index_name, queryset in querysets.items():
+            with self.subTest(index_name=index_name):
+                self.assertIn(index_name, queryset.explain())
+
+    def test_post_queries_use_indexes(self):
+        self.assertUsesIndexes({
+            'post_user_date_idx':
+                PostManager.get_posts_with_related_data_by_user(
+                    self._test_user
+                )[:13],
+            'comment_post_date_idx': PostManager.get_post_comments(
+                self._test_post
+            ).order_by('-created_date', '-pk')[:21],
+            'post_likes_user_post_idx': PostManager.get_users_likes(
+                [self._test_user.pk]
+            ).values_list('post_id'),
+        })
+
+    def test_user_queries_use_indexes(self):
+        self.assertUsesIndexes({
+            'user_followers_to_from_idx': UserManager.get_own_relations(
+                self._test_user.pk
+            ),
+        })
+
+    def test_timeline_queries_use_indexes(self):
+        self.assertUsesIndexes({
+            'timeline_owner_date_idx': TimelineManager.get_timeline_entries(
+                self._test_user
+            ).order_by('-created_date', '-post_id')[:11],
+            'user_followers_to_from_idx':
+                TimelineManager.get_fanout_on_read_posts(
+                    self._test_user
+                ).order_by('-created_date', '-pk')[:11],
+        })
+
+
+class TestThumbnailJobManager(TestCase):
+    def setUp(self) -> None:
+        self._test_user = UserFactory()
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            self._test_post = PostManager.create_new_post(
+                self._test_user, File(test_image), 'Test Description'
+            )
+
+        self._test_photo = self._test_post.photo_to_post.get()
+
+    def test_create_new_post_enqueues_thumbnail_job(self):
+        job = models.ThumbnailJob.objects.get()
+
+        self.assertEqual(job.object_id, self._test_photo.pk)
+        self.assertEqual(job.file_name, self._test_photo.post_image.name)
+        self.assertEqual(job.status, models.ThumbnailJob.Status.PENDING)
+
+    @override_settings(THUMBNAIL_JOB_MAX_ATTEMPTS=2)
+    def test_failed_job_is_retried_until_max_attempts(self):
+        for status in (
+                models.ThumbnailJob.Status.PENDING,
+                models.ThumbnailJob.Status.FAILED
+        ):
+            job, = ThumbnailJobManager.claim_jobs()
+            ThumbnailJobManager.fail_job(job.pk, 'Test error')
+
+            with self.subTest():
+                self.assertEqual(
+                    models.ThumbnailJob.objects.get().status, status
+                )
+
+        self.assertEqual(ThumbnailJobManager.claim_jobs(), [])
+
+    def test_process_thumbnail_jobs_generates_aliases(self):
+        thumbnailer = get_thumbnailer(self._test_photo.post_image)
+        options = aliases.get('home_post')
+
+        self.assertIsNone(thumbnailer.get_existing_thumbnail(options))
+
+        call_command('process_thumbnail_jobs', processes=1, stdout=StringIO())
+
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+        self.assertIsNotNone(thumbnailer.get_existing_thumbnail(options))
+
+        self._test_photo.refresh_from_db()
+        self.assertEqual(
+            set(self._test_photo.post_image_thumbnails),
+            set(aliases.all(include_global=True))
+        )
+
+    @override_settings(
+        THUMBNAIL_VARIANT_WIDTHS=(320, 480),
+        THUMBNAIL_VARIANT_FORMATS=('webp',)
+    )
+    def test_process_thumbnail_jobs_generates_variants(self):
+        call_command('process_thumbnail_jobs', processes=1, stdout=StringIO())
+
+        self._test_photo.refresh_from_db()
+        webp_variants = self._test_photo.post_image_variants['home_post'][
+            'webp'
+        ]
+
+        self.assertEqual(
+            [width for width, _ in webp_variants], [320, 480, 720]
+        )
+
+        for width, url in webp_variants:
+            with self.subTest():
+                self.assertTrue(url.endswith('.webp'))
+
+        self.assertEqual(
+            thumbnail_srcsets(self._test_photo.post_image, 'home_post'),
+            [(
+                'image/webp',
+                ', '.join(f'{url} {width}w' for width, url in webp_variants)
+            )]
+        )
+
+    def test_resolve_posts_thumbnail_urls_saves_existing_thumbnails(self):
+        thumbnailer = get_thumbnailer(self._test_photo.post_image)
+
+        for alias in aliases.all(include_global=True):
+            thumbnailer.get_thumbnail(
+                dict(aliases.get(alias), ALIAS=alias)
+            )
+
+        post = PostManager.get_posts_with_annotated_data().get(
+            pk=self._test_post.pk
+        )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                ready_thumbnail_url(
+                    post.photo_to_post.all()[0].post_image, 'home_post'
+                ),
+                self._test_photo.post_image.url
+            )
+
+        resolve_posts_thumbnail_urls([post])
+
+        self._test_photo.refresh_from_db()
+        self.assertEqual(
+            self._test_photo.post_image_thumbnails['home_post'],
+            thumbnailer.get_existing_thumbnail(
+                dict(aliases.get('home_post'), ALIAS='home_post')
+            ).url
+        )
+
+    def test_new_file_clears_saved_thumbnail_urls(self):
+        models.Photo.objects.filter(pk=self._test_photo.pk).update(
+            post_image_thumbnails={'home_post': 'old_url'}
+        )
+        self._test_photo.refresh_from_db()
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            self._test_photo.post_image = File(test_image)
+            self._test_photo.save()
+
+        self._test_photo.refresh_from_db()
+        self.assertEqual(self._test_photo.post_image_thumbnails, {})
+        self.assertEqual(models.ThumbnailJob.objects.count(), 2)
+
+
+class TestBulkDbFiller(TestCase):
+    def test_fill_db_bulk_fake_data(self):
+        call_command(
+            'fill_db_bulk_fake_data', users=50, posts_per_user=2,
+            follows_per_user=5, likes_per_post=3, batch_size=20,
+            skip_images=True, seed=1, stdout=StringIO()
+        )
+
+        follows = models.User.followers.through.objects
+
+        self.assertEqual(models.User.objects.count(), 50)
+        self.assertTrue(models.User.objects.first().check_password(
+            'password'
+        ))
+        self.assertFalse(
+            follows.filter(from_user=F('to_user')).exists()
+        )
+        self.assertEqual(
+            sum(models.User.objects.values_list(
+                'followers_number', flat=True
+            )),
+            follows.count()
+        )
+        self.assertEqual(
+            models.Photo.objects.count(), models.Post.objects.count()
+        )
+        self.assertFalse(models.ThumbnailJob.objects.exists())
+        self.assertTrue(models.TimelineEntry.objects.exists())
+
+    def test_create_likes_counts_inserted_rows(self):
+        db_filler = BulkDbFiller(
+            users_number=10, posts_per_user=1, follows_per_user=0,
+            likes_per_post=20, batch_size=20, seed=1
+        )
+
+        user_ids = db_filler.create_users()
+        posts = db_filler.create_posts(user_ids)
+
+        # Batches repeat the pairs, which are skipped on insert.
+        self.assertEqual(
+            db_filler.create_likes(
+                user_ids, posts, db_filler._get_popularity(len(user_ids))
+            ),
+            models.Post.likes.through.objects.count()
+        )
+
+    def test_unique_pairs_keeps_equal_ids(self):
+        self.assertEqual(
+            BulkDbFiller._unique_pairs(
+                np.array([1, 2, 1]), np.array([1, 3, 1])
+            ).tolist(),
+            [[1, 1], [2, 3]]
+        )
@@ -1,16 +1,39 @@
+import json
+import os
+from io import StringIO
+
 from django.contrib.sessions.middleware import SessionMiddleware
-from django.http import HttpRequest
-from django.test import TestCase, RequestFactory, Client, override_settings
+from django.http import HttpRequest, HttpResponse
+from django.db import connection, connections
+from django.test import (
+    TestCase, TransactionTestCase, RequestFactory, Client, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
 
 from django_gramm.tests.factories import (
     CommentFactory, UserFactory, PostFactory,
     create_posts_using_factories, create_post_using_factories
 )
-from django_gramm.models_manager import UserManager, PostManager
+from django_gramm.models_manager import (
+    UserManager, PostManager, TimelineManager
+)
+
+from django_gramm.caching import get_cached_relation_ids
+from django_gramm.middleware import ReplicaRoutingMiddleware
+from django_gramm.pagination import encode_cursor
+from django_gramm.replicas import (
+    ReplicaRouter, read_from_replica, replica_routing
+)
+from django_gramm.search import reset_username_trie
+from django_gramm.uploads import load_upload_token
 
 from django_gramm import views
 from django_gramm import models
@@ -18,6 +41,9 @@ from django_gramm import models
 
 class TestViews(TestCase):
     def setUp(self) -> None:
+        # The trie outlives the rolled back users of the other tests.
+        reset_username_trie()
+
         self._request_factory = RequestFactory()
 
         self._test_users = [UserFactory() for _ in range(10)]
@@ -283,6 +309,32 @@ class TestUserViews(TestViews):
         self.assertEqual(request.user.username, data_to_change['username'])
         self.assertEqual(request.user.email, data_to_change['email'])
 
+    @override_settings(IMAGE_MAX_SIDE=320)
+    def test_edit_user_profile_picture_is_downscaled(self):
+        test_user = self._test_users[0]
+        self.client.force_login(test_user)
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_photo:
+            response = self.client.post(
+                reverse(
+                    'django_gramm:edit_profile',
+                    args=[test_user.username]
+                ),
+                {
+                    'username': test_user.username, 'email': test_user.email,
+                    'picture': test_photo
+                }
+            )
+
+        test_user.refresh_from_db()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            (test_user.picture.width, test_user.picture.height), (320, 180)
+        )
+
     def _create_request_for_change_user_password(
             self, user: models.User, password_change_data: dict
     ) -> HttpRequest:
@@ -328,7 +380,7 @@ class TestUserViews(TestViews):
         self._client.force_login(test_user)
 
         for user in self._test_users[1:]:
-            response = self._client.get(
+            response = self._client.post(
                 reverse('django_gramm:follow', args=[user.username])
             )
             content = response.content
@@ -338,7 +390,7 @@ class TestUserViews(TestViews):
 
                 self.assertJSONEqual(
                     content.decode(encoding='utf-8'),
-                    {'status': 'OK', 'code': 200}
+                    {'status': 'OK', 'code': 200, 'followers_number': 1}
                 )
 
                 self.assertIn(test_user, user.followers.all())
@@ -349,23 +401,50 @@ class TestUserViews(TestViews):
         for user in self._test_users:
             self._client.force_login(user)
 
-            response = self._client.get(reverse(
+            response = self._client.post(reverse(
                 'django_gramm:unfollow', args=[test_user.username]
             ))
             content = response.content
 
             self._client.logout()
 
+            test_user.refresh_from_db()
+
             with self.subTest():
                 self.assertEqual(response.status_code, 200)
 
                 self.assertJSONEqual(
                     content.decode(encoding='utf-8'),
-                    {'status': 'OK', 'code': 200}
+                    {
+                        'status': 'OK', 'code': 200,
+                        'followers_number': test_user.followers_number
+                    }
                 )
 
                 self.assertNotIn(user, test_user.followers.all())
 
+    def test_follow_user_is_idempotent_and_post_only(self):
+        test_user, user_to_follow = self._test_users[:2]
+        follow_url = reverse(
+            'django_gramm:follow', args=[user_to_follow.username]
+        )
+
+        self._client.force_login(test_user)
+
+        self.assertEqual(self._client.get(follow_url).status_code, 405)
+
+        for _ in range(2):
+            response = self._client.post(follow_url)
+
+            with self.subTest():
+                self.assertEqual(response.json()['followers_number'], 1)
+
+        response = self._client.post(
+            reverse('django_gramm:follow', args=['missing_user'])
+        )
+
+        self.assertEqual(response.json(), {'status': 'ERROR', 'code': 404})
+
     def test_show_followers(self):
         test_user = UserFactory(followers=self._test_users)
 
@@ -404,6 +483,26 @@ class TestUserViews(TestViews):
                     bytes(user.get_absolute_url(), encoding='utf-8'), content
                 )
 
+    def test_show_followers_marks_followed_users(self):
+        test_user = UserFactory(followers=self._test_users)
+        viewer = self._test_users[0]
+
+        UserManager.follow_user(viewer, self._test_users[1])
+
+        self._client.force_login(viewer)
+
+        response = self._client.get(
+            reverse('django_gramm:followers', args=[test_user.username])
+        )
+
+        for user in response.context['users']:
+            with self.subTest():
+                self.assertEqual(
+                    user.is_followed, user.pk == self._test_users[1].pk
+                )
+
+        self.assertContains(response, '>Following</span>', count=1)
+
     def test_search_users(self):
         self._client.force_login(self._test_users[0])
 
@@ -413,14 +512,14 @@ class TestUserViews(TestViews):
                 UserFactory(username='johnathan')
             ),
 
-            'Mi': (
-                UserFactory(username='MikoNiko'), UserFactory(username='Mimi'),
-                UserFactory(username='MichaelMan')
+            'Mik': (
+                UserFactory(username='MikoNiko'), UserFactory(username='Mika'),
+                UserFactory(username='MikhailMan')
             ),
 
-            'Ka': (
+            'Kar': (
                 UserFactory(username='KarKarych'),
-                UserFactory(username='Kata'), UserFactory(username='Kamil')
+                UserFactory(username='Kara'), UserFactory(username='Karl')
             )
         }
 
@@ -441,6 +540,24 @@ class TestUserViews(TestViews):
                         content
                     )
 
+    def test_search_users_json(self):
+        self._client.force_login(self._test_users[0])
+
+        expected_users = [
+            UserFactory(username='Typeahead'),
+            UserFactory(username='typeahead_user'),
+        ]
+
+        response = self._client.get(
+            reverse('django_gramm:search_users_json'), {'q': 'typea'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [user['username'] for user in response.json()['users']],
+            [user.username for user in expected_users]
+        )
+
     def test_search_users_with_empty_searched_users(self):
         self._client.force_login(self._test_users[0])
 
@@ -662,66 +779,54 @@ class TestPostsViews(TestViews):
             ).exists()
         )
 
-    def _create_request_for_test_delete_comment(
-            self, post_user: models.User, post: models.Post,
-            comment_user: models.User, comment: models.Comment) -> HttpRequest:
-
-        request = self._request_factory.delete(
-            reverse(
-                'django_gramm:delete_comment',
-                args=[post_user.username, post.pk, comment.pk]
-            )
-        )
-
-        self._add_necessary_attributes_to_request(request)
+    def _delete_comment(
+            self, user: models.User, post: models.Post,
+            comment: models.Comment):
 
-        request.user = comment_user
+        client = Client()
+        client.force_login(user)
 
-        return request
+        return client.post(reverse(
+            'django_gramm:delete_comment',
+            args=[post.user.username, post.pk, comment.pk]
+        ))
 
     def test_delete_comment(self):
         test_post = self._test_posts[0]
 
         comment_user = self._test_users[1]
-        test_comment = CommentFactory(user=comment_user, post=test_post)
 
-        request = self._create_request_for_test_delete_comment(
-            test_post.user, test_post, comment_user, test_comment
-        )
+        for user in (comment_user, test_post.user):
+            test_comment = CommentFactory(user=comment_user, post=test_post)
 
-        response = views.delete_comment_json(
-            request, test_post.user.username, test_post.pk, test_comment.pk
-        )
-        content = response.content
+            response = self._delete_comment(user, test_post, test_comment)
+            content = response.content
 
-        self.assertEqual(response.status_code, 200)
+            with self.subTest():
+                self.assertEqual(response.status_code, 200)
 
-        self.assertJSONEqual(
-            content.decode(encoding='utf-8'),
-            {'status': 'OK', 'code': 200}
-        )
+                self.assertJSONEqual(
+                    content.decode(encoding='utf-8'),
+                    {'status': 'OK', 'code': 200}
+                )
 
-        self.assertFalse(
-            models.Comment.objects.filter(
-                pk=test_comment.pk
-            ).exists()
-        )
+                self.assertFalse(
+                    models.Comment.objects.filter(
+                        pk=test_comment.pk
+                    ).exists()
+                )
 
     def _test_delete_comment_with_incorrect_data(
-            self, post_user: models.User, test_post: models.Post,
-            comment_user: models.User, test_comment: models.Comment) -> None:
+            self, user: models.User, test_post: models.Post,
+            test_comment: models.Comment, code: int) -> None:
 
-        request = self._create_request_for_test_delete_comment(
-            test_post.user, test_post, comment_user, test_comment
-        )
+        response = self._delete_comment(user, test_post, test_comment)
 
-        response = views.delete_comment(
-            request, post_user.username,
-            test_post.pk, test_comment.pk
+        self.assertJSONEqual(
+            response.content.decode(encoding='utf-8'),
+            {'status': 'ERROR', 'code': code}
         )
 
-        self.assertEqual(response.status_code, 403)
-
         self.assertTrue(
             models.Comment.objects.filter(
                 pk=test_comment.pk
@@ -737,7 +842,7 @@ class TestPostsViews(TestViews):
         )
 
         self._test_delete_comment_with_incorrect_data(
-            test_post.user, test_post, incorrect_user, test_comment
+            incorrect_user, test_post, test_comment, 403
         )
 
     def test_delete_comment_with_incorrect_comment(self):
@@ -749,9 +854,35 @@ class TestPostsViews(TestViews):
         )
 
         self._test_delete_comment_with_incorrect_data(
-            test_post.user, test_post, comment_user, test_comment
+            comment_user, test_post, test_comment, 404
         )
 
+    def test_delete_comment_queries_number_does_not_depend_on_comments(self):
+        test_post = self._test_posts[0]
+        comment_user = self._test_users[1]
+
+        client = Client()
+        client.force_login(comment_user)
+
+        def count_delete_queries() -> int:
+            test_comment = CommentFactory(user=comment_user, post=test_post)
+
+            with CaptureQueriesContext(connection) as queries:
+                client.post(reverse(
+                    'django_gramm:delete_comment',
+                    args=[test_post.user.username, test_post.pk,
+                          test_comment.pk]
+                ))
+
+            return len(queries)
+
+        queries_number = count_delete_queries()
+
+        for user in self._test_users:
+            CommentFactory(user=user, post=test_post)
+
+        self.assertEqual(count_delete_queries(), queries_number)
+
     def _create_request_for_test_add_post(
             self, user: models.User, post_data: dict) -> HttpRequest:
 
@@ -809,6 +940,73 @@ class TestPostsViews(TestViews):
 
         self.assertFalse(test_user.posts.all().exists())
 
+    def test_add_post_with_several_photos(self):
+        test_user = UserFactory()
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_photo:
+            photo_content = test_photo.read()
+
+        self.client.force_login(test_user)
+
+        response = self.client.post(
+            reverse('django_gramm:add_post', args=[test_user.username]), {
+                'post_image': [
+                    SimpleUploadedFile(f'photo_{index}.jpeg', photo_content)
+                    for index in range(3)
+                ],
+                'description': 'TestDescription'
+            }
+        )
+
+        self.assertEqual(response.status_code, 302)
+
+        self.assertEqual(
+            models.Photo.objects.filter(post__user=test_user).count(), 3
+        )
+
+    def test_add_post_with_invalid_photo(self):
+        test_user = UserFactory()
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_photo:
+            photo_content = test_photo.read()
+
+        self.client.force_login(test_user)
+
+        response = self.client.post(
+            reverse('django_gramm:add_post', args=[test_user.username]), {
+                'post_image': [
+                    SimpleUploadedFile('photo.jpeg', photo_content),
+                    SimpleUploadedFile('photo.txt', b'Not an image')
+                ],
+                'description': 'TestDescription'
+            }
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(test_user.posts.all().exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=100_000)
+    def test_add_post_with_too_large_photo(self):
+        test_user = UserFactory()
+        self.client.force_login(test_user)
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_photo:
+            response = self.client.post(
+                reverse('django_gramm:add_post', args=[test_user.username]),
+                {'post_image': test_photo, 'description': 'TestDescription'}
+            )
+
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(test_user.posts.all().exists())
+
     def _create_request_for_test_like_post_on_index(
             self, user: models.User, post: models.Post) -> HttpRequest:
 
@@ -868,58 +1066,42 @@ class TestPostsViews(TestViews):
             self._test_like_post_on_index(user, test_post)
             self._test_unlike_post_on_index(user, test_post)
 
-    def _create_request_for_like_post(
-            self, user: models.User, post: models.Post) -> HttpRequest:
-
-        request = self._request_factory.get(
-            reverse('django_gramm:like_post',
-                    args=[post.user.username, post.pk])
-        )
-        self._add_necessary_attributes_to_request(request)
-
-        request.user = user
-
-        return request
-
-    def _create_request_for_unlike_post(
-            self, user: models.User, post: models.Post) -> HttpRequest:
-
-        request = self._request_factory.get(
-            reverse('django_gramm:unlike_post',
-                    args=[post.user.username, post.pk])
-        )
-        self._add_necessary_attributes_to_request(request)
-
-        request.user = user
-
-        return request
-
     def _test_like_post(self, user: models.User, post: models.Post) -> None:
-        request = self._create_request_for_like_post(user, post)
+        client = Client()
+        client.force_login(user)
 
-        response = views.like_post_json(request, post.user.username, post.pk)
+        response = client.post(reverse(
+            'django_gramm:like_post', args=[post.user.username, post.pk]
+        ))
         content = response.content
 
+        post.refresh_from_db()
+
         self.assertEqual(response.status_code, 200)
 
         self.assertJSONEqual(
             content.decode(encoding='utf-8'),
-            {'status': 'OK', 'code': 200}
+            {'status': 'OK', 'code': 200, 'likes_count': post.likes_count}
         )
 
         self.assertIn(user, post.likes.all())
 
     def _test_unlike_post(self, user: models.User, post: models.Post) -> None:
-        request = self._create_request_for_unlike_post(user, post)
+        client = Client()
+        client.force_login(user)
 
-        response = views.unlike_post_json(request, post.user.username, post.pk)
+        response = client.post(reverse(
+            'django_gramm:unlike_post', args=[post.user.username, post.pk]
+        ))
         content = response.content
 
+        post.refresh_from_db()
+
         self.assertEqual(response.status_code, 200)
 
         self.assertJSONEqual(
             content.decode(encoding='utf-8'),
-            {'status': 'OK', 'code': 200}
+            {'status': 'OK', 'code': 200, 'likes_count': post.likes_count}
         )
 
         self.assertNotIn(user, post.likes.all())
@@ -930,3 +1112,591 @@ class TestPostsViews(TestViews):
         for user in self._test_users:
             self._test_like_post(user, test_post)
             self._test_unlike_post(user, test_post)
+
+    def test_like_post_is_idempotent_and_post_only(self):
+        test_post = self._test_posts[0]
+        like_url = reverse(
+            'django_gramm:like_post',
+            args=[test_post.user.username, test_post.pk]
+        )
+
+        client = Client()
+        client.force_login(self._test_users[0])
+
+        self.assertEqual(client.get(like_url).status_code, 405)
+
+        for _ in range(2):
+            response = client.post(like_url)
+
+            with self.subTest():
+                self.assertEqual(response.json()['likes_count'], 1)
+
+        response = client.post(reverse(
+            'django_gramm:like_post',
+            args=[test_post.user.username, test_post.pk + 1000]
+        ))
+
+        self.assertEqual(response.json(), {'status': 'ERROR', 'code': 404})
+        self.assertFalse(
+            models.Post.likes.through.objects.filter(
+                post_id=test_post.pk + 1000
+            ).exists()
+        )
+
+    def test_like_posts_applies_queued_toggles(self):
+        liked_post, unliked_post = self._test_posts[:2]
+        user = self._test_users[0]
+
+        PostManager.like_post(unliked_post, user)
+
+        client = Client()
+        client.force_login(user)
+
+        response = client.post(reverse('django_gramm:like_posts'), {
+            'toggles': json.dumps([
+                {'post_id': liked_post.pk, 'liked': False},
+                {'post_id': unliked_post.pk, 'liked': False},
+                {'post_id': liked_post.pk, 'liked': True},
+                {'post_id': liked_post.pk + 1000, 'liked': True},
+            ])
+        })
+
+        self.assertEqual(response.json(), {
+            'status': 'OK', 'code': 200,
+            'likes_counts': {str(liked_post.pk): 1, str(unliked_post.pk): 0},
+            'missing_post_ids': [liked_post.pk + 1000],
+        })
+        self.assertIn(user, liked_post.likes.all())
+        self.assertNotIn(user, unliked_post.likes.all())
+
+    def test_like_posts_with_invalid_toggles(self):
+        client = Client()
+        client.force_login(self._test_users[0])
+
+        for toggles in ('invalid', '{}', '[{"post_id": 1, "liked": "yes"}]'):
+            response = client.post(
+                reverse('django_gramm:like_posts'), {'toggles': toggles}
+            )
+
+            with self.subTest(toggles=toggles):
+                self.assertEqual(
+                    response.json(), {'status': 'ERROR', 'code': 400}
+                )
+
+
+class TestFollowedAuthorViews(TestCase):
+    def setUp(self) -> None:
+        self._client = Client()
+
+        self._test_author = UserFactory()
+        self._test_user = UserFactory(following=[self._test_author])
+
+        self._test_posts = [
+            PostFactory(user=self._test_author) for _ in range(12)
+        ]
+
+        for post in self._test_posts:
+            TimelineManager.push_post(post)
+
+        self._client.force_login(self._test_user)
+
+
+class TestPaginatedViews(TestFollowedAuthorViews):
+    def test_index_renders_first_page(self):
+        response = self._client.get(reverse('django_gramm:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['posts']), 10)
+        self.assertIsNotNone(response.context['next_page_url'])
+
+    def test_index_json_returns_next_page_without_overlap(self):
+        response = self._client.get(reverse('django_gramm:index'))
+        first_page = list(response.context['posts'])
+
+        response = self._client.get(response.context['next_page_url'])
+        json_response = response.json()
+
+        self.assertEqual(json_response['status'], 'OK')
+        self.assertIsNone(json_response['next_page_url'])
+
+        for post in self._test_posts:
+            with self.subTest():
+                self.assertNotEqual(
+                    post in first_page,
+                    f'id="post_{post.pk}"' in json_response['html']
+                )
+
+    def test_index_json_with_invalid_cursor(self):
+        response = self._client.get(
+            reverse('django_gramm:index_page'), {'cursor': 'invalid'}
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_paginated_views_with_tampered_cursor(self):
+        page_urls = (
+            reverse('django_gramm:index_page'),
+            reverse(
+                'django_gramm:user_posts_page',
+                args=[self._test_author.username]
+            ),
+            reverse('django_gramm:recommended_posts_page'),
+        )
+
+        for page_url in page_urls:
+            for values in (['abc', 'x'], [{'a': 1}, 1], [None, None]):
+                with self.subTest(page_url=page_url, values=values):
+                    response = self._client.get(
+                        page_url, {'cursor': encode_cursor(values)}
+                    )
+
+                    self.assertEqual(response.status_code, 404)
+
+    def _count_index_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self._client.get(reverse('django_gramm:index'))
+
+        return len(queries)
+
+    def test_index_queries_number_does_not_depend_on_posts_number(self):
+        for post in self._test_posts:
+            PostManager.like_post(post, self._test_user)
+
+        full_page_queries_number = self._count_index_queries()
+
+        for post in self._test_posts[2:]:
+            PostManager.delete_post(post)
+
+        self.assertEqual(self._count_index_queries(), full_page_queries_number)
+
+    def test_show_followers_json(self):
+        followers = [
+            UserFactory(
+                username=f'test_follower_{index}',
+                following=[self._test_author]
+            ) for index in range(35)
+        ]
+
+        response = self._client.get(
+            reverse(
+                'django_gramm:followers', args=[self._test_author.username]
+            )
+        )
+        first_page = list(response.context['users'])
+
+        response = self._client.get(response.context['next_page_url'])
+        second_page_html = response.json()['html']
+
+        for user in (self._test_user, *followers):
+            with self.subTest():
+                self.assertNotEqual(
+                    user in first_page,
+                    user.get_absolute_url() in second_page_html
+                )
+
+
+class TestCachedViews(TestFollowedAuthorViews):
+    def test_user_profile_data_cache_is_invalidated_after_follow(self):
+        profile_url = reverse(
+            'django_gramm:user_profile', args=[self._test_author.username]
+        )
+
+        response = self._client.get(profile_url)
+        self.assertEqual(
+            response.context['user_to_display'].followers_number, 1
+        )
+
+        UserManager.follow_user(UserFactory(), self._test_author)
+
+        response = self._client.get(profile_url)
+
+        self.assertEqual(
+            response.context['user_to_display'].followers_number, 2
+        )
+        self.assertRegex(
+            response.content.decode(), r'id="followersCount">\s*2\s*<'
+        )
+
+    def test_post_card_cache_is_invalidated_after_post_change(self):
+        test_post = self._test_posts[-1]
+
+        self._client.get(reverse('django_gramm:index'))
+
+        test_post.description = 'Changed description'
+        test_post.save()
+
+        response = self._client.get(reverse('django_gramm:index'))
+
+        self.assertContains(response, 'Changed description')
+
+    def test_profile_post_card_cache_is_invalidated_after_author_rename(self):
+        test_post = self._test_posts[-1]
+
+        self._client.get(reverse(
+            'django_gramm:user_profile', args=[self._test_author.username]
+        ))
+
+        self._test_author.username = 'renamed_author'
+        self._test_author.save()
+
+        response = self._client.get(reverse(
+            'django_gramm:user_profile', args=['renamed_author']
+        ))
+
+        self.assertContains(response, test_post.get_absolute_url())
+
+
+class TestPostCommentsViews(TestFollowedAuthorViews):
+    @override_settings(POST_COMMENTS_PAGE_SIZE=3)
+    def test_show_post_loads_older_comments_lazily(self):
+        test_post = self._test_posts[0]
+        comments = [
+            CommentFactory(post=test_post, user=self._test_user)
+            for _ in range(7)
+        ]
+
+        response = self._client.get(reverse(
+            'django_gramm:show_post',
+            args=[self._test_author.username, test_post.pk]
+        ))
+
+        self.assertEqual(list(response.context['comments']), comments[-3:])
+
+        pages_html = []
+        next_page_url = response.context['next_page_url']
+
+        while next_page_url:
+            json_response = self._client.get(next_page_url).json()
+
+            pages_html.append(json_response['html'])
+            next_page_url = json_response['next_page_url']
+
+        self.assertEqual(len(pages_html), 2)
+
+        for comment in comments:
+            with self.subTest():
+                self.assertEqual(
+                    comment in comments[-3:],
+                    f'id="comment_{comment.pk}"' not in ''.join(pages_html)
+                )
+
+    def _count_show_post_queries(self, post: models.Post) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self._client.get(reverse(
+                'django_gramm:show_post',
+                args=[self._test_author.username, post.pk]
+            ))
+
+        return len(queries)
+
+    @override_settings(POST_COMMENTS_PAGE_SIZE=3)
+    def test_show_post_queries_number_does_not_depend_on_engagement(self):
+        test_post = self._test_posts[0]
+
+        self._count_show_post_queries(test_post)
+        queries_number = self._count_show_post_queries(test_post)
+
+        for _ in range(10):
+            user = UserFactory()
+
+            PostManager.like_post(test_post, user)
+            CommentFactory(post=test_post, user=user)
+
+        self.assertEqual(
+            self._count_show_post_queries(test_post), queries_number
+        )
+
+
+class TestPerformanceMiddleware(TestFollowedAuthorViews):
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1)
+    def test_sampled_request_reports_performance(self):
+        with self.assertLogs('django_gramm.performance') as logs:
+            response = self._client.get(reverse('django_gramm:index'))
+
+        report = json.loads(logs.records[0].getMessage())
+
+        self.assertEqual(report['view'], 'django_gramm:index')
+        self.assertGreater(report['queries'], 0)
+        self.assertGreater(report['cache_misses'], 0)
+        self.assertEqual(report['response_bytes'], len(response.content))
+
+        self.assertRegex(
+            response['Server-Timing'],
+            r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+'
+        )
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_not_sampled_request_is_not_reported(self):
+        response = self._client.get(reverse('django_gramm:index'))
+
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(
+    DIRECT_UPLOAD_BACKEND='django_gramm.uploads.LocalUploadBackend'
+)
+class TestPostUploadViews(TestCase):
+    def setUp(self) -> None:
+        self._client = Client()
+
+        self._test_user = UserFactory()
+        self._client.force_login(self._test_user)
+
+    def _create_upload(self) -> dict:
+        response = self._client.post(
+            reverse(
+                'django_gramm:create_post_upload',
+                args=[self._test_user.username]
+            ),
+            {'content_type': 'image/jpeg', 'size': 1000}
+        )
+
+        return response.json()['upload']
+
+    def _upload_file(self, upload: dict, file) -> dict:
+        return self._client.post(
+            upload['url'], {**upload['fields'], 'file': file}
+        ).json()
+
+    def _commit_upload(self, upload: dict) -> dict:
+        return self._client.post(
+            upload['commit_url'],
+            {'token': upload['token'], 'description': 'Test description'}
+        ).json()
+
+    def _get_upload_status(self, committed_upload: dict) -> dict:
+        call_command('process_post_uploads', processes=1, stdout=StringIO())
+
+        return self._client.get(
+            committed_upload['upload']['status_url']
+        ).json()['upload']
+
+    def test_post_is_created_from_uploaded_file(self):
+        upload = self._create_upload()
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            self.assertEqual(
+                self._upload_file(upload, test_image)['status'], 'OK'
+            )
+
+        committed_upload = self._commit_upload(upload)
+        self.assertEqual(committed_upload['code'], 202)
+
+        upload_status = self._get_upload_status(committed_upload)
+        post = models.Post.objects.get(user=self._test_user)
+
+        self.assertEqual(upload_status['status'], 'done')
+        self.assertEqual(upload_status['post_url'], post.get_absolute_url())
+        self.assertEqual(post.description, 'Test description')
+        self.assertTrue(models.ThumbnailJob.objects.filter(
+            object_id=post.photo_to_post.get().pk
+        ).exists())
+
+    @override_settings(IMAGE_MAX_SIDE=320)
+    def test_oversized_uploaded_file_is_downscaled(self):
+        upload = self._create_upload()
+        file_name = load_upload_token(upload['token'])['file_name']
+
+        with open(
+                'django_gramm/tests/test_files/test_photo.jpeg', 'rb'
+        ) as test_image:
+            self._upload_file(upload, test_image)
+
+        upload_status = self._get_upload_status(self._commit_upload(upload))
+        photo = models.Post.objects.get(
+            user=self._test_user
+        ).photo_to_post.get().post_image
+
+        self.assertEqual(upload_status['status'], 'done')
+        self.assertEqual(photo.name, file_name)
+        self.assertEqual((photo.width, photo.height), (320, 180))
+
+    def test_upload_token_is_single_use(self):
+        upload = self._create_upload()
+
+        for content, expected_status in (
+                (b'first', 'OK'), (b'second', 'ERROR')):
+
+            with self.subTest(content=content):
+                response = self._upload_file(
+                    upload, SimpleUploadedFile('photo.jpg', content)
+                )
+
+                self.assertEqual(response['status'], expected_status)
+
+        file_name = load_upload_token(upload['token'])['file_name']
+        directory, base_name = os.path.split(file_name)
+        stem, _ = os.path.splitext(base_name)
+
+        with default_storage.open(file_name) as uploaded_file:
+            self.assertEqual(uploaded_file.read(), b'first')
+
+        # No renamed copy is left behind.
+        self.assertEqual(
+            [
+                name for name in default_storage.listdir(directory)[1]
+                if name.startswith(stem)
+            ],
+            [base_name]
+        )
+
+    def test_invalid_uploaded_file_is_rejected(self):
+        upload = self._create_upload()
+
+        self._upload_file(
+            upload, SimpleUploadedFile('photo.jpg', b'not an image')
+        )
+
+        upload_status = self._get_upload_status(self._commit_upload(upload))
+
+        self.assertEqual(upload_status['status'], 'failed')
+        self.assertFalse(models.Post.objects.exists())
+
+    def test_commit_upload_of_another_user(self):
+        upload = self._create_upload()
+
+        self._client.force_login(UserFactory())
+
+        response = self._commit_upload(upload)
+
+        self.assertEqual(response['code'], 403)
+        self.assertFalse(models.PostUpload.objects.exists())
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class TestReplicaRouting(TestCase):
+    def setUp(self) -> None:
+        self._request_factory = RequestFactory()
+        self._router = ReplicaRouter()
+
+    def _route_request(
+            self, request: HttpRequest, read_only: bool, write: bool):
+
+        read_routes = []
+
+        def get_response(request):
+            if read_only:
+                read_from_replica()
+
+            read_routes.append(self._router.db_for_read(models.Post))
+
+            if write:
+                self._router.db_for_write(models.Post)
+                read_routes.append(self._router.db_for_read(models.Post))
+
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+
+        return (
+            read_routes,
+            ReplicaRoutingMiddleware.pin_cookie_name in response.cookies
+        )
+
+    def test_read_only_views_read_from_replica_until_user_writes(self):
+        pinned_request = self._request_factory.get('/')
+        pinned_request.COOKIES[ReplicaRoutingMiddleware.pin_cookie_name] = '1'
+
+        for request, read_only, write, expected in (
+                (self._request_factory.get('/'), True, False,
+                 (['replica'], False)),
+                (self._request_factory.get('/'), False, False,
+                 (['default'], False)),
+                (self._request_factory.post('/'), True, False,
+                 (['replica'], False)),
+                (self._request_factory.post('/'), False, False,
+                 (['default'], True)),
+                (self._request_factory.get('/'), True, True,
+                 (['replica', 'default'], True)),
+                (pinned_request, True, False, (['default'], False))):
+
+            with self.subTest(
+                    method=request.method, read_only=read_only, write=write):
+
+                self.assertEqual(
+                    self._route_request(request, read_only, write), expected
+                )
+
+    def test_cached_data_is_loaded_from_primary(self):
+        cache.clear()
+
+        with replica_routing(pinned=False):
+            read_from_replica()
+
+            self.assertEqual(
+                self._router.db_for_read(models.User), 'replica'
+            )
+            self.assertEqual(
+                get_cached_relation_ids(
+                    1, 'following',
+                    lambda user_pk: self._router.db_for_read(models.User)
+                ),
+                'default'
+            )
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class TestReplicaRoutingViews(TransactionTestCase):
+    # The replica mirrors the test database through its own connection,
+    # which can't see the data of an open transaction.
+    databases = {'default', 'replica'}
+
+    def setUp(self) -> None:
+        cache.clear()
+
+        self._client = Client()
+
+        self._test_author = UserFactory()
+        self._test_user = UserFactory(following=[self._test_author])
+
+        self._test_post = PostFactory(user=self._test_author)
+        TimelineManager.push_post(self._test_post)
+
+        self._client.force_login(self._test_user)
+
+    def _request(self, method: str, url: str):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+
+            response = getattr(self._client, method)(url)
+
+        return response, {
+            alias: ' '.join(query['sql'] for query in queries)
+            for alias, queries in (('default', primary), ('replica', replica))
+        }
+
+    def test_read_only_view_reads_from_replica(self):
+        response, queries = self._request('get', reverse('django_gramm:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(models.TimelineEntry._meta.db_table, queries['replica'])
+        self.assertNotIn(
+            models.TimelineEntry._meta.db_table, queries['default']
+        )
+        self.assertNotIn(
+            ReplicaRoutingMiddleware.pin_cookie_name, response.cookies
+        )
+
+    def test_write_pins_user_to_primary(self):
+        response, queries = self._request('post', reverse(
+            'django_gramm:like_post',
+            args=[self._test_author.username, self._test_post.pk]
+        ))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries['replica'], '')
+        self.assertEqual(
+            response.cookies[ReplicaRoutingMiddleware.pin_cookie_name][
+                'max-age'
+            ],
+            5
+        )
+
+        # The client sends the pin cookie back.
+        response, queries = self._request('get', reverse('django_gramm:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries['replica'], '')
+        self.assertIn(models.TimelineEntry._meta.db_table, queries['default'])
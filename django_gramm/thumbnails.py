@@ -0,0 +1,298 @@
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Model, Q
+from django.db.models.fields.files import FieldFile
+from django.dispatch import receiver
+
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.models import Thumbnail
+from easy_thumbnails.signals import saved_file
+from easy_thumbnails.utils import get_storage_hash
+from PIL import Image
+
+try:
+    # Registers the AVIF encoder on Pillow versions without a native one.
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+from django_gramm.models import Photo, Post, ThumbnailJob, User
+from django_gramm.models_manager import ThumbnailJobManager
+from django_gramm.signals import post_changed, user_changed
+
+
+def get_thumbnails_field_name(field_name: str) -> str:
+    return f'{field_name}_thumbnails'
+
+
+def get_variants_field_name(field_name: str) -> str:
+    return f'{field_name}_variants'
+
+
+def _has_variants(fieldfile: FieldFile) -> bool:
+    return hasattr(
+        fieldfile.instance, get_variants_field_name(fieldfile.field.name)
+    )
+
+
+def get_thumbnail_urls(fieldfile: FieldFile) -> Dict[str, str]:
+    return getattr(
+        fieldfile.instance, get_thumbnails_field_name(fieldfile.field.name)
+    )
+
+
+def get_thumbnail_variants(
+        fieldfile: FieldFile) -> Dict[str, Dict[str, List[list]]]:
+
+    return getattr(
+        fieldfile.instance, get_variants_field_name(fieldfile.field.name), {}
+    )
+
+
+def get_thumbnail_url(fieldfile: FieldFile, alias: str) -> str:
+    # The original is served until the thumbnail is ready.
+    return get_thumbnail_urls(fieldfile).get(alias) or fieldfile.url
+
+
+def _send_changed_signal(instance: Model) -> None:
+    if isinstance(instance, Photo):
+        post_changed.send(sender=Photo, post_id=instance.post_id)
+    elif isinstance(instance, User):
+        user_changed.send(sender=User, user_id=instance.pk)
+
+
+def _save_thumbnail_data(
+        fieldfile: FieldFile, thumbnail_urls: Dict[str, str],
+        variants: Dict[str, Dict[str, List[list]]]) -> int:
+
+    instance = fieldfile.instance
+    field_name = fieldfile.field.name
+
+    thumbnail_data = {get_thumbnails_field_name(field_name): thumbnail_urls}
+
+    if _has_variants(fieldfile):
+        thumbnail_data[get_variants_field_name(field_name)] = variants
+
+    # Filtering by the file name skips the files replaced in the meantime.
+    return type(instance).objects.filter(
+        pk=instance.pk, **{field_name: fieldfile.name}
+    ).update(**thumbnail_data)
+
+
+def get_variant_formats() -> List[str]:
+    extensions = Image.registered_extensions()
+
+    return [
+        variant_format for variant_format in settings.THUMBNAIL_VARIANT_FORMATS
+        if extensions.get(f'.{variant_format}') in Image.SAVE
+    ]
+
+
+def get_variant_options(
+        alias: str, options: dict) -> Iterator[Tuple[int, dict]]:
+
+    alias_width, alias_height = options['size']
+
+    widths = {
+        width for width in settings.THUMBNAIL_VARIANT_WIDTHS
+        if width < alias_width
+    }
+
+    for width in sorted({*widths, alias_width}):
+        yield width, dict(
+            options, ALIAS=f'{alias}_{width}w',
+            size=(width, round(alias_height * width / alias_width))
+        )
+
+
+def _generate_variants(
+        fieldfile: FieldFile) -> Dict[str, Dict[str, List[list]]]:
+
+    all_options = aliases.all(fieldfile, include_global=True)
+    variants = {}
+
+    for alias in settings.THUMBNAIL_VARIANT_ALIASES:
+        if alias not in all_options:
+            continue
+
+        for variant_format in get_variant_formats():
+            thumbnailer = get_thumbnailer(fieldfile)
+            thumbnailer.thumbnail_extension = variant_format
+            thumbnailer.thumbnail_transparency_extension = variant_format
+
+            variants.setdefault(alias, {})[variant_format] = [
+                [width, thumbnailer.get_thumbnail(options).url]
+                for width, options in get_variant_options(
+                    alias, all_options[alias]
+                )
+            ]
+
+    return variants
+
+
+def generate_thumbnails(job: ThumbnailJob) -> None:
+    model = job.content_type.model_class()
+
+    instance = model.objects.filter(pk=job.object_id).first()
+
+    if instance is None:
+        return
+
+    fieldfile = getattr(instance, job.field_name)
+
+    # The file was replaced after the job was queued, so a newer job exists.
+    if fieldfile.name != job.file_name:
+        return
+
+    thumbnailer = get_thumbnailer(fieldfile)
+    thumbnail_urls = {}
+
+    for alias, options in aliases.all(fieldfile, include_global=True).items():
+        options['ALIAS'] = alias
+        thumbnail_urls[alias] = thumbnailer.get_thumbnail(options).url
+
+    variants = {}
+
+    if _has_variants(fieldfile):
+        variants = _generate_variants(fieldfile)
+
+    if _save_thumbnail_data(fieldfile, thumbnail_urls, variants):
+        _send_changed_signal(instance)
+
+
+def process_job(job: ThumbnailJob) -> Tuple[int, Optional[str]]:
+    try:
+        generate_thumbnails(job)
+
+        ThumbnailJobManager.complete_job(job.pk)
+    except Exception as error:
+        return job.pk, repr(error)
+
+    return job.pk, None
+
+
+def _get_alias_thumbnail_names(fieldfile: FieldFile) -> Dict[str, List[str]]:
+    thumbnailer = get_thumbnailer(fieldfile)
+    alias_names = {}
+
+    for alias, options in aliases.all(fieldfile, include_global=True).items():
+        options['ALIAS'] = alias
+        options = thumbnailer.get_options(options)
+
+        alias_names[alias] = [
+            thumbnailer.get_thumbnail_name(options, transparent=transparent)
+            for transparent in (False, True)
+        ]
+
+    return alias_names
+
+
+def _get_existing_thumbnail_names(
+        fieldfiles: List[FieldFile]) -> Dict[Tuple[str, str], set]:
+
+    sources = Q()
+
+    for fieldfile in fieldfiles:
+        sources |= Q(
+            source__storage_hash=get_storage_hash(fieldfile.storage),
+            source__name=fieldfile.name
+        )
+
+    existing_names = defaultdict(set)
+
+    for source_hash, source_name, name in Thumbnail.objects.filter(
+            sources).values_list(
+            'source__storage_hash', 'source__name', 'name'):
+
+        existing_names[source_hash, source_name].add(name)
+
+    return existing_names
+
+
+def resolve_thumbnail_urls(fieldfiles: Iterable[FieldFile]) -> None:
+    unresolved = defaultdict(list)
+
+    for fieldfile in fieldfiles:
+        if fieldfile and not get_thumbnail_urls(fieldfile):
+            unresolved[
+                type(fieldfile.instance), fieldfile.instance.pk
+            ].append(fieldfile)
+
+    if not unresolved:
+        return
+
+    existing_names = _get_existing_thumbnail_names(
+        [same_fieldfiles[0] for same_fieldfiles in unresolved.values()]
+    )
+
+    resolved = defaultdict(list)
+
+    for fieldfile, *same_fieldfiles in unresolved.values():
+        source_names = existing_names[
+            get_storage_hash(fieldfile.storage), fieldfile.name
+        ]
+        thumbnailer = get_thumbnailer(fieldfile)
+        thumbnail_urls = {}
+
+        for alias, names in _get_alias_thumbnail_names(fieldfile).items():
+            found_names = [name for name in names if name in source_names]
+
+            if not found_names:
+                break
+
+            thumbnail_urls[alias] = thumbnailer.thumbnail_storage.url(
+                found_names[0]
+            )
+        else:
+            field_name = get_thumbnails_field_name(fieldfile.field.name)
+
+            for same_fieldfile in (fieldfile, *same_fieldfiles):
+                setattr(same_fieldfile.instance, field_name, thumbnail_urls)
+
+            resolved[type(fieldfile.instance), field_name].append(
+                fieldfile.instance
+            )
+
+    for (model, field_name), instances in resolved.items():
+        model.objects.bulk_update(instances, [field_name])
+
+        for instance in instances:
+            _send_changed_signal(instance)
+
+
+def resolve_posts_thumbnail_urls(posts: Iterable[Post]) -> None:
+    resolve_thumbnail_urls(chain.from_iterable(
+        (post.user.picture, *(
+            photo.post_image for photo in post.photo_to_post.all()
+        )) for post in posts
+    ))
+
+
+def resolve_users_thumbnail_urls(users: Iterable[User]) -> None:
+    resolve_thumbnail_urls(user.picture for user in users)
+
+
+@receiver(saved_file)
+def _enqueue_thumbnail_job(sender, fieldfile, **kwargs):
+    if sender not in (Photo, User):
+        return
+
+    if get_thumbnail_urls(fieldfile) or get_thumbnail_variants(fieldfile):
+        setattr(
+            fieldfile.instance,
+            get_thumbnails_field_name(fieldfile.field.name), {}
+        )
+
+        if _has_variants(fieldfile):
+            setattr(
+                fieldfile.instance,
+                get_variants_field_name(fieldfile.field.name), {}
+            )
+
+        _save_thumbnail_data(fieldfile, {}, {})
+
+    ThumbnailJobManager.enqueue(fieldfile)
@@ -0,0 +1,135 @@
+import posixpath
+import uuid
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from django_gramm.images import downscale_image, inspect_image
+from django_gramm.models import PostUpload, User
+from django_gramm.models_manager import PostUploadManager
+
+_TOKEN_SALT = 'django_gramm.uploads'
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class LocalUploadBackend:
+    def create_upload(self, file_name: str, content_type: str, token: str):
+        return {
+            'url': reverse('django_gramm:direct_upload'),
+            'fields': {'token': token},
+        }
+
+
+class S3UploadBackend:
+    def create_upload(self, file_name: str, content_type: str, token: str):
+        client = default_storage.connection.meta.client
+
+        # The key is prefixed with the storage location, as the storage
+        # does on save.
+        key = posixpath.join(
+            default_storage.location,
+            default_storage.generate_filename(file_name)
+        )
+
+        return client.generate_presigned_post(
+            default_storage.bucket_name, key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, settings.DIRECT_UPLOAD_MAX_SIZE],
+            ],
+            ExpiresIn=settings.DIRECT_UPLOAD_EXPIRES_SECONDS
+        )
+
+
+def get_upload_backend():
+    return import_string(settings.DIRECT_UPLOAD_BACKEND)()
+
+
+def create_upload_file_name(user: User, content_type: str) -> str:
+    try:
+        extension = settings.DIRECT_UPLOAD_CONTENT_TYPES[content_type]
+    except KeyError:
+        raise InvalidUpload(f'Unsupported content type - {content_type}')
+
+    return f'uploads/{user.pk}/{uuid.uuid4().hex}.{extension}'
+
+
+def create_upload_token(user: User, file_name: str) -> str:
+    return signing.dumps(
+        {'user': user.pk, 'file_name': file_name}, salt=_TOKEN_SALT
+    )
+
+
+def load_upload_token(token: str) -> dict:
+    try:
+        return signing.loads(
+            token, salt=_TOKEN_SALT,
+            max_age=settings.DIRECT_UPLOAD_EXPIRES_SECONDS
+        )
+    except signing.BadSignature:
+        raise InvalidUpload('Invalid or expired upload token')
+
+
+def load_user_upload_token(token: str, user: User) -> str:
+    token_data = load_upload_token(token)
+
+    if token_data['user'] != user.pk:
+        raise InvalidUpload('Invalid or expired upload token')
+
+    return token_data['file_name']
+
+
+def validate_uploaded_image(file_name: str) -> None:
+    if default_storage.size(file_name) > settings.DIRECT_UPLOAD_MAX_SIZE:
+        raise InvalidUpload('The file is too large')
+
+    with default_storage.open(file_name) as image_file:
+        try:
+            image_format, _ = inspect_image(image_file)
+        except ValidationError as error:
+            raise InvalidUpload(' '.join(error.messages))
+
+    content_types = settings.DIRECT_UPLOAD_CONTENT_TYPES
+
+    if Image.MIME.get(image_format) not in content_types:
+        raise InvalidUpload(f'Unsupported image format - {image_format}')
+
+
+def downscale_uploaded_image(file_name: str) -> None:
+    with default_storage.open(file_name) as image_file:
+        downscaled_file = downscale_image(image_file)
+
+        if downscaled_file is image_file:
+            return
+
+    # The signed name is kept, the storage would rename a second copy.
+    default_storage.delete(file_name)
+
+    if default_storage.save(file_name, downscaled_file) != file_name:
+        raise InvalidUpload('The uploaded file was replaced')
+
+
+def process_upload(upload: PostUpload) -> Tuple[int, Optional[str]]:
+    try:
+        validate_uploaded_image(upload.file_name)
+        downscale_uploaded_image(upload.file_name)
+
+        PostUploadManager.complete_upload(upload)
+    except InvalidUpload as error:
+        default_storage.delete(upload.file_name)
+
+        PostUploadManager.reject_upload(upload, str(error))
+    except Exception as error:
+        return upload.pk, repr(error)
+
+    return upload.pk, None
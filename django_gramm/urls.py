@@ -12,6 +12,7 @@ app_name = 'django_gramm'
 
 urlpatterns = [
     path('', post_views.Index.as_view(), name='index'),
+    path('feed/page/', post_views.IndexJson.as_view(), name='index_page'),
 
     # Auth.
     path('accounts/signup/', auth_views.UserRegistration.as_view(),
@@ -34,11 +35,22 @@ urlpatterns = [
         'users/search/', user_views.search_users, name='search_users'
     ),
 
+    path(
+        'users/search/json/', user_views.SearchUsersJson.as_view(),
+        name='search_users_json'
+    ),
+
     path(
         'users/<slug:user_slug>/', user_views.UserProfile.as_view(),
         name='user_profile'
     ),
 
+    path(
+        'users/<slug:user_slug>/posts/page/',
+        user_views.UserPostsJson.as_view(),
+        name='user_posts_page'
+    ),
+
     path(
         'users/<slug:user_slug>/edit/', user_views.EditUserProfile.as_view(),
         name='edit_profile'
@@ -86,18 +98,51 @@ urlpatterns = [
         name='followers'
     ),
 
+    path(
+        'users/<slug:user_slug>/followers/page/',
+        user_views.ShowFollowersJson.as_view(),
+        name='followers_page'
+    ),
+
     path(
         'users/<slug:user_slug>/followings/',
         user_views.ShowFollowing.as_view(),
         name='following'
     ),
 
+    path(
+        'users/<slug:user_slug>/followings/page/',
+        user_views.ShowFollowingJson.as_view(),
+        name='following_page'
+    ),
+
     # Post functions.
     path(
         'users/<slug:user_slug>/posts/create/',
         post_views.AddPost.as_view(), name='add_post'
     ),
 
+    path(
+        'users/<slug:user_slug>/posts/uploads/',
+        post_views.CreatePostUploadJson.as_view(), name='create_post_upload'
+    ),
+
+    path(
+        'users/<slug:user_slug>/posts/uploads/commit/',
+        post_views.CommitPostUploadJson.as_view(), name='commit_post_upload'
+    ),
+
+    path(
+        'users/<slug:user_slug>/posts/uploads/<int:upload_id>/',
+        post_views.PostUploadStatusJson.as_view(),
+        name='post_upload_status'
+    ),
+
+    path(
+        'uploads/direct/', post_views.DirectUpload.as_view(),
+        name='direct_upload'
+    ),
+
     path(
         'users/<slug:user_slug>/posts/<int:post_id>/',
         post_views.PostDetail.as_view(), name='show_post'
@@ -120,6 +165,16 @@ urlpatterns = [
         name='unlike_post'
     ),
 
+    path(
+        'posts/likes/', post_views.LikePostsJson.as_view(),
+        name='like_posts'
+    ),
+
+    path(
+        'users/<slug:user_slug>/posts/<int:post_id>/comments/page/',
+        post_views.PostCommentsJson.as_view(), name='post_comments_page'
+    ),
+
     path(
         'users/<slug:user_slug>/posts/<int:post_id>/add_comment/',
         post_views.AddCommentToPostJson.as_view(), name='add_comment'
@@ -136,6 +191,11 @@ urlpatterns = [
         name='recommended_posts'
     ),
 
+    path(
+        'posts/recommended/page/', post_views.RecommendedPostsJson.as_view(),
+        name='recommended_posts_page'
+    ),
+
     path(
         'direct/<slug:user_slug>/', post_views.ShowUserDirect.as_view(),
         name='direct'
@@ -1,7 +1,74 @@
+from typing import Optional
+from urllib.parse import urlencode
+
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+
+from django.urls import reverse, reverse_lazy
 
-from django.urls import reverse_lazy
+from django_gramm.pagination import CursorPage, CursorPaginator, InvalidCursor
+from django_gramm.replicas import read_from_replica
 
 
 class SignInRequiredMixin(LoginRequiredMixin):
     login_url = reverse_lazy('django_gramm:login')
+
+
+class ReplicaReadMixin:
+    def dispatch(self, request, *args, **kwargs):
+        read_from_replica()
+
+        return super().dispatch(request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    paginate_by = 12
+    cursor_ordering = '-created_date', '-pk'
+    cursor_kwarg = 'cursor'
+
+    page_url_name = None
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return CursorPaginator(queryset, self.cursor_ordering, page_size)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor')
+
+        return paginator, page, page.object_list, page.has_next
+
+    def get_next_page_url(self, page: CursorPage) -> Optional[str]:
+        if not page.has_next:
+            return None
+
+        page_url = reverse(self.page_url_name, kwargs=self.kwargs)
+
+        return f'{page_url}?{urlencode({self.cursor_kwarg: page.next_cursor})}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        context['next_page_url'] = self.get_next_page_url(context['page_obj'])
+
+        return context
+
+
+class JsonPageMixin:
+    fragment_template_name = None
+
+    def render_to_response(self, context, **response_kwargs):
+        html = render_to_string(
+            self.fragment_template_name, context, request=self.request
+        )
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'html': html, 'next_page_url': context['next_page_url'],
+            }
+        )
@@ -1,68 +1,184 @@
+from django.conf import settings
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
-from django.urls import reverse_lazy
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.urls import reverse, reverse_lazy
 from django.http import (
-    HttpResponseForbidden, JsonResponse
+    Http404, HttpResponseForbidden, JsonResponse
 )
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 
 from django.views import View
 from django.views.generic import (
-    ListView, DetailView, DeleteView,
-    TemplateView, FormView
+    ListView, DeleteView, TemplateView, FormView
 )
 from django.views.generic.edit import BaseFormView
 
-from django_gramm.forms import PhotoForm, PostForm, CommentForm
+from django_gramm.caching import attach_cache_versions
+from django_gramm.forms import (
+    PhotosForm, PostForm, CommentForm, PostUploadForm, CommitPostUploadForm,
+    LikeTogglesForm
+)
+
+from django_gramm.pagination import CursorPage
 
 from django_gramm.models_manager import (
-    PostManager, CommentManager,
-    Post, Comment
+    PostManager, CommentManager, PostUploadManager, TimelineManager,
+    TimelinePaginator, Post, PostUpload
+)
+from django_gramm.thumbnails import (
+    get_thumbnail_url, resolve_posts_thumbnail_urls,
+    resolve_users_thumbnail_urls
+)
+
+from django_gramm.uploads import (
+    InvalidUpload, create_upload_file_name, create_upload_token,
+    get_upload_backend, load_upload_token, load_user_upload_token
+)
+
+from django_gramm.views.mixins import (
+    SignInRequiredMixin, CursorPaginationMixin, JsonPageMixin,
+    ReplicaReadMixin
 )
 
-from django_gramm.views.mixins import SignInRequiredMixin
 
+class Index(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        ListView):
 
-class Index(SignInRequiredMixin, ListView):
     template_name = 'django_gramm/pages/index.html'
     context_object_name = 'posts'
 
+    paginate_by = 10
+    page_url_name = 'django_gramm:index_page'
+
     def get_queryset(self):
-        return PostManager.get_following_users_posts(self.request.user)
+        return TimelineManager.get_timeline_entries(self.request.user)
 
+    def get_cursor_paginator(self, queryset, page_size):
+        return TimelinePaginator(
+            queryset,
+            TimelineManager.get_fanout_on_read_posts(self.request.user),
+            page_size
+        )
 
-class RecommendedPosts(SignInRequiredMixin, ListView):
-    template_name = 'django_gramm/pages/recommended_posts.html'
-    context_object_name = 'posts'
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
 
-    def get_queryset(self):
-        return PostManager.get_recommended_posts(self.request.user)
+        PostManager.mark_liked_posts(context['posts'], self.request.user)
+        resolve_posts_thumbnail_urls(context['posts'])
+        attach_cache_versions(context['posts'])
 
+        return context
 
-class PostDetail(SignInRequiredMixin, DetailView):
-    template_name = 'django_gramm/pages/show_post.html'
 
-    context_object_name = 'post'
+class IndexJson(JsonPageMixin, Index):
+    fragment_template_name = 'django_gramm/inc/_posts_one_by_one.html'
 
-    pk_url_kwarg = 'post_id'
+
+class RecommendedPosts(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        ListView):
+
+    template_name = 'django_gramm/pages/recommended_posts.html'
+    context_object_name = 'posts'
+
+    paginate_by = 15
+    cursor_ordering = '-trending_score', '-pk'
+    page_url_name = 'django_gramm:recommended_posts_page'
 
     def get_queryset(self):
-        return PostManager.get_posts_with_related_data()
+        return PostManager.get_recommended_posts(self.request.user, limit=None)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        post = context['post']
+        PostManager.mark_liked_posts(context['posts'], self.request.user)
+        resolve_posts_thumbnail_urls(context['posts'])
+        attach_cache_versions(context['posts'])
+
+        return context
+
+
+class RecommendedPostsJson(JsonPageMixin, RecommendedPosts):
+    fragment_template_name = 'django_gramm/inc/_posts_in_a_row.html'
+
 
-        context['users_post'] = post.user.username
+class PostDetail(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        TemplateView):
+
+    template_name = 'django_gramm/pages/show_post.html'
 
-        context['photos'] = post.photo_to_post.all()
+    page_url_name = 'django_gramm:post_comments_page'
 
-        context['comments'] = post.comments.all()
+    def get_context_data(self, **kwargs):
+        try:
+            post_detail = PostManager.get_post_detail(
+                self.kwargs['post_id'], self.request.user,
+                settings.POST_COMMENTS_PAGE_SIZE
+            )
+        except Post.DoesNotExist:
+            raise Http404('No post found matching the query')
+
+        context = super().get_context_data(
+            page_obj=CursorPage(
+                post_detail.comments, post_detail.next_comments_cursor
+            ),
+            **kwargs
+        )
+
+        context['post'] = post_detail.post
+        context['users_post'] = post_detail.author.username
+
+        context['photos'] = post_detail.photos
+        context['comments'] = post_detail.comments
         context['comment_form'] = CommentForm()
 
-        context['is_liked'] = post.likes.filter(
-            username=self.request.user.username
-        ).exists()
+        context['likes_count'] = post_detail.likes_count
+        context['is_liked'] = post_detail.is_liked
+
+        resolve_users_thumbnail_urls([
+            post_detail.author,
+            *(comment.user for comment in post_detail.comments)
+        ])
+
+        return context
+
+
+class PostCommentsJson(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        JsonPageMixin, ListView):
+
+    fragment_template_name = 'django_gramm/inc/_comments.html'
+
+    context_object_name = 'comments'
+
+    page_url_name = 'django_gramm:post_comments_page'
+
+    post = None
+
+    def get_paginate_by(self, queryset):
+        return settings.POST_COMMENTS_PAGE_SIZE
+
+    def get_queryset(self):
+        self.post = get_object_or_404(
+            Post.objects.select_related('user'), pk=self.kwargs['post_id']
+        )
+
+        return PostManager.get_post_comments(self.post)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        context['post'] = self.post
+        context['comments'] = context['comments'][::-1]
+
+        resolve_users_thumbnail_urls(
+            comment.user for comment in context['comments']
+        )
 
         return context
 
@@ -85,6 +201,13 @@ class DeletePost(SignInRequiredMixin, DeleteView):
 
         return super().post(request, *args, **kwargs)
 
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+
+        PostManager.delete_post(self.object)
+
+        return redirect(self.get_success_url())
+
 
 class AddCommentToPostJson(SignInRequiredMixin, BaseFormView):
     form_class = CommentForm
@@ -98,7 +221,9 @@ class AddCommentToPostJson(SignInRequiredMixin, BaseFormView):
 
         user_id = comment.user.pk
         username = comment.user.username
-        user_image = comment.user.picture.url if comment.user.picture else None
+        user_image = get_thumbnail_url(
+            comment.user.picture, 'mini_icon'
+        ) if comment.user.picture else None
 
         content = comment.content
         created_time = comment.created_date
@@ -128,43 +253,38 @@ class AddCommentToPostJson(SignInRequiredMixin, BaseFormView):
         return JsonResponse({'status': 'ERROR', 'code': 400})
 
 
-# Fixme.
 class DeleteCommentJson(SignInRequiredMixin, View):
     @staticmethod
     def post(
             request, user_slug: str, post_id: int, comment_id: int):
 
-        if request.method != 'POST':
-            return JsonResponse({'status': 'ERROR', 'code': 405})
+        if CommentManager.delete_user_comment(
+                comment_id, post_id, request.user):
 
-        post = get_object_or_404(PostManager.get_posts_with_comments(),
-                                 pk=post_id)
-        comment = get_object_or_404(Comment, pk=comment_id)
+            return JsonResponse({'status': 'OK', 'code': 200})
 
-        if request.user != post.user and request.user != comment.user:
+        # Only a failed deletion pays for telling the two errors apart.
+        if CommentManager.comment_exists(comment_id, post_id):
             return JsonResponse({'status': 'ERROR', 'code': 403})
 
-        if comment not in post.comments.all():
-            return JsonResponse({'status': 'ERROR', 'code': 403})
-
-        CommentManager.delete_comment(comment)
-
-        return JsonResponse({'status': 'OK', 'code': 200})
+        return JsonResponse({'status': 'ERROR', 'code': 404})
 
 
 # FIXME.
 class AddPost(SignInRequiredMixin, FormView):
     form_class = PostForm
-    second_form_class = PhotoForm
+    second_form_class = PhotosForm
 
     template_name = 'django_gramm/pages/add_post.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
 
-        context['post_form'] = self.form_class()
+        context['post_form'] = kwargs.get('post_form', self.form_class())
 
-        context['photo_form'] = self.second_form_class()
+        context['photo_form'] = kwargs.get(
+            'photo_form', self.second_form_class()
+        )
 
         return context
 
@@ -184,9 +304,10 @@ class AddPost(SignInRequiredMixin, FormView):
         )
 
         if post_form.is_valid() and photo_form.is_valid():
-            new_post = PostManager.create_new_post(
+            new_post = PostManager.create_post_with_photos(
                 user=request.user,
-                **post_form.cleaned_data, **photo_form.cleaned_data
+                post_images=photo_form.cleaned_data['post_image'],
+                **post_form.cleaned_data
             )
 
             messages.success(request, 'The post was successfully created')
@@ -196,25 +317,205 @@ class AddPost(SignInRequiredMixin, FormView):
         else:
             messages.error(request, 'Error adding post')
 
+            return self.render_to_response(
+                self.get_context_data(
+                    post_form=post_form, photo_form=photo_form
+                )
+            )
 
-class LikePostJson(SignInRequiredMixin, View):
+
+class CreatePostUploadJson(SignInRequiredMixin, BaseFormView):
+    form_class = PostUploadForm
+
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if request.user.username != self.kwargs['user_slug']:
+            return JsonResponse({'status': 'ERROR', 'code': 403})
+
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        content_type = form.cleaned_data['content_type']
+
+        file_name = create_upload_file_name(self.request.user, content_type)
+        token = create_upload_token(self.request.user, file_name)
+
+        upload = get_upload_backend().create_upload(
+            file_name, content_type, token
+        )
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'upload': {
+                    'url': upload['url'],
+                    'fields': upload['fields'],
+                    'token': token,
+                    'commit_url': reverse(
+                        'django_gramm:commit_post_upload',
+                        args=(self.kwargs['user_slug'],)
+                    ),
+                }
+            }
+        )
+
+    def form_invalid(self, form):
+        return JsonResponse({'status': 'ERROR', 'code': 400})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class DirectUpload(View):
     @staticmethod
-    def get(request, user_slug: str, post_id: int):
-        post = get_object_or_404(Post, pk=post_id)
+    def post(request):
+        try:
+            file_name = load_upload_token(request.POST.get('token', ''))[
+                'file_name'
+            ]
+        except InvalidUpload:
+            return JsonResponse({'status': 'ERROR', 'code': 403})
+
+        uploaded_file = request.FILES.get('file')
 
-        PostManager.like_post(post, request.user)
+        if (
+                uploaded_file is None or
+                uploaded_file.size > settings.DIRECT_UPLOAD_MAX_SIZE
+        ):
+            return JsonResponse({'status': 'ERROR', 'code': 400})
+
+        saved_file_name = default_storage.save(file_name, uploaded_file)
+
+        # Tokens are single use. The storage saves a file under an existing
+        # name as a renamed copy, which the commit would never find.
+        if saved_file_name != file_name:
+            default_storage.delete(saved_file_name)
+
+            return JsonResponse({'status': 'ERROR', 'code': 409})
 
         return JsonResponse({'status': 'OK', 'code': 200})
 
 
-class UnLikePostJson(SignInRequiredMixin, View):
+class CommitPostUploadJson(SignInRequiredMixin, BaseFormView):
+    form_class = CommitPostUploadForm
+
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if request.user.username != self.kwargs['user_slug']:
+            return JsonResponse({'status': 'ERROR', 'code': 403})
+
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        try:
+            file_name = load_user_upload_token(
+                form.cleaned_data['token'], self.request.user
+            )
+        except InvalidUpload:
+            return JsonResponse({'status': 'ERROR', 'code': 403})
+
+        if not default_storage.exists(file_name):
+            return JsonResponse({'status': 'ERROR', 'code': 400})
+
+        try:
+            upload = PostUploadManager.commit_upload(
+                self.request.user, file_name,
+                form.cleaned_data['description']
+            )
+        except IntegrityError:
+            return JsonResponse({'status': 'ERROR', 'code': 409})
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 202,
+                'upload': {
+                    'id': upload.pk,
+                    'status': upload.status,
+                    'status_url': reverse(
+                        'django_gramm:post_upload_status',
+                        args=(self.kwargs['user_slug'], upload.pk)
+                    ),
+                }
+            }
+        )
+
+    def form_invalid(self, form):
+        return JsonResponse({'status': 'ERROR', 'code': 400})
+
+
+class PostUploadStatusJson(SignInRequiredMixin, View):
     @staticmethod
-    def get(request, user_slug: str, post_id: int):
-        post = get_object_or_404(Post, pk=post_id)
+    def get(request, user_slug: str, upload_id: int):
+        try:
+            upload = PostUploadManager.get_user_upload(
+                upload_id, request.user
+            )
+        except PostUpload.DoesNotExist:
+            return JsonResponse({'status': 'ERROR', 'code': 404})
 
-        PostManager.unlike_post(post, request.user)
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'upload': {
+                    'id': upload.pk,
+                    'status': upload.status,
+                    'error': upload.error,
+                    'post_url': (
+                        upload.post.get_absolute_url() if upload.post
+                        else None
+                    ),
+                }
+            }
+        )
 
-        return JsonResponse({'status': 'OK', 'code': 200})
+
+class LikePostJson(SignInRequiredMixin, View):
+    liked = True
+
+    def post(self, request, user_slug: str, post_id: int):
+        likes_count = PostManager.set_post_like(
+            post_id, request.user, self.liked
+        )
+
+        if likes_count is None:
+            return JsonResponse({'status': 'ERROR', 'code': 404})
+
+        return JsonResponse(
+            {'status': 'OK', 'code': 200, 'likes_count': likes_count}
+        )
+
+
+class UnLikePostJson(LikePostJson):
+    liked = False
+
+
+class LikePostsJson(SignInRequiredMixin, BaseFormView):
+    form_class = LikeTogglesForm
+
+    http_method_names = ['post']
+
+    def form_valid(self, form):
+        likes_counts = PostManager.set_post_likes(
+            self.request.user, form.cleaned_data['toggles']
+        )
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'likes_counts': {
+                    post_id: likes_count
+                    for post_id, likes_count in likes_counts.items()
+                    if likes_count is not None
+                },
+                'missing_post_ids': [
+                    post_id for post_id, likes_count in likes_counts.items()
+                    if likes_count is None
+                ],
+            }
+        )
+
+    def form_invalid(self, form):
+        return JsonResponse({'status': 'ERROR', 'code': 400})
 
 
 class ShowUserDirect(SignInRequiredMixin, TemplateView):
@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse_lazy
-from django.http import  HttpResponseNotFound, JsonResponse
+from django.http import Http404, HttpResponseNotFound, JsonResponse
 
 from django.views import View
 
@@ -11,15 +12,27 @@ from django.views.generic.detail import SingleObjectMixin
 
 from django.views.generic.edit import UpdateView
 
+from django_gramm.caching import attach_cache_versions
 from django_gramm.forms import UserEditForm
 
 from django_gramm.models_manager import PostManager, UserManager, User
+from django_gramm.replicas import replica_reads
+from django_gramm.thumbnails import (
+    get_thumbnail_url, resolve_posts_thumbnail_urls,
+    resolve_users_thumbnail_urls
+)
 
 
-from django_gramm.views.mixins import SignInRequiredMixin
+from django_gramm.views.mixins import (
+    SignInRequiredMixin, CursorPaginationMixin, JsonPageMixin,
+    ReplicaReadMixin
+)
 
 
-class UserProfile(SignInRequiredMixin, SingleObjectMixin, ListView):
+class UserProfile(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        SingleObjectMixin, ListView):
+
     template_name = 'django_gramm/pages/profile.html'
 
     object = None
@@ -28,10 +41,15 @@ class UserProfile(SignInRequiredMixin, SingleObjectMixin, ListView):
     slug_url_kwarg = 'user_slug'
     slug_field = 'username'
 
+    page_url_name = 'django_gramm:user_posts_page'
+
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object(
-            queryset=UserManager.get_only_users_data()
-        )
+        try:
+            self.object = UserManager.get_user_with_aggregated_data(
+                self.kwargs[self.slug_url_kwarg]
+            )
+        except User.DoesNotExist:
+            raise Http404('No user found matching the query')
 
         return super().get(request, *args, **kwargs)
 
@@ -41,11 +59,17 @@ class UserProfile(SignInRequiredMixin, SingleObjectMixin, ListView):
         context['user'] = self.request.user
 
         context['user_to_display'] = self.object
-        context['posts'] = self.posts
+        context['posts'] = context['object_list']
 
-        context['is_follow'] = self.request.user.following.filter(
-            username=self.object.username
-        ).exists()
+        PostManager.mark_liked_posts(context['posts'], self.request.user)
+        resolve_users_thumbnail_urls([self.object])
+        resolve_posts_thumbnail_urls(context['posts'])
+        attach_cache_versions(context['posts'])
+
+        context['is_owner'] = self.request.user.pk == self.object.pk
+        context['is_follow'] = UserManager.is_following(
+            self.request.user, self.object
+        )
 
         return context
 
@@ -57,6 +81,10 @@ class UserProfile(SignInRequiredMixin, SingleObjectMixin, ListView):
         return self.posts
 
 
+class UserPostsJson(JsonPageMixin, UserProfile):
+    fragment_template_name = 'django_gramm/inc/_posts_in_a_row.html'
+
+
 class EditUserProfile(SignInRequiredMixin, UpdateView):
     template_name = 'django_gramm/editing/profile_editing.html'
 
@@ -74,33 +102,59 @@ class EditUserProfile(SignInRequiredMixin, UpdateView):
 
 class FollowUserJson(SignInRequiredMixin, View):
     @staticmethod
-    def get(request, user_slug: str):
+    def post(request, user_slug: str):
         if user_slug == (current_user := request.user).username:
             return JsonResponse({'status': 'ERROR', 'code': 403})
 
-        user_to_follow = UserManager.get_user_with_followers(user_slug)
+        try:
+            user_to_follow = UserManager.get_user_to_follow(user_slug)
+        except User.DoesNotExist:
+            return JsonResponse({'status': 'ERROR', 'code': 404})
 
-        UserManager.follow_user(current_user, user_to_follow)
+        followers_number = UserManager.follow_user(
+            current_user, user_to_follow
+        )
 
-        return JsonResponse({'status': 'OK', 'code': 200})
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'followers_number': followers_number
+            }
+        )
 
 
 class UnfollowUserJson(SignInRequiredMixin, View):
     @staticmethod
-    def get(request, user_slug: str):
+    def post(request, user_slug: str):
         if user_slug == (current_user := request.user).username:
             return JsonResponse({'status': 'ERROR', 'code': 403})
 
-        user_to_unfollow = UserManager.get_user_with_followers(user_slug)
+        try:
+            user_to_unfollow = UserManager.get_user_to_follow(user_slug)
+        except User.DoesNotExist:
+            return JsonResponse({'status': 'ERROR', 'code': 404})
 
-        UserManager.unfollow_user(current_user, user_to_unfollow)
+        followers_number = UserManager.unfollow_user(
+            current_user, user_to_unfollow
+        )
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'followers_number': followers_number
+            }
+        )
 
-        return JsonResponse({'status': 'OK', 'code': 200})
 
+class FollowViews(
+        ReplicaReadMixin, SignInRequiredMixin, CursorPaginationMixin,
+        ListView):
 
-class FollowViews(SignInRequiredMixin, ListView):
     context_object_name = 'users'
 
+    paginate_by = 30
+    cursor_ordering = '-pk',
+
     user_to_display = None
 
     def get_context_data(self, **kwargs):
@@ -108,12 +162,17 @@ class FollowViews(SignInRequiredMixin, ListView):
 
         context['user_to_display'] = self.user_to_display
 
+        UserManager.mark_followed_users(context['users'], self.request.user)
+        resolve_users_thumbnail_urls(context['users'])
+
         return context
 
 
 class ShowFollowers(FollowViews):
     template_name = 'django_gramm/pages/followers.html'
 
+    page_url_name = 'django_gramm:followers_page'
+
     def get_queryset(self):
         self.user_to_display = get_object_or_404(
             User, username=self.kwargs['user_slug']
@@ -125,6 +184,8 @@ class ShowFollowers(FollowViews):
 class ShowFollowing(FollowViews):
     template_name = 'django_gramm/pages/following.html'
 
+    page_url_name = 'django_gramm:following_page'
+
     def get_queryset(self):
         self.user_to_display = get_object_or_404(
             User, username=self.kwargs['user_slug']
@@ -133,7 +194,16 @@ class ShowFollowing(FollowViews):
         return self.user_to_display.following.all()
 
 
+class ShowFollowersJson(JsonPageMixin, ShowFollowers):
+    fragment_template_name = 'django_gramm/inc/_users_list.html'
+
+
+class ShowFollowingJson(JsonPageMixin, ShowFollowing):
+    fragment_template_name = 'django_gramm/inc/_users_list.html'
+
+
 # TODO.
+@replica_reads
 @login_required(login_url=reverse_lazy('django_gramm:login'))
 def search_users(request):
     searched_users_nickname = None
@@ -151,3 +221,33 @@ def search_users(request):
         request, 'django_gramm/pages/search_users.html',
         {'searched_users': searched_users_nickname, 'users': found_users}
     )
+
+
+class SearchUsersJson(ReplicaReadMixin, SignInRequiredMixin, View):
+    @staticmethod
+    def get(request):
+        searched_users_nickname = request.GET.get('q', '').strip()
+
+        found_users = UserManager.search_users_by_nickname(
+            searched_users_nickname, settings.USER_SEARCH_TYPEAHEAD_LIMIT
+        ) if searched_users_nickname else []
+
+        UserManager.mark_followed_users(found_users, request.user)
+        resolve_users_thumbnail_urls(found_users)
+
+        return JsonResponse(
+            {
+                'status': 'OK', 'code': 200,
+                'users': [
+                    {
+                        'id': user.pk,
+                        'username': user.username,
+                        'user_image': get_thumbnail_url(
+                            user.picture, 'mini_icon'
+                        ) if user.picture else None,
+                        'url': user.get_absolute_url(),
+                        'is_followed': user.is_followed,
+                    } for user in found_users
+                ]
+            }
+        )